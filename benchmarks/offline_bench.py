@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+离线基准测试
+
+在本地子进程中启动替身服务，按各 Provider 的真实响应结构返回数据：
+
+    POST /zhipu/web_search                             智谱 web_search（zai-sdk 或替身客户端）
+    GET  /ddg/text                                     DuckDuckGo 文本搜索（替身 DDGS 客户端）
+    POST /volcengine/agent_api/agent/chat/completion   火山引擎联网问答
+    POST /llm/chat/completions                         OpenAI 兼容 chat/completions（支持 stream）
+
+替身服务可配置延迟、结果条数、正文长度和错误注入比例。基准在本进程内按多个并发级别
+调用真实的 run_workflow（搜索 → 去重 → 排序 → 打包 → 提取），报告 p50/p95/p99 延迟、
+吞吐量、成功率、峰值 RSS 和各阶段平均耗时。只访问 127.0.0.1，不需要网络和真实 API Key。
+
+依赖 requests（火山引擎与提取请求）；已安装 zai-sdk 时智谱搜索走真实 SDK，否则使用替身客户端。
+
+用法:
+    python benchmarks/offline_bench.py [--queries 40] [--concurrency 1,4,16] [--error-rate 0.05] [--stream]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "langextract-search" / "scripts"
+
+ZH_WORDS = ("人工智能", "大模型", "搜索引擎", "结构化提取", "开源项目", "性能优化", "数据分析",
+            "技术趋势", "应用场景", "行业报告", "研究进展", "产品发布")
+EN_WORDS = ("model", "search", "latency", "benchmark", "release", "open", "source", "agent",
+            "context", "token", "pipeline", "throughput", "dataset", "inference")
+DOMAINS = ("example.com", "news.example.org", "blog.example.net", "docs.example.io", "wiki.example.cn")
+
+
+def make_text(rng: random.Random, chars: int) -> str:
+    """生成约 chars 个字符的中英混排正文。"""
+    parts = []
+    size = 0
+    while size < chars:
+        if rng.random() < 0.6:
+            sentence = "".join(rng.choice(ZH_WORDS) for _ in range(rng.randint(3, 6))) + "。"
+        else:
+            sentence = " ".join(rng.choice(EN_WORDS) for _ in range(rng.randint(6, 12))).capitalize() + ". "
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:chars]
+
+
+def make_results(engine: str, query: str, count: int, chars: int):
+    """按查询确定性地生成结果；不同引擎共享部分 URL，便于覆盖去重路径。"""
+    results = []
+    for i in range(count):
+        rng = random.Random(f"{engine}:{query}:{i}")
+        shared = i % 3 == 0
+        url_rng = random.Random(f"{query}:{i}") if shared else rng
+        domain = url_rng.choice(DOMAINS)
+        results.append({
+            "title": f"{query} {make_text(rng, 16)}",
+            "url": f"https://{domain}/{'shared' if shared else engine}/{abs(hash((query, i))) % 10 ** 8}",
+            "content": make_text(random.Random(f"{query}:{i}") if shared else rng, chars),
+            "date": f"2026-0{1 + i % 9}-1{i % 10}",
+            "site": domain,
+        })
+    return results
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self, base_ms: float):
+        jitter = self.server.settings["jitter"]
+        time.sleep(max(0.0, base_ms * random.uniform(1 - jitter, 1 + jitter)) / 1000)
+
+    def _inject_error(self) -> bool:
+        if random.random() < self.server.settings["error_rate"]:
+            self._send_json(500, {"error": {"code": "500", "message": "injected error"}})
+            return True
+        return False
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        settings = self.server.settings
+        parsed = urllib.parse.urlsplit(self.path)
+        if parsed.path != "/ddg/text":
+            self._send_json(404, {"error": "not found"})
+            return
+        params = urllib.parse.parse_qs(parsed.query)
+        query = params.get("q", [""])[0]
+        count = min(int(params.get("max_results", [settings["results"]])[0]), settings["results"])
+        self._delay(settings["search_latency_ms"])
+        if self._inject_error():
+            return
+        self._send_json(200, [
+            {"title": item["title"], "href": item["url"], "body": item["content"]}
+            for item in make_results("duckduckgo", query, count, settings["content_chars"])
+        ])
+
+    def do_POST(self):
+        settings = self.server.settings
+        request = self._read_json()
+        if self.path == "/zhipu/web_search":
+            query = request.get("search_query", "")
+            self._delay(settings["search_latency_ms"])
+            if self._inject_error():
+                return
+            count = min(int(request.get("count") or settings["results"]), settings["results"])
+            self._send_json(200, {
+                "id": f"mock-{random.getrandbits(32):08x}",
+                "created": int(time.time()),
+                "request_id": f"mock-{random.getrandbits(32):08x}",
+                "search_intent": [{"query": query, "intent": "SEARCH_ALL", "keywords": query}],
+                "search_result": [
+                    {
+                        "title": item["title"], "link": item["url"], "content": item["content"],
+                        "icon": "", "media": item["site"], "refer": f"ref_{i + 1}",
+                        "publish_date": item["date"], "images": []
+                    }
+                    for i, item in enumerate(make_results("zhipu", query, count, settings["content_chars"]))
+                ]
+            })
+        elif self.path == "/volcengine/agent_api/agent/chat/completion":
+            query = (request.get("messages") or [{}])[-1].get("content", "")
+            self._delay(settings["search_latency_ms"] * 2)
+            if self._inject_error():
+                return
+            self._send_json(200, {
+                "code": 0,
+                "data": {
+                    "answer": make_text(random.Random(query), settings["content_chars"]),
+                    "references": [
+                        {"title": item["title"], "url": item["url"], "content": item["content"],
+                         "site_name": item["site"]}
+                        for item in make_results("volcengine", query, settings["results"] // 2 or 1,
+                                                 settings["content_chars"])
+                    ]
+                }
+            })
+        elif self.path == "/llm/chat/completions":
+            self._chat_completion(request)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _chat_completion(self, request):
+        settings = self.server.settings
+        latency_ms = settings["llm_latency_ms"]
+        prompt = (request.get("messages") or [{}])[-1].get("content", "")
+        text = make_text(random.Random(len(prompt)), settings["completion_chars"])
+        usage = {
+            "prompt_tokens": len(prompt) // 2,
+            "completion_tokens": len(text) // 2,
+            "total_tokens": (len(prompt) + len(text)) // 2
+        }
+        if not request.get("stream"):
+            self._delay(latency_ms)
+            if self._inject_error():
+                return
+            self._send_json(200, {
+                "id": "mock-chat", "object": "chat.completion", "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        # 流式：首 token 占总延迟的 30%，其余时间均匀输出数据块
+        self._delay(latency_ms * 0.3)
+        if self._inject_error():
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunks = [text[i:i + 20] for i in range(0, len(text), 20)] or [""]
+        interval = latency_ms * 0.7 / 1000 / len(chunks)
+        for chunk in chunks:
+            event = {"choices": [{"index": 0, "delta": {"content": chunk}}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(interval)
+        self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def run_mock_server(settings: dict, port_queue):
+    """子进程入口：启动替身服务并把端口号回传给父进程。"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockProviderHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 256
+    server.settings = settings
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class MockZhipuWebSearch:
+    def __init__(self, api_key: str, base_url: str):
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def web_search(self, **params):
+        request = urllib.request.Request(
+            f"{self.base_url}/web_search",
+            data=json.dumps(params, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+
+class MockZhipuClient:
+    """未安装 zai-sdk 时的智谱替身客户端：client.web_search.web_search(**params) 返回响应字典。"""
+
+    def __init__(self, api_key: str, base_url: str = None):
+        self.web_search = MockZhipuWebSearch(api_key, base_url)
+
+
+def make_ddgs_factory(base_url: str):
+    """返回替身 DDGS 的构造函数，text() 的参数与返回结构与 ddgs.DDGS.text 一致。"""
+
+    class MockDDGS:
+        def __init__(self, timeout: int = None, proxy: str = None):
+            self.timeout = timeout or 10
+
+        def text(self, query: str, max_results: int = 10, **kwargs):
+            params = urllib.parse.urlencode({"q": query, "max_results": max_results})
+            with urllib.request.urlopen(f"{base_url}/ddg/text?{params}", timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+
+    return MockDDGS
+
+
+def write_bench_conf(path: Path, base_url: str, args) -> Path:
+    conf = {
+        "langextract": {
+            "provider": "mock",
+            "model": "mock-llm",
+            "baseUrl": f"{base_url}/llm",
+            "apiKey": "mock-key"
+        },
+        "zhipu_search": {
+            "enabled": True,
+            "apiKey": "mock-key",
+            "baseUrl": f"{base_url}/zhipu",
+            "count": args.results
+        },
+        "duckduckgo_search": {"maxResults": args.results, "timeout": 30},
+        "volcengine_search": {
+            "enabled": True,
+            "apiKey": "mock-key",
+            "botId": "mock-bot",
+            "baseUrl": f"{base_url}/volcengine"
+        },
+        "workflow": {"search_deadline": args.search_deadline},
+        "http": {"pool_maxsize": max(args.concurrency) * 2},
+        "server": {"forward": False},
+        "cache": {"enabled": False},
+        "engine_health": {"enabled": False}
+    }
+    path.write_text(json.dumps(conf, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def current_rss_kb() -> int:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RssSampler:
+    """后台采样当前进程 RSS，记录区间内的峰值（KB）。"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak_kb = current_rss_kb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, current_rss_kb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, current_rss_kb())
+
+
+def percentile(values, pct: float) -> float:
+    """最近秩百分位数。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_level(search, queries, concurrency: int, workflow_options: dict) -> dict:
+    latencies = []
+    failures = 0
+    stages = {}
+    lock = threading.Lock()
+
+    def process(query):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            result = search.run_workflow(query, **workflow_options)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not result.get("success"):
+                failures += 1
+            for record in result.get("trace") or []:
+                stages.setdefault(record["name"], []).append(record["duration_ms"])
+
+    with RssSampler() as sampler, contextlib.redirect_stderr(io.StringIO()):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(process, queries))
+        wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "failed": failures,
+        "wall_s": round(wall, 3),
+        "throughput_qps": round(len(queries) / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(sampler.peak_kb / 1024, 1),
+        "stages_ms": {name: round(statistics.mean(values), 1) for name, values in sorted(stages.items())}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="使用本地替身服务离线运行 搜索 → 提取 工作流基准")
+    parser.add_argument("--queries", type=int, default=40, help="每个并发级别执行的查询数，默认 40")
+    parser.add_argument("--concurrency", default="1,4,16", help="逗号分隔的并发级别，默认 1,4,16")
+    parser.add_argument("--search-latency-ms", type=float, default=80, help="搜索接口平均延迟，默认 80ms（火山引擎为其 2 倍）")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="提取模型平均延迟，默认 300ms")
+    parser.add_argument("--jitter", type=float, default=0.3, help="延迟随机抖动比例，默认 0.3")
+    parser.add_argument("--results", type=int, default=10, help="每个引擎返回的结果数，默认 10")
+    parser.add_argument("--content-chars", type=int, default=600, help="每条结果的正文长度，默认 600")
+    parser.add_argument("--completion-chars", type=int, default=800, help="模型输出长度，默认 800")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="每个请求返回 500 的概率，默认 0")
+    parser.add_argument("--search-deadline", type=float, default=30, help="搜索阶段截止时间（秒），默认 30")
+    parser.add_argument("--no-volcengine", action="store_true", help="不启用火山引擎搜索")
+    parser.add_argument("--stream", action="store_true", help="以流式方式调用提取模型")
+    parser.add_argument("--json", metavar="FILE", help="将报告写入 JSON 文件")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    settings = {
+        "search_latency_ms": args.search_latency_ms,
+        "llm_latency_ms": args.llm_latency_ms,
+        "jitter": min(max(args.jitter, 0.0), 1.0),
+        "results": args.results,
+        "content_chars": args.content_chars,
+        "completion_chars": args.completion_chars,
+        "error_rate": args.error_rate,
+    }
+    port_queue = multiprocessing.Queue()
+    mock = multiprocessing.Process(target=run_mock_server, args=(settings, port_queue), daemon=True)
+    mock.start()
+    base_url = f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+    workdir = tempfile.TemporaryDirectory(prefix="langextract-bench-")
+    os.environ["LANGEXTRACT_SEARCH_CONF"] = str(write_bench_conf(Path(workdir.name) / "conf.json", base_url, args))
+    os.environ["NO_PROXY"] = os.environ["no_proxy"] = "127.0.0.1,localhost"
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+    import provider_clients
+    import search
+
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        print("❌ 需要安装 requests（火山引擎搜索和提取请求使用 requests）")
+        sys.exit(2)
+
+    provider_clients.register_factory('ddgs', make_ddgs_factory(base_url))
+    if not provider_clients.sdk_available('zhipu'):
+        provider_clients.register_factory('zhipu', MockZhipuClient)
+    search.configure_http_clients()
+
+    workflow_options = {
+        "volcengine": not args.no_volcengine,
+        "cache_mode": "off",
+        "stream": args.stream,
+        "stream_file": None,
+    }
+    queries = [f"基准查询 {i} {EN_WORDS[i % len(EN_WORDS)]}" for i in range(args.queries)]
+
+    print("=" * 60)
+    print(f"🧪 离线基准: {base_url}（{mock.pid}）")
+    print(f"   查询数: {args.queries}，并发级别: {args.concurrency}")
+    print(f"   搜索延迟: {args.search_latency_ms}ms，模型延迟: {args.llm_latency_ms}ms，抖动: {settings['jitter']}")
+    print(f"   结果数: {args.results}，正文: {args.content_chars} 字符，错误注入: {args.error_rate:.0%}")
+    print("=" * 60)
+
+    # 预热：建立连接池并完成各模块的首次导入
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        search.run_workflow("预热查询", **workflow_options)
+
+    report = []
+    for level in args.concurrency:
+        with contextlib.redirect_stdout(io.StringIO()) if args.stream else contextlib.nullcontext():
+            stats = run_level(search, queries, level, workflow_options)
+        report.append(stats)
+        print(f"\n并发 {level:>3}: p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms  "
+              f"p99 {stats['p99_ms']:>8.1f} ms  吞吐 {stats['throughput_qps']:>6} q/s  "
+              f"失败 {stats['failed']}/{stats['queries']}  峰值 RSS {stats['peak_rss_mb']} MB")
+        for name, mean_ms in stats["stages_ms"].items():
+            print(f"          {name:<20} {mean_ms:>10.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "levels": report}, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 报告已写入: {args.json}")
+
+    provider_clients.close_all()
+    mock.terminate()
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+启动耗时检查
+
+在子进程中以 `python -X importtime` 运行真实的 search.py 命令行入口，
+在工作流即将发出第一个网络请求（分派第一个搜索引擎任务）时打点并退出，检查：
+
+1. 从启动解释器到第一个网络请求前的耗时不超过预算（默认 300ms）
+2. 此时尚未导入任何重量级 SDK（requests、zai、ddgs、openai、langextract 等）
+
+用法:
+    python benchmarks/startup_check.py [--budget-ms 300] [--top 10]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "langextract-search" / "scripts"
+HEAVY_MODULES = ("requests", "urllib3", "httpx", "zai", "ddgs", "openai", "langextract")
+MARKER = "__STARTUP_PROBE__"
+
+PROBE = r"""
+import json, os, sys, time
+sys.argv = ["search.py", "startup probe", "--no-cache", "--no-daemon"]
+import search
+
+def _probe(*args, **kwargs):
+    heavy = [m for m in {heavy!r} if m in sys.modules]
+    sys.stdout.write("\n{marker}" + json.dumps({{"time": time.time(), "heavy": heavy}}) + "\n")
+    sys.stdout.flush()
+    os._exit(0)
+
+search._run_in_daemon_thread = _probe
+search.main()
+"""
+
+
+def parse_importtime(stderr: str, top: int):
+    """解析 -X importtime 输出，返回累计耗时最高的顶层导入 [(模块, 毫秒)]。"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2][1:]
+        if name.startswith(" "):
+            continue
+        entries.append((name, int(fields[1]) / 1000))
+    entries.sort(key=lambda item: item[1], reverse=True)
+    return entries[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查 search.py 到达第一个网络请求前的启动耗时")
+    parser.add_argument("--budget-ms", type=float, default=300, help="启动耗时预算（毫秒），默认 300")
+    parser.add_argument("--top", type=int, default=10, help="显示耗时最高的顶层导入数量")
+    args = parser.parse_args()
+
+    code = PROBE.format(heavy=HEAVY_MODULES, marker=MARKER)
+    started = time.time()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(SCRIPTS_DIR),
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(SCRIPTS_DIR), os.environ.get("PYTHONPATH")]))}
+    )
+
+    probe = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(MARKER):
+            probe = json.loads(line[len(MARKER):])
+    if probe is None:
+        print("❌ 未到达第一个网络请求（工作流在分派搜索前退出）")
+        print(proc.stdout[-2000:])
+        print(proc.stderr[-2000:])
+        sys.exit(2)
+
+    elapsed_ms = (probe["time"] - started) * 1000
+    print(f"启动到第一个网络请求: {elapsed_ms:.1f} ms（预算 {args.budget_ms:.0f} ms）")
+    print(f"\n耗时最高的顶层导入（-X importtime 累计）:")
+    for name, ms in parse_importtime(proc.stderr, args.top):
+        print(f"   {ms:8.2f} ms  {name}")
+
+    failed = False
+    if probe["heavy"]:
+        print(f"\n❌ 分派搜索前已导入重量级模块: {', '.join(probe['heavy'])}")
+        failed = True
+    if elapsed_ms > args.budget_ms:
+        print(f"\n❌ 启动耗时超出预算 {elapsed_ms - args.budget_ms:.1f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("\n✅ 启动检查通过")
+
+
+if __name__ == "__main__":
+    main()
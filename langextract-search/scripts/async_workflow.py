@@ -0,0 +1,512 @@
+"""
+异步工作流
+
+供基于 asyncio 的宿主程序（Agent 框架、异步服务）在一个事件循环中并发处理大量查询，不必为每个查询占用一个线程：
+- 提取模型请求与火山引擎搜索经当前事件循环共享的 httpx.AsyncClient 发送，重试与限流使用
+  call_with_retry_async / acquire_async，等待期间不占用线程
+- 智谱（zai-sdk）与 DuckDuckGo（ddgs）只有同步 SDK，在容量为 async.search_threads 的线程池中执行
+- langextract 模式下 lx.extract 在该线程池中运行，分块请求经 AsyncOpenAICompatibleModel 回到事件循环上发送
+- 同一事件循环中的查询共享一个容量为 async.max_concurrency 的信号量
+
+结果结构与 search.run_workflow 相同；异步路径不支持流式输出和对冲请求。
+"""
+
+import asyncio
+import contextvars
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import provider_clients
+import search
+from prompt_templates import parse_usage
+from rate_limit import get_provider_limiter
+from retry import call_with_retry_async
+from tracing import end_trace, span, start_trace
+
+
+# 事件循环 -> {semaphore, executor}
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def _state():
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        async_config = search.get_async_config()
+        state = _loop_state[loop] = {
+            'semaphore': asyncio.Semaphore(max(1, int(async_config['max_concurrency']))),
+            'executor': ThreadPoolExecutor(
+                max_workers=max(1, int(async_config['search_threads'])), thread_name_prefix="async-workflow"
+            )
+        }
+    return state
+
+
+def get_async_semaphore() -> asyncio.Semaphore:
+    """当前事件循环共享的查询并发信号量（容量为 async.max_concurrency）。"""
+    return _state()['semaphore']
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """在异步工作流的线程池中执行同步函数；复制当前上下文，函数内的 span 写入同一个 trace。"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _state()['executor'], lambda: context.run(fn, *args, **kwargs)
+    )
+
+
+async def aclose():
+    """释放当前事件循环的线程池与异步 HTTP 客户端（事件循环结束前调用）。"""
+    loop = asyncio.get_running_loop()
+    state = _loop_state.pop(loop, None)
+    if state is not None:
+        state['executor'].shutdown(wait=False)
+    await provider_clients.aclose_loop_clients()
+
+
+async def search_with_zhipu_async(query: str, verbose: bool = False, cache_mode: str = 'on'):
+    """search_with_zhipu_mcp 的异步版本（zai-sdk 为同步 SDK，在线程池中执行）。"""
+    return await run_blocking(search.search_with_zhipu_mcp, query, verbose=verbose, cache_mode=cache_mode)
+
+
+async def search_with_duckduckgo_async(query: str, verbose: bool = False, max_results: int = None,
+                                       cache_mode: str = 'on'):
+    """search_with_duckduckgo 的异步版本（ddgs 为同步 SDK，在线程池中执行）。"""
+    return await run_blocking(
+        search.search_with_duckduckgo, query, verbose=verbose, max_results=max_results, cache_mode=cache_mode
+    )
+
+
+async def search_with_volcengine_async(query: str, verbose: bool = False, cache_mode: str = 'on'):
+    """search_with_volcengine 的异步版本，经共享的 httpx.AsyncClient 请求。"""
+    try:
+        search_conf = search.get_volcengine_search_config()
+        api_key = search_conf.get('apiKey')
+        bot_id = search_conf.get('botId')
+
+        if not api_key:
+            raise ValueError("火山引擎搜索 API Key 未配置。请在 conf.json 的 volcengine_search.apiKey 中设置")
+        if not bot_id:
+            raise ValueError("火山引擎 Bot ID 未配置。请在 conf.json 的 volcengine_search.botId 中设置")
+
+        cache_params = {'botId': bot_id}
+        cached = search._load_cached_search('volcengine', query, cache_params, cache_mode, verbose)
+        if cached is not None:
+            return cached
+
+        url, headers, payload = search.volcengine_request(search_conf, query)
+        client = provider_clients.get_async_http_client()
+
+        async def post():
+            response = await client.post(url, headers=headers, json=payload, timeout=60)
+            response.raise_for_status()
+            return response
+
+        response = await call_with_retry_async(
+            post,
+            policy=search.get_retry_config(),
+            limiter=get_provider_limiter('volcengine_search', api_key, qps=search_conf['qps']),
+            on_retry=search.log_retry('火山引擎搜索')
+        )
+        search_results, answer_content = search.parse_volcengine_response(response.json())
+
+        if verbose:
+            print(f"\n✅ 火山引擎搜索: {query}，参考结果 {len(search_results)} 条")
+
+        result = {
+            "success": True,
+            "query": query,
+            "search_results": search_results,
+            "answer": answer_content,
+            "source": "volcengine"
+        }
+        search._store_cached_search('volcengine', query, cache_params, result, None, cache_mode)
+        return result
+
+    except Exception as e:
+        if verbose:
+            print(f"\n❌ 火山引擎搜索失败: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "query": query,
+            "source": "volcengine"
+        }
+
+
+async def run_searches_async(query: str, engines, verbose: bool = False, ddg_max_results: int = None,
+                             deadline: float = None, cache_mode: str = 'on', min_results: int = None,
+                             min_engines: int = None):
+    """
+    run_searches 的异步版本：各引擎作为任务并发执行，截止时间到达或结果足够时取消未完成的任务。
+
+    Returns:
+        dict: {engine: 结果}，与 run_searches 相同（不发起对冲请求）
+    """
+    workflow_config = search.get_workflow_config()
+    if deadline is None:
+        deadline = workflow_config['search_deadline']
+    if min_results is None:
+        min_results = workflow_config['min_results']
+    if min_engines is None:
+        min_engines = workflow_config['min_engines']
+
+    tasks = {
+        'zhipu': lambda: search_with_zhipu_async(query, verbose=verbose, cache_mode=cache_mode),
+        'duckduckgo': lambda: search_with_duckduckgo_async(
+            query, verbose=verbose, max_results=ddg_max_results, cache_mode=cache_mode
+        ),
+        'volcengine': lambda: search_with_volcengine_async(query, verbose=verbose, cache_mode=cache_mode),
+    }
+    health = search.get_engine_health()
+
+    async def traced(engine):
+        with span(f"search.{engine}", engine=engine, attempt=1) as search_span:
+            attempt_start = time.perf_counter()
+            try:
+                result = await tasks[engine]()
+            except asyncio.CancelledError:
+                # 被截止时间放弃的引擎由 cut_off_search_result 记录
+                search_span.detach()
+                raise
+            search_span.set(
+                results=len(result.get("search_results") or []),
+                bytes=sum(len(doc["text"].encode("utf-8")) for doc in search.engine_documents(result)),
+                cache_hit=bool(result.get("cache_hit"))
+            )
+            if not result.get("success"):
+                search_span.fail(result.get("error"))
+        if health and not result.get("cache_hit"):
+            health.record(
+                engine, time.perf_counter() - attempt_start, bool(result.get("success")),
+                len(result.get("search_results") or [])
+            )
+        return result
+
+    start = time.perf_counter()
+    deadline_at = start + deadline
+    pending = {asyncio.ensure_future(traced(engine)): engine for engine in engines}
+    results = {}
+    cutoff = None
+    while pending:
+        remaining = deadline_at - time.perf_counter()
+        if remaining <= 0:
+            cutoff = 'deadline'
+            break
+        if search.enough_search_results(results, min_results, min_engines):
+            cutoff = 'enough_results'
+            break
+        done, _ = await asyncio.wait(list(pending), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            engine = pending.pop(task)
+            try:
+                results[engine] = task.result()
+            except Exception as e:
+                results[engine] = {
+                    "success": False,
+                    "error": str(e),
+                    "query": query,
+                    "source": engine
+                }
+
+    for task in pending:
+        task.cancel()
+    for engine in engines:
+        if engine not in results:
+            results[engine] = search.cut_off_search_result(
+                query, engine, cutoff, deadline, start, health=health, verbose=verbose
+            )
+    return {engine: results[engine] for engine in engines}
+
+
+async def extract_with_langextract_async(zhipu_data, ddg_data, volcengine_data=None, verbose: bool = False,
+                                         cache_mode: str = 'on', timeout: float = None, mode: str = None,
+                                         deadline: float = None):
+    """
+    extract_with_langextract 的异步版本（不支持流式输出）。
+
+    prompt 模式经共享的 httpx.AsyncClient 调用 /chat/completions；langextract 模式在线程池中运行 lx.extract，
+    分块请求由 AsyncOpenAICompatibleModel 在当前事件循环上并发发送。
+    """
+    volcengine_data = volcengine_data or {}
+    extraction_config = search.get_extraction_config()
+    query, documents, dedup_stats, ranking_stats = search.prepare_documents(
+        zhipu_data, ddg_data, volcengine_data, extraction_config, verbose=verbose
+    )
+
+    if (mode or extraction_config['mode']) == 'langextract':
+        return await run_blocking(
+            search.extract_structured_with_langextract,
+            query, documents, zhipu_data, ddg_data, volcengine_data, extraction_config,
+            dedup_stats=dedup_stats, ranking_stats=ranking_stats, verbose=verbose, cache_mode=cache_mode,
+            timeout=timeout, loop=asyncio.get_running_loop(), deadline=deadline
+        )
+
+    try:
+        prompt_template = search.get_prompt_template()
+    except ValueError as e:
+        if verbose:
+            print(f"\n❌ 提取失败: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "zhipu_data": zhipu_data,
+            "ddg_data": ddg_data,
+            "volcengine_data": volcengine_data
+        }
+
+    documents, packing_stats = search.pack_prompt_documents(
+        documents, extraction_config, prompt_template, verbose=verbose
+    )
+    combined_content = "".join(doc["text"] for doc in documents)
+
+    if not combined_content:
+        return {
+            "success": False,
+            "error": "All searches failed",
+            "zhipu_data": zhipu_data,
+            "ddg_data": ddg_data,
+            "volcengine_data": volcengine_data
+        }
+
+    try:
+        model_config = search.get_langextract_config()
+        base_url = model_config['baseUrl']
+        api_key = model_config['apiKey']
+
+        if not api_key:
+            raise ValueError("langextract API Key 未配置。请在 conf.json 的 langextract.apiKey 中设置")
+
+        result_kwargs = {
+            "dedup": dedup_stats, "packing": packing_stats, "ranking": ranking_stats,
+            "content_length": len(combined_content), "extraction_prompt": prompt_template.preview(combined_content)
+        }
+
+        cache_key = search.extraction_cache_key(
+            model_config['model'], base_url, prompt_template.fingerprint(), combined_content,
+            search.EXTRACTION_PARAMS
+        )
+        extraction_cache = search.get_extraction_cache() if cache_mode != 'off' else None
+        cached = extraction_cache.get(cache_key) if extraction_cache and cache_mode == 'on' else None
+        if cached is not None:
+            return search.extraction_result(
+                zhipu_data, ddg_data, volcengine_data, cached["extracted_info"], model_config,
+                cache_hit=True, **result_kwargs
+            )
+
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": model_config['model'],
+            "messages": prompt_template.messages(combined_content),
+            **search.EXTRACTION_PARAMS
+        }
+        client = provider_clients.get_async_http_client()
+        request_timeout = timeout or search.DEFAULT_EXTRACTION_TIMEOUT
+        limiter = get_provider_limiter(
+            f"llm:{base_url}", api_key, qps=model_config['qps'], tpm=model_config['tpm']
+        )
+        request_tokens = (
+            search.estimate_tokens(prompt_template.fixed_text()) + packing_stats['used_tokens']
+            + search.EXTRACTION_PARAMS['max_tokens']
+        )
+
+        with span("llm.request", model=model_config['model'], provider=model_config['provider'],
+                  stream=False) as llm_span:
+            attempts = []
+
+            async def post(attempt_timeout):
+                attempts.append(True)
+                response = await client.post(
+                    f"{base_url}/chat/completions", headers=headers, json=payload, timeout=attempt_timeout
+                )
+                llm_span.set(
+                    status_code=response.status_code,
+                    ttfb_ms=round(response.elapsed.total_seconds() * 1000, 1),
+                    bytes=len(response.content or b""),
+                    attempts=len(attempts)
+                )
+                response.raise_for_status()
+                return response
+
+            response = await call_with_retry_async(
+                post,
+                policy=search.get_retry_config(),
+                limiter=limiter,
+                tokens=request_tokens,
+                on_retry=search.log_retry(model_config['provider'] or model_config['model']),
+                timeout=request_timeout,
+                deadline=deadline
+            )
+            result = response.json()
+            extracted_info = result["choices"][0]["message"]["content"]
+            usage = parse_usage(result.get("usage"))
+            if usage:
+                llm_span.set(
+                    prompt_tokens=usage['prompt_tokens'],
+                    cached_tokens=usage['cached_tokens'],
+                    completion_tokens=usage['completion_tokens']
+                )
+
+        if extraction_cache is not None:
+            try:
+                extraction_cache.set(cache_key, {"extracted_info": extracted_info, "model_name": model_config['model']})
+            except Exception as e:
+                print(f"⚠️ 提取缓存写入失败: {e}")
+
+        return search.extraction_result(
+            zhipu_data, ddg_data, volcengine_data, extracted_info, model_config, cache_hit=False, usage=usage,
+            **result_kwargs
+        )
+
+    except Exception as e:
+        if verbose:
+            print(f"\n❌ 提取失败: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "zhipu_data": zhipu_data,
+            "ddg_data": ddg_data,
+            "volcengine_data": volcengine_data
+        }
+
+
+async def run_workflow_async(query: str, verbose: bool = False, ddg_max_results: int = None,
+                             volcengine: bool = False, volcengine_only: bool = False, search_deadline: float = None,
+                             cache_mode: str = 'on', query_deadline: float = None, min_results: int = None,
+                             min_engines: int = None, hedge: bool = None, history_first: bool = None,
+                             output_dir: str = None, fetch_pages: bool = None, extract_mode: str = None):
+    """
+    run_workflow 的异步版本，参数与返回值相同；同一事件循环中最多 async.max_concurrency 个查询同时执行，
+    其余在信号量上等待。hedge 在异步路径中不生效。
+    """
+    async with get_async_semaphore():
+        start = time.perf_counter()
+        trace, token = start_trace()
+        try:
+            with span("config.load"):
+                search.load_project_conf()
+                workflow_config = search.get_workflow_config()
+                if history_first is None:
+                    history_first = search.get_history_config()['first']
+                fetch_config = search.get_fetch_config()
+                if fetch_pages is None:
+                    fetch_pages = fetch_config['enabled']
+                engines = search.select_engines(
+                    volcengine=volcengine, volcengine_only=volcengine_only, verbose=verbose
+                )
+
+            if history_first and cache_mode == 'on':
+                history_result = await run_blocking(search.lookup_history, query, output_dir, verbose=verbose)
+                if history_result is not None:
+                    history_result["trace"] = trace.to_list()
+                    return history_result
+
+            engines, engine_skipped, engine_probes = search.select_healthy_engines(engines, verbose=verbose)
+            if query_deadline is None:
+                query_deadline = workflow_config['query_deadline']
+            if search_deadline is None:
+                search_deadline = workflow_config['search_deadline']
+            if query_deadline:
+                search_deadline = min(search_deadline, query_deadline * workflow_config['search_share'])
+
+            search_results = await run_searches_async(
+                query,
+                engines,
+                verbose=verbose,
+                ddg_max_results=ddg_max_results,
+                deadline=search_deadline,
+                cache_mode=cache_mode,
+                min_results=min_results,
+                min_engines=min_engines
+            )
+
+            fetch_stats = None
+            if fetch_pages:
+                fetch_timeout = fetch_config['deadline']
+                if query_deadline:
+                    fetch_timeout = min(
+                        fetch_timeout,
+                        query_deadline - (time.perf_counter() - start) - search.MIN_EXTRACTION_TIMEOUT
+                    )
+                if fetch_timeout > 0:
+                    fetch_stats = await run_blocking(
+                        search.fetch_result_pages, search_results, verbose=verbose, cache_mode=cache_mode,
+                        timeout=fetch_timeout
+                    )
+
+            extraction_timeout, extraction_deadline, deadline_exceeded = search.extraction_budget(
+                query_deadline, time.perf_counter() - start
+            )
+            result = await extract_with_langextract_async(
+                search_results.get('zhipu', {}),
+                search_results.get('duckduckgo', {}),
+                search_results.get('volcengine', {}),
+                verbose=verbose,
+                cache_mode=cache_mode,
+                mode=extract_mode,
+                deadline=extraction_deadline
+            )
+        finally:
+            end_trace(token)
+        return search.finish_workflow_result(
+            result, search_results, trace, engine_skipped=engine_skipped, engine_probes=engine_probes,
+            fetch_stats=fetch_stats, query_deadline=query_deadline, search_deadline=search_deadline,
+            extraction_timeout=extraction_timeout, deadline_exceeded=deadline_exceeded,
+            elapsed=time.perf_counter() - start
+        )
+
+
+def run_batch_async(queries, output_file: str, concurrency: int = None, store=None, **workflow_options):
+    """
+    run_batch 的异步版本：所有查询在一个事件循环中执行，结果按完成顺序写为 JSONL。
+
+    concurrency 默认读取 async.max_concurrency。
+
+    Returns:
+        dict: {total, succeeded, failed, elapsed, qps, output_file}
+    """
+    if concurrency is None:
+        concurrency = search.get_async_config()['max_concurrency']
+    concurrency = max(1, int(concurrency))
+
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    print("=" * 60)
+    print(f"📦 批量模式（异步）: {len(queries)} 个查询，并发 {concurrency}")
+    print(f"   输出文件: {output_path}")
+    print("=" * 60)
+
+    async def run_all():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def process(index, query):
+            async with limit:
+                query_start = time.monotonic()
+                try:
+                    result = await run_workflow_async(query, **workflow_options)
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+                return index, query, result, time.monotonic() - query_start
+
+        failed = 0
+        try:
+            with open(output_path, "w", encoding="utf-8") as out:
+                tasks = [asyncio.ensure_future(process(i, q)) for i, q in enumerate(queries)]
+                for done, task in enumerate(asyncio.as_completed(tasks), 1):
+                    index, query, result, elapsed = await task
+                    if not search.write_batch_record(out, index, query, result, elapsed, store=store,
+                                                     progress=f"{done}/{len(queries)}"):
+                        failed += 1
+        finally:
+            await aclose()
+        return failed
+
+    start = time.monotonic()
+    failed = asyncio.run(run_all())
+    return search.finish_batch(len(queries), failed, time.monotonic() - start, output_path)
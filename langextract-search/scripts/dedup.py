@@ -0,0 +1,181 @@
+"""
+跨引擎搜索结果去重
+
+- URL 规范化：统一协议、去掉 www./m. 等前缀、默认端口、锚点和常见跟踪参数
+- 近重复正文：基于字符 shingle 的 64 位 SimHash，海明距离不超过阈值即视为重复
+"""
+
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# 只去掉广告 / 分析平台专用的参数；from、src、ref、timestamp 等通用名称在不少站点上决定页面内容，保留
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'gbraid', 'wbraid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    'mkt_tok', '_ga', '_gl', '_hsenc', '_hsmi', 'spm', 'scm', 'ref_src', 'share_source', 'share_medium',
+    'wfr', 'isappinstalled'
+}
+TRACKING_PREFIXES = ('utm_', 'wt.')
+HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'wap.', 'amp.')
+
+SHINGLE_SIZE = 4
+MIN_FINGERPRINT_CHARS = 80
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+_MASK64 = (1 << 64) - 1
+_LANE_BITS = 32
+_LANE_MASK = (1 << _LANE_BITS) - 1
+# 将一个字节的 8 个比特展开到 8 个 32 位计数槽，累加展开值即可一次统计 64 个比特位
+_BYTE_SPREAD = [
+    sum(1 << (_LANE_BITS * i) for i in range(8) if value >> i & 1)
+    for value in range(256)
+]
+
+
+def canonicalize_url(url: str) -> str:
+    """将 URL 规范化，用于识别同一页面的不同链接形式；无法解析时返回空字符串。"""
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return ""
+    if not parts.netloc:
+        return ""
+
+    host = (parts.hostname or "").lower()
+    changed = True
+    while changed:
+        changed = False
+        for prefix in HOST_PREFIXES:
+            if host.startswith(prefix) and host.count('.') > 1:
+                host = host[len(prefix):]
+                changed = True
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    path = re.sub(r"/+", "/", parts.path or "/")
+    if path.endswith("/amp"):
+        path = path[:-4] or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    for index_page in ("/index.html", "/index.htm", "/index.php"):
+        if path.endswith(index_page):
+            path = path[:-len(index_page)] or "/"
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def normalize_text(text: str) -> str:
+    """去掉空白和标点并转小写，用于正文指纹计算。"""
+    return _NON_WORD_RE.sub("", (text or "").lower())
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    计算文本的 64 位 SimHash 指纹（字符 shingle，对中英文都适用）。
+
+    使用进程内的 hash()，指纹只在同一进程内可比较，不要持久化。
+    """
+    normalized = normalize_text(text)
+    if len(normalized) <= shingle_size:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + shingle_size] for i in range(len(normalized) - shingle_size + 1)}
+
+    spread = _BYTE_SPREAD
+    counts = 0
+    for shingle in shingles:
+        h = hash(shingle) & _MASK64
+        counts += (
+            spread[h & 0xFF]
+            | spread[h >> 8 & 0xFF] << (_LANE_BITS * 8)
+            | spread[h >> 16 & 0xFF] << (_LANE_BITS * 16)
+            | spread[h >> 24 & 0xFF] << (_LANE_BITS * 24)
+            | spread[h >> 32 & 0xFF] << (_LANE_BITS * 32)
+            | spread[h >> 40 & 0xFF] << (_LANE_BITS * 40)
+            | spread[h >> 48 & 0xFF] << (_LANE_BITS * 48)
+            | spread[h >> 56 & 0xFF] << (_LANE_BITS * 56)
+        )
+
+    half = len(shingles) / 2
+    fingerprint = 0
+    for bit in range(64):
+        if (counts >> (_LANE_BITS * bit) & _LANE_MASK) > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def dedupe_documents(documents, max_distance: int = 3):
+    """
+    对搜索结果文档去重。
+
+    Args:
+        documents: 文档列表，每个文档至少包含 url、content、text 字段
+        max_distance: SimHash 海明距离阈值，不超过该值视为近重复
+
+    Returns:
+        tuple: (去重后的文档列表, 统计 {input_results, removed_results, removed_chars,
+                duplicate_urls, near_duplicates})
+
+    重复项只保留一份：位置取最先出现的，内容取正文更长的那一份。
+    """
+    kept = []
+    url_index = {}
+    fingerprints = []
+    removed_chars = 0
+    duplicate_urls = 0
+    near_duplicates = 0
+
+    for doc in documents:
+        url_key = canonicalize_url(doc.get("url", ""))
+        content = doc.get("content") or ""
+        fingerprint = simhash(content) if len(normalize_text(content)) >= MIN_FINGERPRINT_CHARS else None
+
+        match = None
+        if url_key and url_key in url_index:
+            match = url_index[url_key]
+            duplicate_urls += 1
+        elif fingerprint is not None:
+            for position, other in fingerprints:
+                if hamming_distance(fingerprint, other) <= max_distance:
+                    match = position
+                    near_duplicates += 1
+                    break
+
+        if match is None:
+            position = len(kept)
+            kept.append(doc)
+            if url_key:
+                url_index[url_key] = position
+            if fingerprint is not None:
+                fingerprints.append((position, fingerprint))
+            continue
+
+        existing = kept[match]
+        if len(content) > len(existing.get("content") or ""):
+            removed_chars += len(existing.get("text", ""))
+            kept[match] = doc
+        else:
+            removed_chars += len(doc.get("text", ""))
+        if url_key:
+            url_index.setdefault(url_key, match)
+
+    stats = {
+        "input_results": len(documents),
+        "removed_results": len(documents) - len(kept),
+        "removed_chars": removed_chars,
+        "duplicate_urls": duplicate_urls,
+        "near_duplicates": near_duplicates
+    }
+    return kept, stats
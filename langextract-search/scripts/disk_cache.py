@@ -0,0 +1,133 @@
+"""
+本地磁盘缓存
+
+基于 SQLite 的键值缓存，支持 TTL 过期、按条目数/字节数的 LRU 淘汰，
+多线程共享同一实例，多进程通过 SQLite 文件锁共享同一缓存文件。
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+def make_cache_key(*parts) -> str:
+    """将任意可 JSON 序列化的参数组合成稳定的 SHA-256 缓存键。"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """带 TTL 与 LRU 淘汰的 SQLite 缓存，值以 JSON 形式存储。"""
+
+    def __init__(self, path, namespace: str = "default", max_entries: int = None, max_bytes: int = None):
+        self.path = Path(path)
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache_entries (namespace, accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        """读取缓存，未命中或已过期返回 None；命中时刷新访问时间。"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                )
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl: float = None):
+        """写入缓存，ttl 为 None 表示永不过期；写入后按容量上限淘汰最久未访问的条目。"""
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO cache_entries
+                    (namespace, key, value, size, created_at, accessed_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (self.namespace, key, payload, len(payload.encode("utf-8")), now, now, expires_at),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, now),
+        )
+        if self.max_entries:
+            self._conn.execute(
+                """
+                DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache_entries WHERE namespace = ?
+                    ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.namespace, self.namespace, self.max_entries),
+            )
+        if self.max_bytes:
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed_at ASC",
+                    (self.namespace,),
+                ).fetchall()
+                stale = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((self.namespace, key))
+                    total -= size
+                self._conn.executemany(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", stale
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,242 @@
+"""
+搜索引擎健康统计与熔断
+
+按引擎持久化最近的调用记录（耗时、成功与否、结果数），跨进程、跨运行共享：
+- 熔断器：错误率或连续失败次数超过阈值时打开，冷却期内跳过该引擎；冷却期后放行一次探测请求，
+  探测成功则关闭，失败则重新计时
+- 调度：按 成功率 × 平均结果数 / 中位耗时 估算每个引擎的产出效率，自适应模式下只调用
+  足以达到目标结果数的高效引擎
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _percentile(values, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class EngineHealth:
+    """基于 SQLite 的引擎调用统计与熔断状态。"""
+
+    def __init__(self, path, window: int = 100, min_calls: int = 5, failure_rate: float = 0.5,
+                 consecutive_failures: int = 3, open_seconds: float = 300):
+        self.path = Path(path)
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS engine_calls (
+                engine TEXT NOT NULL,
+                ts REAL NOT NULL,
+                latency REAL NOT NULL,
+                success INTEGER NOT NULL,
+                results INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_engine_calls ON engine_calls (engine, ts)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS engine_breakers (
+                engine TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                opened_at REAL,
+                probe_at REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _calls(self, engine: str):
+        return self._conn.execute(
+            "SELECT latency, success, results FROM engine_calls WHERE engine = ? ORDER BY ts DESC LIMIT ?",
+            (engine, self.window),
+        ).fetchall()
+
+    def _breaker(self, engine: str):
+        row = self._conn.execute(
+            "SELECT state, opened_at, probe_at FROM engine_breakers WHERE engine = ?", (engine,)
+        ).fetchone()
+        return row or (CLOSED, None, None)
+
+    def _set_breaker(self, engine: str, state: str, opened_at=None, probe_at=None):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO engine_breakers (engine, state, opened_at, probe_at) VALUES (?, ?, ?, ?)",
+            (engine, state, opened_at, probe_at),
+        )
+
+    def record(self, engine: str, latency: float, success: bool, results: int = 0):
+        """记录一次真实调用（不含缓存命中），并更新熔断状态。"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO engine_calls (engine, ts, latency, success, results) VALUES (?, ?, ?, ?, ?)",
+                (engine, now, latency, int(bool(success)), int(results or 0)),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM engine_calls WHERE engine = ? AND rowid NOT IN (
+                    SELECT rowid FROM engine_calls WHERE engine = ? ORDER BY ts DESC LIMIT ?
+                )
+                """,
+                (engine, engine, self.window),
+            )
+
+            state, opened_at, _ = self._breaker(engine)
+            if success:
+                if state != CLOSED:
+                    self._set_breaker(engine, CLOSED)
+            elif state == HALF_OPEN:
+                self._set_breaker(engine, OPEN, opened_at=now)
+            elif state == CLOSED and self._should_open(self._calls(engine)):
+                self._set_breaker(engine, OPEN, opened_at=now)
+            self._conn.commit()
+
+    def _should_open(self, calls) -> bool:
+        streak = 0
+        for _, success, _ in calls:
+            if success:
+                break
+            streak += 1
+        if self.consecutive_failures and streak >= self.consecutive_failures:
+            return True
+        if len(calls) < self.min_calls:
+            return False
+        failures = sum(1 for _, success, _ in calls if not success)
+        return failures / len(calls) >= self.failure_rate
+
+    def allow(self, engine: str):
+        """
+        判断本次查询是否调用该引擎。
+
+        Returns:
+            tuple: (是否调用, 是否为探测请求)
+        """
+        now = time.time()
+        with self._lock:
+            state, opened_at, probe_at = self._breaker(engine)
+            if state == CLOSED:
+                return True, False
+            if state == OPEN and now - (opened_at or 0) < self.open_seconds:
+                return False, False
+            # 冷却期已过，或上一次探测迟迟没有结果：放行一次探测请求
+            if state == HALF_OPEN and probe_at and now - probe_at < self.open_seconds:
+                return False, False
+            self._set_breaker(engine, HALF_OPEN, opened_at=opened_at, probe_at=now)
+            self._conn.commit()
+            return True, True
+
+    def stats(self, engine: str) -> dict:
+        """引擎近期统计：调用数、错误率、耗时分位数（仅成功调用）、平均结果数、熔断状态。"""
+        with self._lock:
+            calls = self._calls(engine)
+            state, opened_at, _ = self._breaker(engine)
+        latencies = [latency for latency, success, _ in calls if success]
+        successes = len(latencies)
+        return {
+            "engine": engine,
+            "calls": len(calls),
+            "error_rate": round(1 - successes / len(calls), 3) if calls else None,
+            "p50_latency": _percentile(latencies, 50),
+            "p95_latency": _percentile(latencies, 95),
+            "mean_results": (sum(results for _, success, results in calls if success) / successes
+                             if successes else None),
+            "state": state,
+            "opened_at": opened_at
+        }
+
+    def latency_percentile(self, engine: str, pct: float, min_samples: int = 10):
+        """成功调用耗时的分位数，样本不足时返回 None。"""
+        with self._lock:
+            latencies = [latency for latency, success, _ in self._calls(engine) if success]
+        if len(latencies) < min_samples:
+            return None
+        return _percentile(latencies, pct)
+
+    def reset(self, engine: str = None):
+        """清除统计与熔断状态（engine 为 None 时清除全部）。"""
+        with self._lock:
+            if engine is None:
+                self._conn.execute("DELETE FROM engine_calls")
+                self._conn.execute("DELETE FROM engine_breakers")
+            else:
+                self._conn.execute("DELETE FROM engine_calls WHERE engine = ?", (engine,))
+                self._conn.execute("DELETE FROM engine_breakers WHERE engine = ?", (engine,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def engine_yield(stats: dict, min_calls: int):
+    """每秒期望结果数；历史样本不足时返回 None（需要继续探索）。"""
+    if stats["calls"] < min_calls or stats["mean_results"] is None:
+        return None
+    success_rate = 1 - stats["error_rate"]
+    return success_rate * stats["mean_results"] / max(stats["p50_latency"] or 0.0, 0.1)
+
+
+def plan_engines(health: EngineHealth, engines, scheduler: str = "all", target_results: int = 20):
+    """
+    根据熔断状态和历史产出选择本次调用的引擎。
+
+    Args:
+        health: EngineHealth 实例
+        engines: 候选引擎（按优先级排列）
+        scheduler: all（调用所有未熔断的引擎）| adaptive（按产出效率选择，期望结果数达到目标即止）
+        target_results: 自适应模式下的目标结果数
+
+    Returns:
+        tuple: (选中的引擎列表, {被跳过的引擎: 原因 circuit_open/scheduler}, 探测中的引擎列表)
+    """
+    allowed, skipped, probes = [], {}, []
+    for engine in engines:
+        ok, probe = health.allow(engine)
+        if ok:
+            allowed.append(engine)
+            if probe:
+                probes.append(engine)
+        else:
+            skipped[engine] = "circuit_open"
+
+    if not allowed and engines:
+        # 所有引擎都已熔断时仍保留熔断最久的一个，避免查询直接失败
+        oldest = min(engines, key=lambda engine: health.stats(engine)["opened_at"] or 0)
+        allowed.append(oldest)
+        del skipped[oldest]
+
+    if scheduler != "adaptive" or len(allowed) <= 1:
+        return allowed, skipped, probes
+
+    stats = {engine: health.stats(engine) for engine in allowed}
+    yields = {engine: engine_yield(stats[engine], health.min_calls) for engine in allowed}
+    # 样本不足的引擎和探测请求总是调用，其余按产出效率从高到低加入，直到期望结果数达到目标
+    selected = [engine for engine in allowed if yields[engine] is None or engine in probes]
+    expected = 0.0
+    for engine in sorted((e for e in allowed if e not in selected), key=lambda e: yields[e], reverse=True):
+        if selected and expected >= target_results:
+            skipped[engine] = "scheduler"
+            continue
+        selected.append(engine)
+        expected += (1 - stats[engine]["error_rate"]) * stats[engine]["mean_results"]
+    return [engine for engine in allowed if engine in selected], skipped, probes
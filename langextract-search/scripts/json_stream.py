@@ -0,0 +1,59 @@
+"""
+流式 JSON 写入
+
+json.dump(indent=2) 会先在内存中拼出整份文本，缩进又使输出成倍增大。这里按 JSONEncoder.iterencode
+产生的片段边编码边写入，默认使用紧凑分隔符，峰值内存与输出大小只和结果中的实际内容有关。
+"""
+
+import json
+import zlib
+
+
+WRITE_BUFFER_CHARS = 64 * 1024
+
+
+def _encoder(indent=None):
+    return json.JSONEncoder(
+        ensure_ascii=False,
+        indent=indent,
+        separators=(",", ": ") if indent is not None else (",", ":"),
+        default=str
+    )
+
+
+def iter_json(obj, indent=None):
+    """按约 WRITE_BUFFER_CHARS 大小的片段产生 obj 的 JSON 文本（iterencode 的小片段先合并）。"""
+    buffer = []
+    buffered = 0
+    for chunk in _encoder(indent).iterencode(obj):
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= WRITE_BUFFER_CHARS:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def write_json(obj, fp, indent=None):
+    """把 obj 流式写入文本文件对象 fp，返回写入的字符数。"""
+    written = 0
+    for chunk in iter_json(obj, indent):
+        fp.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def write_jsonl(obj, fp):
+    """写入一行 JSON Lines 记录。"""
+    written = write_json(obj, fp)
+    fp.write("\n")
+    return written + 1
+
+
+def compress_json(obj, level: int = 6) -> bytes:
+    """边编码边 zlib 压缩，不在内存中保留完整的 JSON 文本。"""
+    compressor = zlib.compressobj(level)
+    parts = [compressor.compress(chunk.encode("utf-8")) for chunk in iter_json(obj)]
+    parts.append(compressor.flush())
+    return b"".join(parts)
@@ -1,10 +1,21 @@
 """
 LangExtract OpenAI 兼容模型 Provider 封装
 
-支持所有 OpenAI 兼容 API，配置在 conf.json 中指定
+支持所有 OpenAI 兼容 API，配置在 conf.json 中指定。
+
+extract_structured 通过 lx.extract 做分块、并行、可多轮的结构化提取：
+搜索内容按 max_char_buffer 切块，块内请求由 OpenAICompatibleModel 按 max_workers 并发发送，
+每条提取结果都对齐回原文的字符区间（grounded span），再按区间归属到具体的搜索结果。
+
+AsyncOpenAICompatibleModel 使用 AsyncOpenAI：lx.extract 在工作线程中运行，分块请求提交到给定的事件循环上并发执行，
+与异步工作流共享同一个事件循环和连接池。
 """
 
+import asyncio
+import bisect
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import langextract as lx
@@ -14,45 +25,356 @@ except ImportError:
     lx = None
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI  # noqa: F401
     HAS_OPENAI = True
 except ImportError:
     HAS_OPENAI = False
 
+from packing import estimate_tokens
+from prompt_templates import parse_usage
+from provider_clients import aclose_loop_clients, get_async_openai_client, get_openai_client
+from rate_limit import get_provider_limiter
+from retry import call_with_retry, call_with_retry_async
+
+
+DEFAULT_MAX_WORKERS = 4
+# 透传给 chat.completions.create 的推理参数；langextract 传入的其他参数（如 max_workers）不属于 API
+API_PARAMS = ('temperature', 'max_tokens', 'top_p', 'response_format', 'seed', 'stop',
+              'frequency_penalty', 'presence_penalty')
+
+# 提取类别 -> 结构化结果中的字段名
+EXTRACTION_CLASSES = {
+    'summary': 'summary',
+    'key_point': 'key_points',
+    'fact': 'facts',
+    'source': 'sources'
+}
+
+EXTRACTION_DESCRIPTION = """从网络搜索结果中提取结构化信息，extraction_text 必须是原文中的连续片段，不要改写。
+类别：
+- summary：最能概括主题的原文句子，属性 gist 为一句话概括
+- key_point：关键要点所在的原文片段（3-5 条），属性 point 为简短的要点表述
+- fact：具体的事实或数据（日期、数字、名称等），属性 type（日期 | 数据 | 事件 | 人物 | 机构 | 其他）和 subject（描述的对象）
+- source：来源链接或出处，属性 name 为来源名称
+按在原文中出现的顺序输出，同一片段不要重复提取。"""
+
+EXAMPLE_TEXT = (
+    "# [DuckDuckGo] Python 3.12 正式发布\n"
+    "链接: https://www.python.org/downloads/release/python-3120/\n\n"
+    "Python 3.12 于 2023 年 10 月 2 日正式发布。新版本改进了错误提示，并引入 PEP 695 类型参数语法。"
+    "官方称部分基准测试的性能提升约 5%。\n\n"
+)
+EXAMPLE_EXTRACTIONS = (
+    ('source', 'https://www.python.org/downloads/release/python-3120/', {'name': 'Python 官网'}),
+    ('summary', 'Python 3.12 于 2023 年 10 月 2 日正式发布',
+     {'gist': 'Python 3.12 已正式发布，改进了错误提示、类型语法和性能'}),
+    ('fact', '2023 年 10 月 2 日', {'type': '日期', 'subject': 'Python 3.12 发布日期'}),
+    ('key_point', '改进了错误提示', {'point': '错误提示更友好'}),
+    ('key_point', '引入 PEP 695 类型参数语法', {'point': '新增类型参数语法（PEP 695）'}),
+    ('fact', '约 5%', {'type': '数据', 'subject': '基准测试性能提升'}),
+)
+
 
 if HAS_LANGEXTRACT and lx:
+    try:
+        from langextract.core.base_model import BaseLanguageModel as _BaseLanguageModel
+        from langextract.core.types import ScoredOutput as _ScoredOutput
+    except ImportError:
+        _BaseLanguageModel = lx.inference.BaseLanguageModel
+        _ScoredOutput = lx.inference.ScoredOutput
+
+    try:
+        from langextract.providers.schemas.openai import OpenAISchema
+    except ImportError:
+        OpenAISchema = None
+
     @lx.providers.registry.register(
         r'^glm', r'^zhipu', r'^doubao', r'^volcengine', r'^kimi', r'^gpt', r'^claude',
         priority=10
     )
-    class OpenAICompatibleModel(lx.inference.BaseLanguageModel):
+    class OpenAICompatibleModel(_BaseLanguageModel):
         """通用 OpenAI 兼容模型"""
-        
-        def __init__(self, model_id: str, api_key: str = None, base_url: str = None, **kwargs):
+
+        def __init__(self, model_id: str, api_key: str = None, base_url: str = None,
+                     max_workers: int = None, qps: float = None, tpm: float = None,
+                     retry_policy: dict = None, timeout: float = None, params: dict = None,
+                     deadline: float = None, **kwargs):
             super().__init__()
-            
+
             self.model_id = model_id
             self.api_key = api_key
             self.base_url = base_url
-            
+            self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+            self.qps = qps
+            self.tpm = tpm
+            self.retry_policy = retry_policy
+            self.timeout = timeout
+            self.deadline = deadline
+            # 默认推理参数（temperature、max_tokens 等），lx.extract 传入 model 时不会再转发这些参数
+            self.params = {key: value for key, value in (params or {}).items() if key in API_PARAMS}
+            self.usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+            self._usage_lock = threading.Lock()
+
             if not self.model_id:
                 raise ValueError("model_id is required")
             if not self.api_key:
                 raise ValueError("api_key is required")
-            
+
             if not HAS_OPENAI:
                 raise ImportError("openai package is required")
-            
-            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+
+            self.client = self._create_client()
+            # 与 search.extract_with_langextract 使用相同的限流器键，同一 Provider + API Key 共享配额
+            self.rate_limiter = get_provider_limiter(
+                f"llm:{self.base_url}", self.api_key, qps=self.qps, tpm=self.tpm
+            )
+
+        @classmethod
+        def get_schema_class(cls):
+            """支持 json_schema 的 Provider 可用 OpenAISchema 约束输出（extraction.schema_constraints）。"""
+            return OpenAISchema
+
+        def _create_client(self):
+            return get_openai_client(api_key=self.api_key, base_url=self.base_url)
+
+        def _api_kwargs(self, kwargs):
+            api_kwargs = dict(self.params)
+            api_kwargs.update({key: kwargs[key] for key in API_PARAMS if kwargs.get(key) is not None})
+            if 'max_tokens' not in api_kwargs and kwargs.get('max_output_tokens'):
+                api_kwargs['max_tokens'] = kwargs['max_output_tokens']
+            return api_kwargs
+
+        def _request_kwargs(self, api_kwargs):
+            if self.schema is not None and OpenAISchema is not None and isinstance(self.schema, OpenAISchema):
+                api_kwargs = {'response_format': self.schema.response_format, **api_kwargs}
+            return api_kwargs
+
+        def _create(self, client, prompt, api_kwargs, timeout=None):
+            """发送一次 chat.completions 请求（AsyncOpenAI 客户端返回协程）；timeout 为本次尝试的超时。"""
+            if timeout:
+                api_kwargs = {**api_kwargs, 'timeout': timeout}
+            return client.chat.completions.create(
+                model=self.model_id,
+                messages=[{"role": "user", "content": prompt}],
+                **api_kwargs
+            )
+
+        def _retry_kwargs(self, tokens):
+            """call_with_retry 的参数：单次请求超时与截止时间由重试层按剩余时间换算。"""
+            return {'policy': self.retry_policy, 'limiter': self.rate_limiter, 'tokens': tokens,
+                    'timeout': self.timeout, 'deadline': self.deadline}
+
+        def _record_usage(self, response):
+            usage = parse_usage(getattr(response, "usage", None)) or {}
+            with self._usage_lock:
+                self.usage["requests"] += 1
+                for key in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+                    self.usage[key] += usage.get(key, 0)
+
+        def _complete(self, prompt, api_kwargs):
+            api_kwargs = self._request_kwargs(api_kwargs)
+            tokens = estimate_tokens(prompt) + (api_kwargs.get('max_tokens') or 0)
+            response = call_with_retry(
+                lambda timeout=None: self._create(self.client, prompt, api_kwargs, timeout),
+                **self._retry_kwargs(tokens)
+            )
+            self._record_usage(response)
+            return response.choices[0].message.content
 
         def infer(self, batch_prompts, **kwargs):
-            api_kwargs = kwargs.copy()
-            
-            for prompt in batch_prompts:
-                response = self.client.chat.completions.create(
-                    model=self.model_id,
-                    messages=[{"role": "user", "content": prompt}],
-                    **api_kwargs
+            """并发处理一批提示词，按输入顺序产出结果。"""
+            api_kwargs = self._api_kwargs(kwargs)
+            prompts = list(batch_prompts)
+
+            if len(prompts) <= 1 or self.max_workers <= 1:
+                for prompt in prompts:
+                    output = self._complete(prompt, api_kwargs)
+                    yield [_ScoredOutput(score=1.0, output=output)]
+                return
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(prompts))) as pool:
+                futures = [pool.submit(self._complete, prompt, api_kwargs) for prompt in prompts]
+                for future in futures:
+                    yield [_ScoredOutput(score=1.0, output=future.result())]
+
+    class AsyncOpenAICompatibleModel(OpenAICompatibleModel):
+        """
+        AsyncOpenAI 版本的 OpenAI 兼容模型。
+
+        ainfer 在事件循环中并发发送一批请求（最多 max_workers 个同时进行）；infer 供 lx.extract 在工作线程中调用，
+        把请求提交到 loop 上执行并等待结果。未指定 loop 时在当前线程临时创建事件循环。
+        """
+
+        def __init__(self, model_id: str, loop=None, **kwargs):
+            self.loop = loop
+            super().__init__(model_id, **kwargs)
+
+        def _create_client(self):
+            # AsyncOpenAI 绑定事件循环，在 ainfer 中按当前循环获取
+            return None
+
+        async def _acomplete(self, prompt, api_kwargs, semaphore):
+            api_kwargs = self._request_kwargs(api_kwargs)
+            tokens = estimate_tokens(prompt) + (api_kwargs.get('max_tokens') or 0)
+            client = get_async_openai_client(api_key=self.api_key, base_url=self.base_url)
+            async with semaphore:
+                response = await call_with_retry_async(
+                    lambda timeout=None: self._create(client, prompt, api_kwargs, timeout),
+                    **self._retry_kwargs(tokens)
                 )
-                output = response.choices[0].message.content
-                yield [lx.inference.ScoredOutput(score=1.0, output=output)]
+            self._record_usage(response)
+            return response.choices[0].message.content
+
+        async def ainfer(self, batch_prompts, **kwargs):
+            """并发处理一批提示词，按输入顺序返回 [[ScoredOutput], ...]。"""
+            api_kwargs = self._api_kwargs(kwargs)
+            semaphore = asyncio.Semaphore(self.max_workers)
+            outputs = await asyncio.gather(
+                *(self._acomplete(prompt, api_kwargs, semaphore) for prompt in batch_prompts)
+            )
+            return [[_ScoredOutput(score=1.0, output=output)] for output in outputs]
+
+        def infer(self, batch_prompts, **kwargs):
+            prompts = list(batch_prompts)
+            if self.loop is not None:
+                outputs = asyncio.run_coroutine_threadsafe(self.ainfer(prompts, **kwargs), self.loop).result()
+            else:
+                async def run():
+                    try:
+                        return await self.ainfer(prompts, **kwargs)
+                    finally:
+                        await aclose_loop_clients()
+                outputs = asyncio.run(run())
+            yield from outputs
+
+
+def build_examples():
+    """few-shot 示例：一条渲染后的搜索结果及其四类提取。"""
+    return [lx.data.ExampleData(
+        text=EXAMPLE_TEXT,
+        extractions=[
+            lx.data.Extraction(extraction_class=cls, extraction_text=text, attributes=dict(attributes))
+            for cls, text, attributes in EXAMPLE_EXTRACTIONS
+        ]
+    )]
+
+
+def _unicode_tokenizer():
+    # 中文没有空格分词，按 Unicode 字素切分才能把提取结果对齐回原文
+    try:
+        from langextract.core.tokenizer import UnicodeTokenizer
+        return UnicodeTokenizer()
+    except ImportError:
+        return None
+
+
+def extract_structured(documents, model_config: dict, extraction_config: dict, params: dict = None,
+                       retry_policy: dict = None, timeout: float = None, loop=None, deadline: float = None):
+    """
+    用 lx.extract 对搜索结果做分块并行的结构化提取。
+
+    Args:
+        documents: collect_documents 的文档列表（已去重 / 排序），按顺序拼接为输入文本
+        model_config: get_langextract_config() 的结果
+        extraction_config: get_extraction_config() 的结果（max_char_buffer、batch_length、
+                           extraction_passes、schema_constraints）
+        params: 推理参数（temperature、max_tokens、top_p）
+        retry_policy: 重试策略
+        timeout: 单次模型请求的超时（秒）
+        deadline: 可选的截止时刻（time.monotonic()），分块请求的超时与重试都不超过它
+        loop: 可选的事件循环；指定时使用 AsyncOpenAICompatibleModel，模型请求在该循环上执行
+              （此时应在工作线程中调用本函数，如 asyncio.to_thread）
+
+    Returns:
+        dict: {summary, key_points, facts, sources, documents, stats}；
+              每条提取为 {text, start, end, alignment, attributes, source}，start/end 为输入文本中的字符区间，
+              source 为 {engine, rank, url, title, start, end}（start/end 为该结果渲染文本内的区间）；
+              documents 记录各搜索结果在输入文本中的区间
+    """
+    if not HAS_LANGEXTRACT:
+        raise ImportError("langextract 未安装：pip install langextract")
+
+    offsets = []
+    position = 0
+    for doc in documents:
+        offsets.append(position)
+        position += len(doc["text"])
+    text = "".join(doc["text"] for doc in documents)
+
+    model_class = AsyncOpenAICompatibleModel if loop is not None else OpenAICompatibleModel
+    model_kwargs = {'loop': loop} if loop is not None else {}
+    model = model_class(
+        model_id=model_config['model'],
+        api_key=model_config['apiKey'],
+        base_url=model_config['baseUrl'],
+        max_workers=model_config['max_workers'],
+        qps=model_config.get('qps'),
+        tpm=model_config.get('tpm'),
+        retry_policy=retry_policy,
+        timeout=timeout,
+        deadline=deadline,
+        params=params,
+        **model_kwargs
+    )
+    examples = build_examples()
+    if extraction_config['schema_constraints'] and OpenAISchema is not None:
+        model.apply_schema(OpenAISchema.from_examples(examples))
+
+    tokenizer = _unicode_tokenizer()
+    kwargs = {'tokenizer': tokenizer} if tokenizer is not None else {}
+    annotated = lx.extract(
+        text_or_documents=text,
+        prompt_description=EXTRACTION_DESCRIPTION,
+        examples=examples,
+        model=model,
+        max_char_buffer=extraction_config['max_char_buffer'],
+        batch_length=max(extraction_config['batch_length'], model.max_workers),
+        max_workers=model.max_workers,
+        extraction_passes=extraction_config['extraction_passes'],
+        use_schema_constraints=False,
+        show_progress=False,
+        **kwargs
+    )
+
+    structured = {field: [] for field in EXTRACTION_CLASSES.values()}
+    ungrounded = 0
+    for extraction in annotated.extractions or []:
+        field = EXTRACTION_CLASSES.get(extraction.extraction_class)
+        if field is None:
+            continue
+        interval = extraction.char_interval
+        start = getattr(interval, "start_pos", None)
+        end = getattr(interval, "end_pos", None)
+        if start is None or end is None:
+            ungrounded += 1
+        item = {
+            "text": extraction.extraction_text,
+            "start": start,
+            "end": end,
+            "alignment": extraction.alignment_status.value if extraction.alignment_status else None,
+            "attributes": extraction.attributes or {},
+            "source": None
+        }
+        if start is not None and documents:
+            index = bisect.bisect_right(offsets, start) - 1
+            doc = documents[index]
+            item["source"] = {
+                "engine": doc["source"], "rank": doc["rank"], "url": doc["url"], "title": doc["title"],
+                "start": start - offsets[index], "end": min(end, offsets[index] + len(doc["text"])) - offsets[index]
+            }
+        structured[field].append(item)
+
+    structured["documents"] = [
+        {"engine": doc["source"], "rank": doc["rank"], "url": doc["url"], "title": doc["title"],
+         "start": offsets[i], "end": offsets[i] + len(doc["text"])}
+        for i, doc in enumerate(documents)
+    ]
+    structured["stats"] = {
+        "input_chars": len(text),
+        "max_char_buffer": extraction_config['max_char_buffer'],
+        "extraction_passes": extraction_config['extraction_passes'],
+        "extractions": sum(len(structured[field]) for field in EXTRACTION_CLASSES.values()),
+        "ungrounded": ungrounded,
+        **model.usage
+    }
+    return structured
@@ -0,0 +1,103 @@
+"""
+按 token 预算打包搜索结果
+
+用本地近似估算每条结果的 token 数（中日韩字符约 1 token/字，其余文本约 4 字符/token），
+按顺序放入整条结果直到填满预算，避免在结果中间截断，也避免超出模型上下文。
+"""
+
+import re
+
+
+CJK_RE = re.compile(
+    r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+    r"\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+SENTENCE_END_RE = re.compile(r"[。！？!?；;\n]|\.\s")
+
+CJK_TOKENS_PER_CHAR = 1.0
+OTHER_CHARS_PER_TOKEN = 4.0
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数（偏保守，宁多勿少）。"""
+    if not text:
+        return 0
+    cjk = len(CJK_RE.findall(text))
+    other = len(text) - cjk
+    return int(cjk * CJK_TOKENS_PER_CHAR + other / OTHER_CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """将文本截断到不超过 max_tokens，尽量在句子边界处截断。"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text[:low]
+    boundaries = [m.end() for m in SENTENCE_END_RE.finditer(cut)]
+    if boundaries and boundaries[-1] >= len(cut) // 2:
+        cut = cut[:boundaries[-1]]
+    return cut
+
+
+def pack_documents(documents, token_budget: int, max_chars: int = None):
+    """
+    按顺序挑选能完整放入预算的文档。
+
+    Args:
+        documents: 文档列表，每个文档包含 text 字段
+        token_budget: 搜索内容可用的 token 预算
+        max_chars: 可选的字符数上限（兼容 extraction.max_content_length）
+
+    Returns:
+        tuple: (入选文档列表, 统计 {token_budget, used_tokens, used_chars, packed_results,
+                dropped_results, dropped_tokens, truncated})
+
+    放不下的文档会被跳过，后续更短的文档仍可能入选；只有第一条文档就超出预算时，
+    才会在句子边界处截断它，保证至少有内容送入模型。
+    """
+    packed = []
+    used_tokens = 0
+    used_chars = 0
+    dropped_tokens = 0
+    truncated = False
+
+    for doc in documents:
+        text = doc["text"]
+        tokens = estimate_tokens(text)
+        fits_tokens = used_tokens + tokens <= token_budget
+        fits_chars = max_chars is None or used_chars + len(text) <= max_chars
+        if fits_tokens and fits_chars:
+            packed.append(doc)
+            used_tokens += tokens
+            used_chars += len(text)
+            continue
+
+        if not packed and token_budget > 0:
+            cut = truncate_to_tokens(text, token_budget)
+            if max_chars is not None:
+                cut = cut[:max_chars]
+            if cut:
+                packed.append({**doc, "text": cut, "truncated": True})
+                used_tokens += estimate_tokens(cut)
+                used_chars += len(cut)
+                dropped_tokens += max(tokens - estimate_tokens(cut), 0)
+                truncated = True
+                continue
+        dropped_tokens += tokens
+
+    stats = {
+        "token_budget": token_budget,
+        "used_tokens": used_tokens,
+        "used_chars": used_chars,
+        "packed_results": len(packed),
+        "dropped_results": len(documents) - len(packed),
+        "dropped_tokens": dropped_tokens,
+        "truncated": truncated
+    }
+    return packed, stats
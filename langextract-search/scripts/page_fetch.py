@@ -0,0 +1,375 @@
+"""
+搜索结果全文抓取
+
+DuckDuckGo 等引擎只返回很短的摘要，这里在搜索之后并发抓取结果页面并抽取正文：
+- 全局线程池限制总并发，每个域名另有并发上限，避免同时压向同一站点
+- 每个页面最多读取 max_bytes 字节（按解压后的字节数计）；阶段截止时间到达后正在下载的页面在下一个数据块处中止
+- 只抓取解析到公网地址的 http(s) 链接，拒绝内网、本机、链路本地（含云元数据 169.254.169.254）等地址；
+  重定向逐跳跟随，每一跳都重新检查
+- 正文抽取优先使用 trafilatura（可选依赖），未安装时使用内置的 HTMLParser 规则
+  （跳过 script/nav/footer 等区块，优先 article/main，丢弃链接密度高的导航块）
+- 抽取后的正文按 URL 缓存在本地，新鲜期内直接使用，过期后带 ETag / Last-Modified 条件请求，
+  304 时沿用缓存内容
+"""
+
+import importlib.util
+import ipaddress
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from disk_cache import make_cache_key
+
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0 Safari/537.36"
+)
+CHUNK_SIZE = 16 * 1024
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+# ddgs 约定的 Tor Browser 代理简写
+TOR_BROWSER_PROXY = "socks5h://127.0.0.1:9150"
+ALLOWED_SCHEMES = ("http", "https")
+MAX_REDIRECTS = 5
+
+SKIP_TAGS = frozenset((
+    "script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside",
+    "form", "iframe", "button", "select", "textarea", "head"
+))
+BLOCK_TAGS = frozenset((
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6",
+    "pre", "blockquote", "table", "tr", "td", "th", "dd", "dt", "br", "hr", "figcaption"
+))
+MAIN_TAGS = frozenset(("article", "main"))
+# 正文区块的最少字符数；更短且链接占比高的区块视为导航
+MIN_BLOCK_CHARS = 20
+MAX_LINK_DENSITY = 0.5
+MIN_MAIN_CHARS = 200
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+_SPACE_RE = re.compile(r"[ \t\r\f\v\u00a0\u3000]+")
+
+HAS_TRAFILATURA = importlib.util.find_spec("trafilatura") is not None
+
+
+class _TextExtractor(HTMLParser):
+    """按块收集可见文本，记录每块的链接文字长度以及是否位于 article/main 内。"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []  # (text, link_chars, in_main)
+        self._parts = []
+        self._link_chars = 0
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._link_depth = 0
+
+    def _flush(self):
+        text = _SPACE_RE.sub(" ", "".join(self._parts)).strip()
+        if text:
+            self.blocks.append((text, self._link_chars, self._main_depth > 0))
+        self._parts = []
+        self._link_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in MAIN_TAGS:
+            self._main_depth += 1
+        elif tag == "a":
+            self._link_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in MAIN_TAGS:
+            self._main_depth = max(0, self._main_depth - 1)
+        elif tag == "a":
+            self._link_depth = max(0, self._link_depth - 1)
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._parts.append(data)
+        if self._link_depth:
+            self._link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _builtin_main_text(html: str) -> str:
+    extractor = _TextExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception:
+        extractor._flush()
+    blocks = [
+        (text, in_main) for text, link_chars, in_main in extractor.blocks
+        if len(text) >= MIN_BLOCK_CHARS and link_chars <= len(text) * MAX_LINK_DENSITY
+    ]
+    main_blocks = [text for text, in_main in blocks if in_main]
+    if sum(len(text) for text in main_blocks) >= MIN_MAIN_CHARS:
+        return "\n".join(main_blocks)
+    return "\n".join(text for text, _ in blocks)
+
+
+def extract_main_text(html: str, max_chars: int = None) -> str:
+    """抽取页面正文（trafilatura 优先），超过 max_chars 时在句子边界截断。"""
+    text = ""
+    if HAS_TRAFILATURA:
+        try:
+            import trafilatura
+            text = trafilatura.extract(html, include_comments=False, include_tables=True) or ""
+        except Exception:
+            text = ""
+    if not text:
+        text = _builtin_main_text(html)
+    if max_chars and len(text) > max_chars:
+        cut = text[:max_chars]
+        boundary = max(cut.rfind(mark) for mark in ("。", "！", "？", ". ", "!", "?", "\n"))
+        text = cut[:boundary + 1] if boundary > max_chars // 2 else cut
+    return text.strip()
+
+
+def normalize_url(url: str) -> str:
+    """缓存键使用的 URL：去掉片段，协议与主机名小写。"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+def _decode(body: bytes, encoding: str = None) -> str:
+    if not encoding:
+        match = _CHARSET_RE.search(body[:4096])
+        encoding = match.group(1).decode("ascii", "ignore") if match else "utf-8"
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+class BlockedURLError(ValueError):
+    """URL 不是 http(s)，或主机解析到内网 / 本机 / 链路本地等非公网地址。"""
+
+
+def is_public_address(address: str) -> bool:
+    """地址是否为可抓取的公网单播地址（IPv4 映射的 IPv6 地址按其 IPv4 地址判断）。"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_public_url(url: str, allow_unresolved: bool = False):
+    """
+    确认 URL 可以抓取：协议为 http(s)，且主机（IP 字面量或 DNS 解析出的全部地址）都是公网地址。
+
+    allow_unresolved 为 True（经代理抓取）时，本地无法解析的主机交给代理解析，不视为错误。
+    不满足时抛出 BlockedURLError。
+    """
+    parts = urlsplit(url)
+    host = parts.hostname
+    if parts.scheme.lower() not in ALLOWED_SCHEMES or not host:
+        raise BlockedURLError(f"不支持的 URL: {url}")
+    try:
+        addresses = [str(ipaddress.ip_address(host))]
+    except ValueError:
+        try:
+            infos = socket.getaddrinfo(host, parts.port or (443 if parts.scheme.lower() == "https" else 80),
+                                       type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            if allow_unresolved:
+                return
+            raise
+        addresses = [info[4][0] for info in infos]
+    blocked = [address for address in addresses if not is_public_address(address)]
+    if blocked:
+        raise BlockedURLError(f"拒绝抓取非公网地址: {host} -> {blocked[0]}")
+
+
+class PageFetcher:
+    """并发抓取页面正文，进程内共享（全局线程池 + 每域名信号量 + 正文缓存）。"""
+
+    def __init__(self, cache=None, max_workers: int = 8, per_domain: int = 2, max_bytes: int = 1024 * 1024,
+                 max_chars: int = 8000, timeout: float = 10, proxy: str = None, fresh_ttl: float = 3600,
+                 cache_ttl: float = 7 * 86400, user_agent: str = DEFAULT_USER_AGENT, allow_private: bool = False):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.cache = cache
+        self.per_domain = max(1, int(per_domain))
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.fresh_ttl = fresh_ttl
+        self.cache_ttl = cache_ttl
+        self.allow_private = allow_private
+        self._proxied = bool(proxy)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="page-fetch")
+        self._domain_lock = threading.Lock()
+        self._domain_slots = {}
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, int(max_workers)), pool_maxsize=max(1, int(max_workers)))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update({
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml;q=0.9,text/plain;q=0.8,*/*;q=0.5",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
+        })
+        if proxy:
+            proxy = TOR_BROWSER_PROXY if proxy == "tb" else proxy
+            self._session.proxies.update({"http": proxy, "https": proxy})
+
+    def _domain_slot(self, host: str):
+        with self._domain_lock:
+            slot = self._domain_slots.get(host)
+            if slot is None:
+                slot = self._domain_slots[host] = threading.BoundedSemaphore(self.per_domain)
+            return slot
+
+    def _get(self, url: str, headers: dict, deadline: float = None):
+        """GET 并逐跳跟随重定向，每一跳请求前都检查目标地址（allow_private 时不检查）。"""
+        for _ in range(MAX_REDIRECTS + 1):
+            if not self.allow_private:
+                check_public_url(url, allow_unresolved=self._proxied)
+            timeout = self.timeout
+            if deadline:
+                timeout = max(0.5, min(timeout, deadline - time.monotonic()))
+            response = self._session.get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(url, response.headers["Location"])
+            # 条件请求头只对应原始 URL 的缓存
+            headers = {}
+        raise ValueError(f"重定向超过 {MAX_REDIRECTS} 次")
+
+    def fetch(self, url: str, deadline: float = None, abort: threading.Event = None,
+              read_cache: bool = True, write_cache: bool = True) -> dict:
+        """
+        抓取单个页面。
+
+        Returns:
+            dict: {url, success, text, status, cache, bytes, truncated, elapsed_ms, error}，
+                  cache 为 hit（新鲜期内）| revalidated（304）| miss
+        """
+        start = time.monotonic()
+        result = {"url": url, "success": False, "text": "", "status": None, "cache": "miss",
+                  "bytes": 0, "truncated": False, "error": None}
+        try:
+            self._fetch(url, result, deadline, abort, read_cache, write_cache)
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+        result["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        return result
+
+    def _fetch(self, url, result, deadline, abort, read_cache, write_cache):
+        key = make_cache_key("page", normalize_url(url))
+        cached = self.cache.get(key) if self.cache is not None and read_cache else None
+        if cached is not None and time.time() - cached["fetched_at"] < self.fresh_ttl:
+            result.update(success=True, text=cached["text"], status=cached.get("status"), cache="hit")
+            return
+
+        host = urlsplit(url).hostname or ""
+        slot = self._domain_slot(host)
+        wait_timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+        if not slot.acquire(timeout=wait_timeout):
+            raise TimeoutError("等待域名并发槽位超时")
+        try:
+            if abort is not None and abort.is_set():
+                raise TimeoutError("抓取阶段已结束")
+            headers = {}
+            if cached is not None:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+            response = self._get(url, headers, deadline)
+            try:
+                result["status"] = response.status_code
+                if response.status_code == 304 and cached is not None:
+                    cached["fetched_at"] = time.time()
+                    if self.cache is not None and write_cache:
+                        self.cache.set(key, cached, ttl=self.cache_ttl)
+                    result.update(success=True, text=cached["text"], cache="revalidated")
+                    return
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if content_type and content_type not in TEXT_CONTENT_TYPES:
+                    raise ValueError(f"不支持的内容类型: {content_type}")
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if (abort is not None and abort.is_set()) or (deadline and time.monotonic() > deadline):
+                        raise TimeoutError("抓取阶段已结束")
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.max_bytes:
+                        result["truncated"] = True
+                        break
+                body = b"".join(chunks)[:self.max_bytes]
+                encoding = response.encoding if "charset" in response.headers.get("Content-Type", "") else None
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+            finally:
+                response.close()
+        finally:
+            slot.release()
+
+        result["bytes"] = len(body)
+        html = _decode(body, encoding)
+        if content_type == "text/plain":
+            text = html.strip()[:self.max_chars or None]
+        else:
+            text = extract_main_text(html, self.max_chars)
+        result.update(success=bool(text), text=text)
+        if not text:
+            result["error"] = "未抽取到正文"
+        if text and self.cache is not None and write_cache:
+            self.cache.set(key, {
+                "text": text, "status": result["status"], "etag": etag,
+                "last_modified": last_modified, "fetched_at": time.time()
+            }, ttl=self.cache_ttl)
+
+    def fetch_many(self, urls, timeout: float = None, read_cache: bool = True, write_cache: bool = True):
+        """
+        并发抓取多个页面，最多等待 timeout 秒；超时后未开始的任务取消，下载中的任务在下一个数据块处中止。
+
+        Returns:
+            dict: url -> fetch 的结果（超时的页面 error 为 deadline）
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        deadline = time.monotonic() + timeout if timeout else None
+        abort = threading.Event()
+        futures = {
+            self._executor.submit(self.fetch, url, deadline, abort, read_cache, write_cache): url
+            for url in urls
+        }
+        done, not_done = wait(futures, timeout=timeout)
+        abort.set()
+        pages = {futures[future]: future.result() for future in done}
+        for future in not_done:
+            future.cancel()
+            pages[futures[future]] = {"url": futures[future], "success": False, "text": "", "cache": "miss",
+                                      "bytes": 0, "error": "deadline"}
+        return pages
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
@@ -0,0 +1,110 @@
+"""
+提取提示词模板
+
+豆包（方舟）、GLM 和 OpenAI 兼容接口会自动缓存请求中相同的提示词前缀，命中部分计费更低、预填充更快。
+模板把固定的角色设定与提取要求放在最前面（system 消息，或 user 消息开头），每次变化的搜索内容放在最后，
+不同查询之间的请求共享同一个前缀。
+
+各 Provider 可在 conf.json 的 prompt.providers 中覆盖 system、instructions、layout 等字段。
+"""
+
+import hashlib
+
+
+DEFAULT_SYSTEM = "你是一个信息提取助手，负责从网络搜索结果中整理出准确、有来源依据的结构化信息。"
+
+DEFAULT_INSTRUCTIONS = """下面会给出网络搜索结果（包含智谱、DuckDuckGo、火山引擎的结果），请提取结构化信息：
+
+请提取以下信息：
+1. 主要内容摘要
+2. 关键点列表（3-5个）
+3. 相关事实或数据
+4. 来源或参考信息（如果有）
+
+请用清晰的格式输出。"""
+
+DEFAULT_CONTENT_HEADER = "搜索结果：\n"
+
+# system：固定前缀作为 system 消息，搜索内容作为 user 消息；
+# user：不支持 system 角色的 Provider 把固定前缀与搜索内容依次放进同一条 user 消息
+LAYOUTS = ('system', 'user')
+
+
+class PromptTemplate:
+    """固定前缀在前、搜索内容在后的提取提示词。"""
+
+    def __init__(self, system: str = DEFAULT_SYSTEM, instructions: str = DEFAULT_INSTRUCTIONS,
+                 content_header: str = DEFAULT_CONTENT_HEADER, layout: str = 'system', stream_usage: bool = True):
+        if layout not in LAYOUTS:
+            raise ValueError(f"未知的提示词布局: {layout}，可选 {', '.join(LAYOUTS)}")
+        self.system = system or ""
+        self.instructions = instructions or ""
+        self.content_header = content_header or ""
+        self.layout = layout
+        self.stream_usage = stream_usage
+
+    @property
+    def prefix(self) -> str:
+        """所有请求共享的固定前缀。"""
+        return "\n\n".join(part for part in (self.system, self.instructions) if part)
+
+    def messages(self, content: str):
+        """组装 chat/completions 的 messages，搜索内容位于最后。"""
+        if self.layout == 'system':
+            return [
+                {"role": "system", "content": self.prefix},
+                {"role": "user", "content": self.content_header + content}
+            ]
+        return [{"role": "user", "content": f"{self.prefix}\n\n{self.content_header}{content}"}]
+
+    def fixed_text(self) -> str:
+        """模板中除搜索内容外的全部文本（用于 token 预算估算）。"""
+        return self.prefix + self.content_header
+
+    def fingerprint(self) -> str:
+        """模板内容的短哈希，用于提取缓存键与结果记录。"""
+        digest = hashlib.sha256(f"{self.layout}\0{self.prefix}\0{self.content_header}".encode("utf-8"))
+        return digest.hexdigest()[:12]
+
+    def preview(self, content: str, limit: int = 200) -> str:
+        """提示词开头的预览（结果中的 input.extraction_prompt）。"""
+        text = "\n\n".join(message["content"] for message in self.messages(content))
+        return text[:limit] + "..."
+
+
+def build_prompt_template(prompt_conf: dict, provider: str = None) -> PromptTemplate:
+    """按 get_prompt_config() 的结果生成模板，provider 在 providers 中有配置时覆盖对应字段。"""
+    keys = ('system', 'instructions', 'content_header', 'layout', 'stream_usage')
+    fields = {key: prompt_conf[key] for key in keys if key in prompt_conf}
+    overrides = (prompt_conf.get('providers') or {}).get(provider or '', {})
+    fields.update((key, value) for key, value in overrides.items() if key in keys)
+    return PromptTemplate(**fields)
+
+
+def parse_usage(usage) -> dict:
+    """
+    解析响应中的 usage，返回 {prompt_tokens, cached_tokens, completion_tokens, total_tokens, cache_hit_rate}。
+
+    命中前缀缓存的 token 数依次取 prompt_tokens_details.cached_tokens（OpenAI、方舟、GLM）、
+    prompt_cache_hit_tokens（DeepSeek）和 cached_tokens；响应中没有 usage 时返回 None。
+    """
+    if not usage:
+        return None
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    details = usage.get("prompt_tokens_details") or {}
+    cached_tokens = (
+        details.get("cached_tokens")
+        or usage.get("prompt_cache_hit_tokens")
+        or usage.get("cached_tokens")
+        or 0
+    )
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": usage.get("total_tokens") or prompt_tokens + completion_tokens,
+        "cache_hit_rate": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else None
+    }
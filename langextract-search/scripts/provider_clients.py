@@ -0,0 +1,252 @@
+"""
+Provider 客户端注册表
+
+进程内共享的 HTTP 连接池与 SDK 客户端：
+- 每个 base URL（scheme + host）一个带连接池的 requests.Session，复用 keep-alive 连接
+- 每个 API Key 一个 ZhipuAiClient
+- 每个 (base_url, api_key) 一个 OpenAI 客户端
+- 每组 (timeout, proxy) 一个 DDGS 实例池：DDGS 不保证线程安全，每次搜索借出一个空闲实例，用完归还
+- 异步路径：每个事件循环一个 httpx.AsyncClient，每个 (事件循环, base_url, api_key) 一个 AsyncOpenAI 客户端
+  （异步客户端绑定创建它的事件循环，不能跨循环复用）
+
+批量模式和常驻进程中可避免重复的 TCP/TLS 握手。
+各 SDK 均在首次使用时才导入，未启用的 Provider 不产生导入开销。
+可通过 register_factory 替换客户端的构造方式（如离线基准测试中的替身客户端）。
+"""
+
+import importlib.util
+import threading
+import weakref
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_ASYNC_MAX_CONNECTIONS = 100
+
+_lock = threading.Lock()
+_pool_settings = {
+    'pool_connections': DEFAULT_POOL_CONNECTIONS,
+    'pool_maxsize': DEFAULT_POOL_MAXSIZE,
+    'async_max_connections': DEFAULT_ASYNC_MAX_CONNECTIONS
+}
+_sessions = {}
+_zhipu_clients = {}
+_openai_clients = {}
+_ddgs_idle = {}
+# 事件循环 -> {'http': httpx.AsyncClient, 'openai': {(base_url, api_key): AsyncOpenAI}}，循环销毁后自动释放
+_loop_clients = weakref.WeakKeyDictionary()
+_factories = {}
+FACTORY_KINDS = ('zhipu', 'openai', 'async_openai', 'ddgs')
+SDK_MODULES = {'zhipu': 'zai', 'openai': 'openai', 'async_openai': 'openai', 'ddgs': 'ddgs'}
+
+
+def configure(pool_connections: int = None, pool_maxsize: int = None, async_max_connections: int = None):
+    """设置之后新建 Session / 异步客户端的连接池大小（已创建的客户端不受影响）。"""
+    with _lock:
+        if pool_connections:
+            _pool_settings['pool_connections'] = pool_connections
+        if pool_maxsize:
+            _pool_settings['pool_maxsize'] = pool_maxsize
+        if async_max_connections:
+            _pool_settings['async_max_connections'] = async_max_connections
+
+
+def register_factory(kind: str, factory=None):
+    """
+    替换某类客户端的构造函数，factory=None 恢复使用官方 SDK。
+
+    factory 的参数与对应 SDK 构造函数一致：
+        zhipu: factory(api_key=..., [base_url=...])
+        openai / async_openai: factory(api_key=..., base_url=...)
+        ddgs: factory(timeout=..., [proxy=...])
+    已缓存的客户端会被丢弃。
+    """
+    if kind not in FACTORY_KINDS:
+        raise ValueError(f"未知的客户端类型: {kind}，可选 {', '.join(FACTORY_KINDS)}")
+    with _lock:
+        if factory is None:
+            _factories.pop(kind, None)
+        else:
+            _factories[kind] = factory
+        _zhipu_clients.clear()
+        _openai_clients.clear()
+        _ddgs_idle.clear()
+        for clients in _loop_clients.values():
+            clients['openai'] = {}
+
+
+def sdk_available(kind: str) -> bool:
+    """该类客户端是否可用（已注册替身或已安装 SDK），不会导入 SDK。"""
+    return kind in _factories or importlib.util.find_spec(SDK_MODULES[kind]) is not None
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def get_http_session(base_url: str):
+    """获取 base_url 所在站点共享的连接池 requests.Session。"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    origin = _origin(base_url)
+    with _lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=_pool_settings['pool_connections'],
+                pool_maxsize=_pool_settings['pool_maxsize']
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Connection": "keep-alive"})
+            _sessions[origin] = session
+        return session
+
+
+def get_zhipu_client(api_key: str, base_url: str = None):
+    """获取共享的智谱 ZhipuAiClient；未安装 zai-sdk 时抛出 ImportError。"""
+    factory = _factories.get('zhipu')
+    kwargs = {'api_key': api_key}
+    if factory is None:
+        from zai import ZhipuAiClient as factory
+        kwargs['max_retries'] = 0  # 重试由 retry.call_with_retry 统一处理
+
+    key = (api_key, base_url)
+    with _lock:
+        client = _zhipu_clients.get(key)
+        if client is None:
+            if base_url:
+                kwargs['base_url'] = base_url
+            client = factory(**kwargs)
+            _zhipu_clients[key] = client
+        return client
+
+
+def get_openai_client(api_key: str, base_url: str = None):
+    """获取共享的 OpenAI 客户端，按 (base_url, api_key) 复用。"""
+    factory = _factories.get('openai')
+    kwargs = {'api_key': api_key, 'base_url': base_url}
+    if factory is None:
+        from openai import OpenAI as factory
+        kwargs['max_retries'] = 0  # 重试由 retry.call_with_retry 统一处理
+
+    key = (base_url, api_key)
+    with _lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            client = factory(**kwargs)
+            _openai_clients[key] = client
+        return client
+
+
+def _clients_for_running_loop():
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _loop_clients.get(loop)
+        if clients is None:
+            clients = _loop_clients[loop] = {'http': None, 'openai': {}}
+        return clients
+
+
+def get_async_http_client():
+    """获取当前事件循环共享的 httpx.AsyncClient（连接数上限为 async_max_connections），需在协程中调用。"""
+    import httpx
+
+    clients = _clients_for_running_loop()
+    if clients['http'] is None or clients['http'].is_closed:
+        max_connections = _pool_settings['async_max_connections']
+        clients['http'] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+    return clients['http']
+
+
+def get_async_openai_client(api_key: str, base_url: str = None):
+    """获取当前事件循环共享的 AsyncOpenAI 客户端，按 (base_url, api_key) 复用，需在协程中调用。"""
+    factory = _factories.get('async_openai')
+    kwargs = {'api_key': api_key, 'base_url': base_url}
+    if factory is None:
+        from openai import AsyncOpenAI as factory
+        kwargs['max_retries'] = 0  # 重试由 retry.call_with_retry_async 统一处理
+        kwargs['http_client'] = get_async_http_client()
+
+    clients = _clients_for_running_loop()['openai']
+    key = (base_url, api_key)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = factory(**kwargs)
+    return client
+
+
+async def aclose_loop_clients():
+    """关闭当前事件循环的异步客户端（asyncio.run 结束前调用）。"""
+    clients = _clients_for_running_loop()
+    http_client, clients['http'], clients['openai'] = clients['http'], None, {}
+    if http_client is not None:
+        await http_client.aclose()
+
+
+def _close_ddgs(client):
+    exit_ = getattr(client, '__exit__', None)
+    if callable(exit_):
+        try:
+            exit_(None, None, None)
+        except Exception:
+            pass
+
+
+@contextmanager
+def ddgs_client(timeout: int = None, proxy: str = None):
+    """
+    借出一个 (timeout, proxy) 对应的 DDGS 实例，退出时归还到空闲池供后续搜索复用；
+    搜索抛出异常时关闭该实例而不归还。未安装 ddgs 时抛出 ImportError。
+    """
+    factory = _factories.get('ddgs')
+    if factory is None:
+        from ddgs import DDGS as factory
+
+    key = (factory, timeout, proxy)
+    with _lock:
+        idle = _ddgs_idle.get(key)
+        client = idle.pop() if idle else None
+    if client is None:
+        kwargs = {'timeout': timeout}
+        if proxy:
+            kwargs['proxy'] = proxy
+        client = factory(**kwargs)
+
+    try:
+        yield client
+    except BaseException:
+        _close_ddgs(client)
+        raise
+    with _lock:
+        _ddgs_idle.setdefault(key, []).append(client)
+
+
+def close_all():
+    """关闭所有共享的 HTTP Session 与 SDK 客户端。"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        for client in list(_zhipu_clients.values()) + list(_openai_clients.values()):
+            close = getattr(client, 'close', None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+        _zhipu_clients.clear()
+        _openai_clients.clear()
+        for clients in _ddgs_idle.values():
+            for client in clients:
+                _close_ddgs(client)
+        _ddgs_idle.clear()
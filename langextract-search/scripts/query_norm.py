@@ -0,0 +1,224 @@
+"""
+查询规范化与相似查询索引
+
+同一个问题常有多种写法（词序、标点、全角/半角、繁体/简体、末尾的「最新」等），规范化后：
+- normalize_query：NFKC、小写、繁体转简体、标点转空格、中文与拉丁文字之间补空格，用作精确缓存键
+- canonical_query：在 normalize_query 基础上去掉停用词和句末语气词，用于相似度计算
+- QueryIndex：最近已回答查询的字符 n-gram 倒排索引，按 Dice 系数查找最相近的查询，不依赖向量模型或网络服务
+- 去掉停用词后的词项（拉丁词、数字和每个中日韩文字）必须完全相同才算相近：n-gram 相似度对实体替换（中国 / 美国）、
+  否定（支持 / 不支持）、年份和版本号（2024 / 2023、gpt-4o / gpt-4）都给出很高的分数，不能单独作为复用依据
+
+繁简转换优先使用 opencc（可选依赖），未安装时使用内置的常用字对照表。
+"""
+
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+try:
+    import opencc
+    try:
+        _opencc_converter = opencc.OpenCC("t2s")
+    except Exception:
+        _opencc_converter = opencc.OpenCC("t2s.json")
+    HAS_OPENCC = True
+except Exception:
+    _opencc_converter = None
+    HAS_OPENCC = False
+
+
+# 常用繁体字 → 简体字（opencc 未安装时使用）
+_T2S_PAIRS = (
+    "這这 個个 們们 來来 時时 後后 為为 爲为 與与 對对 說说 會会 學学 習习 國国 際际 開开 發发 網网 絡络 "
+    "資资 訊讯 電电 腦脑 軟软 體体 設设 計计 數数 據据 庫库 機机 語语 點点 擊击 連连 線线 價价 從从 麼么 "
+    "問问 題题 應应 該该 關关 係系 經经 濟济 業业 務务 產产 員员 號号 碼码 載载 傳传 輸输 車车 區区 縣县 "
+    "長长 門门 間间 見见 現现 實实 驗验 證证 書书 讀读 寫写 聽听 視视 頻频 圖图 檔档 標标 準准 優优 選选 "
+    "擇择 項项 導导 覽览 歷历 報报 錢钱 銀银 幣币 匯汇 漲涨 氣气 溫温 雲云 東东 華华 灣湾 臺台 陸陆 紅红 "
+    "綠绿 藍蓝 黃黄 戰战 爭争 醫医 藥药 療疗 歲岁 萬万 億亿 兩两 幾几 處处 錯错 誤误 總总 結结 構构 維维 "
+    "護护 術术 領领 節节 約约 級级 廣广 種种 類类 衛卫 團团 隊队 戲戏 劇剧 樂乐 韓韩 歐欧 亞亚 紐纽 讓让 "
+    "還还 進进 過过 運运 動动 遊游 鐘钟 鍵键 鐵铁 錄录 鏡镜 險险 隨随 難难 雙双 雜杂 離离 頁页 顯显 風风 "
+    "飛飞 養养 館馆 馬马 驅驱 齊齐 龍龙 熱热 無无 狀状 獎奖 環环 當当 盡尽 監监 盤盘 確确 禮礼 稱称 穩稳 "
+    "筆笔 範范 簡简 紀纪 純纯 紙纸 細细 終终 組组 給给 統统 緊紧 練练 縮缩 績绩 續续 聯联 職职 興兴 舊旧 "
+    "藝艺 蘋苹 衝冲 補补 裝装 製制 複复 規规 覺觉 觀观 訂订 記记 訪访 詢询 試试 詳详 話话 認认 誰谁 課课 "
+    "調调 談谈 請请 論论 講讲 謝谢 識识 變变 豐丰 負负 貨货 質质 購购 費费 貼贴 賣卖 買买 賽赛 趨趋 軍军 "
+    "較较 輕轻 辦办 農农 邊边 適适 郵邮 鄉乡 釋释 針针 銷销 鋼钢 閱阅 陳陈 階阶 隱隐 雖虽 雞鸡 靈灵 響响 "
+    "順顺 預预 頭头 顏颜 額额 飯饭 飲饮 髮发 鬥斗 魚鱼 鳥鸟 麥麦 黨党 協协 態态 歸归 壓压 擴扩 權权 獨独 "
+    "勢势 參参 義义 專专 將将 單单 嚴严 屬属 層层 帶带 幫帮 廠厂 彈弹 徵征 憑凭 擔担 攝摄 條条 棧栈 極极 "
+    "樣样 檢检 殺杀 減减 測测 溝沟 滿满 災灾 爐炉 牽牵 獲获 畫画 異异"
+)
+_T2S_TABLE = str.maketrans({
+    pair[0]: pair[1] for pair in _T2S_PAIRS.split() if len(pair) == 2 and pair[0] != pair[1]
+})
+
+CJK_CLASS = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_PUNCT_RE = re.compile(r"[^\w\s" + CJK_CLASS + r"]+|_+", re.UNICODE)
+_CJK_LATIN_RE = re.compile(r"(?<=[" + CJK_CLASS + r"])(?=[^\W_])(?![" + CJK_CLASS + r"])"
+                           r"|(?<=[^\W_])(?<![" + CJK_CLASS + r"])(?=[" + CJK_CLASS + r"])", re.UNICODE)
+
+# 可以整体删除的中文虚词短语（先于单字处理）
+ZH_STOP_PHRASES = ("请问", "一下", "最新", "最近", "目前", "现在", "是什么", "什么是", "有哪些", "哪些",
+                   "怎么样", "怎么", "怎样", "如何", "关于", "有关")
+ZH_STOP_CHARS = "的"
+# 只在中文片段末尾删除的语气词
+ZH_TRAILING_PARTICLES = re.compile(r"[吗呢吧啊呀了么]+(?=\s|$)")
+EN_STOPWORDS = frozenset((
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "was", "were", "be",
+    "what", "how", "why", "which", "who", "does", "do", "did", "can", "about", "please", "tell", "me",
+    "latest", "newest", "recent", "current"
+))
+
+NGRAM_SIZES = (2, 3)
+
+
+def to_simplified(text: str) -> str:
+    """繁体转简体：优先使用 opencc，否则按内置对照表逐字转换。"""
+    if _opencc_converter is not None:
+        try:
+            return _opencc_converter.convert(text)
+        except Exception:
+            pass
+    return text.translate(_T2S_TABLE)
+
+
+def normalize_text(text: str) -> str:
+    """NFKC（全角转半角等）+ 小写 + 繁体转简体。"""
+    return to_simplified(unicodedata.normalize("NFKC", text or "").lower())
+
+
+def _replace_punct(match) -> str:
+    # 保留 3.12、gpt-4 中夹在字母数字之间的 . 和 -，以及 c++、c# 末尾的 + 和 #
+    text, start, end = match.string, match.start(), match.end()
+    before = start > 0 and text[start - 1].isalnum()
+    after = end < len(text) and text[end].isalnum()
+    piece = match.group()
+    if before and ((piece in (".", "-") and after) or set(piece) <= {"+", "#"}):
+        return piece
+    return " "
+
+
+def normalize_query(query: str) -> str:
+    """查询的无损规范形式：normalize_text 后标点转空格、中文与拉丁文字之间补空格、合并空白。"""
+    text = _PUNCT_RE.sub(_replace_punct, normalize_text(query))
+    text = _CJK_LATIN_RE.sub(" ", text)
+    return " ".join(text.split())
+
+
+def canonical_query(query: str) -> str:
+    """用于相似度计算的查询形式：去掉停用词与句末语气词，保留原有词序。"""
+    text = normalize_query(query)
+    for phrase in ZH_STOP_PHRASES:
+        text = text.replace(phrase, " ")
+    for char in ZH_STOP_CHARS:
+        text = text.replace(char, "")
+    text = ZH_TRAILING_PARTICLES.sub("", text)
+    words = [word for word in text.split() if word not in EN_STOPWORDS]
+    # 全部是停用词时保留规范化后的原查询，避免空查询互相匹配
+    return " ".join(words) or normalize_query(query)
+
+
+def query_grams(canonical: str):
+    """去掉空格后的字符 2-gram 与 3-gram 集合；过短的查询使用整体作为一个 gram。"""
+    text = canonical.replace(" ", "")
+    grams = {text[i:i + n] for n in NGRAM_SIZES for i in range(len(text) - n + 1)}
+    return frozenset(grams or ({text} if text else ()))
+
+
+_LATIN_WORD_RE = re.compile(r"(?:(?![" + CJK_CLASS + r"])[^\W_])+", re.UNICODE)
+_CJK_CHAR_RE = re.compile(r"[" + CJK_CLASS + r"]")
+
+
+def key_tokens(canonical: str):
+    """
+    规范查询（已去掉停用词）的词项集合：拉丁词与数字按单词，中日韩文字按单字（没有分词器，单字集合是实体、
+    属性和否定词的保守近似）。相近查询之间必须完全一致，任一方向多出或缺少词项都不算同一问题。
+    """
+    return frozenset(_LATIN_WORD_RE.findall(canonical) + _CJK_CHAR_RE.findall(canonical))
+
+
+def _dice(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def query_similarity(a: str, b: str) -> float:
+    """两个查询规范化后的相似度（0-1），去掉停用词后词集合相同时为 1，词项（key_tokens）不同时为 0。"""
+    canonical_a, canonical_b = canonical_query(a), canonical_query(b)
+    if sorted(canonical_a.split()) == sorted(canonical_b.split()):
+        return 1.0
+    if key_tokens(canonical_a) != key_tokens(canonical_b):
+        return 0.0
+    return _dice(query_grams(canonical_a), query_grams(canonical_b))
+
+
+class QueryIndex:
+    """最近已回答查询的字符 n-gram 倒排索引（线程安全），每个规范查询只保留最新的一条。"""
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 词集合键 -> (key, query, grams, created_at, key_tokens)
+        self._postings = {}
+
+    @staticmethod
+    def _bag(canonical: str) -> str:
+        return " ".join(sorted(canonical.split()))
+
+    def add(self, key, query: str, created_at: float):
+        canonical = canonical_query(query)
+        bag = self._bag(canonical)
+        grams = query_grams(canonical)
+        with self._lock:
+            old = self._entries.get(bag)
+            if old is not None:
+                if old[3] > created_at:
+                    return
+                self._remove(bag)
+            self._entries[bag] = (key, query, grams, created_at, key_tokens(canonical))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(bag)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, bag: str):
+        grams = self._entries.pop(bag)[2]
+        for gram in grams:
+            bags = self._postings.get(gram)
+            if bags is not None:
+                bags.discard(bag)
+                if not bags:
+                    del self._postings[gram]
+
+    def search(self, query: str, min_similarity: float, since: float = 0):
+        """
+        查找最相近的已回答查询；词项（key_tokens）与 query 不同的候选不参与匹配。
+
+        Returns:
+            dict | None: {key, query, similarity, created_at}，最高相似度低于 min_similarity 时返回 None
+        """
+        canonical = canonical_query(query)
+        bag = self._bag(canonical)
+        grams = query_grams(canonical)
+        tokens = key_tokens(canonical)
+        with self._lock:
+            exact = self._entries.get(bag)
+            if exact is not None and exact[3] >= since:
+                return {"key": exact[0], "query": exact[1], "similarity": 1.0, "created_at": exact[3]}
+            overlaps = Counter(
+                candidate for gram in grams for candidate in self._postings.get(gram, ())
+            )
+            best = None
+            for candidate, shared in overlaps.items():
+                key, stored_query, stored_grams, created_at, stored_tokens = self._entries[candidate]
+                if created_at < since or stored_tokens != tokens:
+                    continue
+                similarity = 2 * shared / (len(grams) + len(stored_grams))
+                if similarity >= min_similarity and (best is None or similarity > best["similarity"]):
+                    best = {"key": key, "query": stored_query, "similarity": round(similarity, 3),
+                            "created_at": created_at}
+        return best
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,94 @@
+"""
+搜索结果本地相关性排序
+
+- BM25：对标题 + 正文打分，中日韩文字按单字 + 相邻双字切分，其余按单词切分
+- 倒数排名融合（RRF）：融合 BM25 排名与各引擎自身的排名
+
+纯 Python 实现，几百条结果的排序耗时在毫秒级。
+"""
+
+import math
+import re
+from collections import Counter
+
+
+TOKEN_RE = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+|[^\W_]+",
+    re.UNICODE
+)
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+TITLE_WEIGHT = 2
+
+
+def tokenize(text: str):
+    """切分文本：中日韩连续片段生成单字与双字，其余按单词（小写）切分。"""
+    tokens = []
+    for piece in TOKEN_RE.findall((text or "").lower()):
+        if CJK_RE.match(piece):
+            tokens.extend(piece)
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+
+def bm25_scores(query: str, documents, k1: float = BM25_K1, b: float = BM25_B):
+    """计算每个文档相对查询的 BM25 分数（标题词频按 TITLE_WEIGHT 加权）。"""
+    query_terms = set(tokenize(query))
+    if not query_terms or not documents:
+        return [0.0] * len(documents)
+
+    term_freqs = []
+    lengths = []
+    doc_freq = Counter()
+    for doc in documents:
+        tokens = tokenize(doc.get("title", "")) * TITLE_WEIGHT + tokenize(doc.get("content", ""))
+        counts = Counter(token for token in tokens if token in query_terms)
+        term_freqs.append(counts)
+        lengths.append(len(tokens))
+        doc_freq.update(counts.keys())
+
+    n = len(documents)
+    avg_length = (sum(lengths) / n) or 1.0
+    idf = {
+        term: math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+        for term in query_terms
+    }
+
+    scores = []
+    for counts, length in zip(term_freqs, lengths):
+        norm = k1 * (1 - b + b * length / avg_length)
+        scores.append(sum(
+            idf[term] * tf * (k1 + 1) / (tf + norm)
+            for term, tf in counts.items()
+        ))
+    return scores
+
+
+def rank_documents(query: str, documents, rrf_k: int = RRF_K):
+    """
+    按 BM25 与引擎排名的倒数排名融合结果对文档排序。
+
+    Args:
+        query: 搜索查询
+        documents: 文档列表，包含 title、content 和引擎内排名 rank（从 0 开始）
+        rrf_k: RRF 平滑常数
+
+    Returns:
+        list: 排序后的新列表，每个文档附带 relevance（BM25）和 rank_score（融合分数）
+    """
+    scores = bm25_scores(query, documents)
+    bm25_order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+    bm25_rank = {index: position for position, index in enumerate(bm25_order)}
+
+    ranked = []
+    for index, doc in enumerate(documents):
+        fused = 1.0 / (rrf_k + bm25_rank[index] + 1) + 1.0 / (rrf_k + doc.get("rank", 0) + 1)
+        ranked.append({**doc, "relevance": round(scores[index], 4), "rank_score": fused})
+
+    ranked.sort(key=lambda doc: (doc["rank_score"], doc["relevance"]), reverse=True)
+    return ranked
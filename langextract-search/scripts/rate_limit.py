@@ -0,0 +1,121 @@
+"""
+Provider 限流
+
+令牌桶限流器，按 Provider + API Key 共享，线程安全；协程中使用 acquire_async，不阻塞事件循环。
+- QPS：每个请求消耗 1 个令牌
+- TPM：每个请求按估算的 token 数消耗令牌（每分钟补充 tpm 个）
+- 收到 429 / Retry-After 时可暂停整个桶，使共享该 Provider 的所有线程一起退避
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充的令牌数，capacity 为桶容量（允许的突发量）。"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_time(self, tokens: float) -> float:
+        """尝试取得令牌，成功返回 0，否则返回需要等待的秒数（调用方需持有锁）。"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """阻塞直到取得 tokens 个令牌。"""
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                wait = self._wait_time(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """协程版本的 acquire，等待时让出事件循环。"""
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                wait = self._wait_time(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """在 seconds 秒内不再发放令牌（用于服务端返回 Retry-After 时整体退避）。"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+class ProviderLimiter:
+    """同一 Provider + API Key 的 QPS 与 TPM 组合限流器。"""
+
+    def __init__(self, qps: float = None, tpm: float = None):
+        self.qps = qps
+        self.tpm = tpm
+        self.requests = TokenBucket(qps) if qps else None
+        self.tokens = TokenBucket(tpm / 60.0, capacity=tpm) if tpm else None
+
+    def acquire(self, tokens: float = 0):
+        if self.requests:
+            self.requests.acquire()
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
+
+    async def acquire_async(self, tokens: float = 0):
+        if self.requests:
+            await self.requests.acquire_async()
+        if self.tokens and tokens:
+            await self.tokens.acquire_async(tokens)
+
+    def pause(self, seconds: float):
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.pause(seconds)
+
+
+_limiters_lock = threading.Lock()
+_provider_limiters = {}
+
+def key_fingerprint(api_key) -> str:
+    """API Key 的短指纹，用作限流器键，避免在内存结构中直接使用明文 Key。"""
+    return hashlib.sha256(str(api_key or "").encode("utf-8")).hexdigest()[:12]
+
+
+def get_provider_limiter(provider: str, api_key=None, qps: float = None, tpm: float = None):
+    """
+    获取 Provider + API Key 共享的限流器；qps 与 tpm 都为空时返回 None（不限流）。
+
+    同一进程内使用相同 Provider 和 API Key 的搜索、提取、langextract 推理共享同一组令牌桶。
+    """
+    if not qps and not tpm:
+        return None
+    key = (provider, key_fingerprint(api_key))
+    with _limiters_lock:
+        limiter = _provider_limiters.get(key)
+        if limiter is None or (limiter.qps, limiter.tpm) != (qps, tpm):
+            limiter = ProviderLimiter(qps, tpm)
+            _provider_limiters[key] = limiter
+        return limiter
@@ -0,0 +1,363 @@
+"""
+工作流结果存储
+
+所有查询结果追加写入一个 SQLite 文件（按查询、时间、状态建索引），代替每次运行写出多个带时间戳的小文件：
+- 写入由后台线程批量提交，调用方只把结果放入队列，不阻塞请求路径
+- 完整结果以 zlib 压缩的 JSON 保存（边编码边压缩），列表查询只读取索引列
+- 成功结果的查询、提取信息和搜索结果写入 FTS5 全文索引（中日韩文字预先切分为单字 + 双字），
+  用于从历史结果中查找相近的问题
+- 最近成功查询的字符 n-gram 索引（query_norm.QueryIndex，首次使用时从结果库加载），
+  用于识别同一问题的不同写法
+- 多进程通过 SQLite 文件锁（WAL）共享同一结果库
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from json_stream import compress_json
+from query_norm import QueryIndex, canonical_query, key_tokens, normalize_text
+from ranking import tokenize
+
+
+_FLUSH = object()
+_STOP = object()
+
+ENGINE_KEYS = (("zhipu", "zhipu_data"), ("duckduckgo", "ddg_data"), ("volcengine", "volcengine_data"))
+# FTS 列权重：查询、提取信息、搜索结果
+FTS_WEIGHTS = (5.0, 2.0, 1.0)
+# 索引字段变化时递增，旧版本的全文索引在打开时重建（记录在 PRAGMA user_version）
+FTS_VERSION = 2
+HISTORY_CANDIDATES = 10
+# 相关度 = 与历史查询的词项 Jaccard 相似度 × QUERY_WEIGHT + 查询词在历史提取信息中的覆盖率 × (1 - QUERY_WEIGHT)
+QUERY_WEIGHT = 0.7
+
+
+def new_run_id() -> str:
+    """结果 ID：秒级时间戳 + 随机后缀，同一秒内的并发运行也不会冲突。"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+def result_query(result: dict) -> str:
+    """从工作流结果中取出查询关键词。"""
+    if result.get("query"):
+        return result["query"]
+    for key in ("zhipu_data", "ddg_data", "volcengine_data"):
+        query = (result.get(key) or {}).get("query")
+        if query:
+            return query
+    return ""
+
+
+def fts_text(text: str) -> str:
+    """规范化（全角 / 繁体）后按 ranking.tokenize 预先切分，空格连接后交给 FTS5 的 unicode61 分词器。"""
+    return " ".join(tokenize(normalize_text(text)))
+
+
+def fts_match_expr(query: str):
+    """把查询转为 FTS5 的 OR 表达式，没有可用词项时返回 None。"""
+    terms = sorted(set(tokenize(normalize_text(query))))
+    if not terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def history_relevance(query: str, stored_query: str, extracted_info: str) -> float:
+    """
+    新查询与一条历史结果的相关度（0-1）。
+
+    新查询去掉停用词后的每个词项（query_norm.key_tokens）都必须出现在历史查询中，历史查询也不能多出词项：
+    「特斯拉 model 3 续航 / 价格」「美国 / 法国总统大选民调」这类只差一个实体或属性的查询词项重合度很高，
+    却是不同的问题，直接记为 0。
+    """
+    canonical, stored_canonical = canonical_query(query), canonical_query(stored_query)
+    terms = set(tokenize(canonical))
+    if not terms:
+        return 0.0
+    query_keys, stored_keys = key_tokens(canonical), key_tokens(stored_canonical)
+    if not query_keys <= stored_keys or stored_keys - query_keys:
+        return 0.0
+    stored_terms = set(tokenize(stored_canonical))
+    query_similarity = len(terms & stored_terms) / len(terms | stored_terms)
+    coverage = len(terms & set(tokenize(normalize_text(extracted_info)))) / len(terms)
+    return QUERY_WEIGHT * query_similarity + (1 - QUERY_WEIGHT) * coverage
+
+
+def _index_fields(query: str, result: dict):
+    documents = []
+    for _, key in ENGINE_KEYS:
+        for item in (result.get(key) or {}).get("search_results") or []:
+            if isinstance(item, dict):
+                # DuckDuckGo 的摘要在 body 字段；抓取了全文的结果另有 page_text
+                snippet = item.get('content') or item.get('body') or ''
+                documents.append(f"{item.get('title', '')} {snippet} {item.get('page_text') or ''}")
+    return fts_text(query), fts_text(result.get("extracted_info") or ""), fts_text("\n".join(documents))
+
+
+class ResultsStore:
+    """追加写入的 SQLite 结果库，后台线程按批提交。"""
+
+    def __init__(self, path, batch_size: int = 64, flush_interval: float = 1.0, query_index_entries: int = 5000):
+        self.path = Path(path)
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.query_index_entries = query_index_entries
+        self._query_index = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                run_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                query TEXT NOT NULL,
+                status TEXT NOT NULL,
+                model TEXT,
+                engines TEXT,
+                error TEXT,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_query ON results (query, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_time ON results (created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_status ON results (status, created_at)")
+        self.fts_enabled = self._create_fts()
+        self._conn.commit()
+
+        self._writer = threading.Thread(target=self._run_writer, name="results-store-writer", daemon=True)
+        self._writer.start()
+
+    def _create_fts(self) -> bool:
+        """创建全文索引（rowid 与 results 表一致，不重复保存正文）；SQLite 未编译 FTS5 时返回 False。"""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results_fts'"
+        ).fetchone()
+        if exists:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= FTS_VERSION:
+                return True
+            self._conn.execute("DROP TABLE results_fts")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE results_fts USING fts5(query, extracted, content, content='')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        # 为已有的结果补建（或按新的索引字段重建）索引
+        for rowid, query, data in self._conn.execute(
+            "SELECT rowid, query, data FROM results WHERE status = 'success'"
+        ).fetchall():
+            self._conn.execute(
+                "INSERT INTO results_fts (rowid, query, extracted, content) VALUES (?, ?, ?, ?)",
+                (rowid, *_index_fields(query, json.loads(zlib.decompress(data)))),
+            )
+        self._conn.execute(f"PRAGMA user_version = {FTS_VERSION}")
+        return True
+
+    def put(self, result: dict, query: str = None, run_id: str = None) -> str:
+        """把结果放入写入队列并立即返回 run_id；实际写入由后台线程完成。"""
+        if self._closed:
+            raise RuntimeError("ResultsStore 已关闭")
+        run_id = run_id or result.get("run_id") or new_run_id()
+        self._queue.put((run_id, time.time(), query if query is not None else result_query(result), result))
+        return run_id
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待队列中已有的结果全部提交，返回是否在超时前完成。"""
+        if not self._writer.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def _run_writer(self):
+        while True:
+            item = self._queue.get()
+            batch, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            # 攒够 batch_size 条或等待 flush_interval 后提交一次
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, tuple) and item[0] is _FLUSH:
+                    waiters.append(item[1])
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print(f"⚠️ 结果写入失败（{len(batch)} 条）: {e}")
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        rows = []
+        for run_id, created_at, query, result in batch:
+            payload = compress_json(result)
+            engines = ",".join(name for name, key in ENGINE_KEYS if (result.get(key) or {}).get("success"))
+            status = "success" if result.get("success") else "failed"
+            fields = _index_fields(query, result) if self.fts_enabled and status == "success" else None
+            rows.append((
+                (run_id, created_at, query, status, result.get("model_name"), engines,
+                 result.get("error"), len(payload), payload),
+                fields
+            ))
+        with self._lock:
+            for row, fields in rows:
+                # 同一 run_id 只保留第一次写入（常驻服务与转发查询的命令行会写入同一结果）
+                cursor = self._conn.execute(
+                    """
+                    INSERT OR IGNORE INTO results
+                        (run_id, created_at, query, status, model, engines, error, size, data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    row,
+                )
+                if cursor.rowcount and fields:
+                    self._conn.execute(
+                        "INSERT INTO results_fts (rowid, query, extracted, content) VALUES (?, ?, ?, ?)",
+                        (cursor.lastrowid, *fields),
+                    )
+                if cursor.rowcount and self._query_index is not None and row[3] == "success":
+                    self._query_index.add(row[0], row[2], row[1])
+            self._conn.commit()
+
+    def get(self, run_id: str):
+        """按 run_id 读取完整结果，不存在时返回 None。"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM results WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def list(self, query: str = None, status: str = None, since: float = None, limit: int = 20):
+        """
+        按条件列出最近的结果（不解压正文）。
+
+        Args:
+            query: 查询关键词（精确匹配）
+            status: success | failed
+            since: 只返回该时间戳之后的结果
+            limit: 最多返回条数
+        """
+        clauses, params = [], []
+        if query is not None:
+            clauses.append("query = ?")
+            params.append(query)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT run_id, created_at, query, status, model, engines, error, size
+                FROM results {where} ORDER BY created_at DESC LIMIT ?
+                """,
+                (*params, limit),
+            ).fetchall()
+        keys = ("run_id", "created_at", "query", "status", "model", "engines", "error", "size")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _get_query_index(self):
+        with self._lock:
+            if self._query_index is None:
+                index = QueryIndex(self.query_index_entries)
+                rows = self._conn.execute(
+                    "SELECT run_id, query, created_at FROM results WHERE status = 'success' "
+                    "ORDER BY created_at DESC LIMIT ?",
+                    (self.query_index_entries,),
+                ).fetchall()
+                for run_id, query, created_at in reversed(rows):
+                    index.add(run_id, query, created_at)
+                self._query_index = index
+            return self._query_index
+
+    def find_similar_query(self, query: str, max_age: float = None, min_similarity: float = 0.8):
+        """
+        按规范化查询的字符 n-gram 相似度查找最近回答过的同一问题。
+
+        Returns:
+            dict | None: {run_id, query, created_at, similarity, result}
+        """
+        since = time.time() - max_age if max_age else 0
+        match = self._get_query_index().search(query, min_similarity, since=since)
+        if match is None:
+            return None
+        result = self.get(match["key"])
+        if result is None:
+            return None
+        return {"run_id": match["key"], "query": match["query"], "created_at": match["created_at"],
+                "similarity": match["similarity"], "result": result}
+
+    def find_similar(self, query: str, max_age: float = None, min_relevance: float = 0.8):
+        """
+        在全文索引中查找与 query 相近、足够新的成功结果。
+
+        先按 FTS5 的 BM25 取前 HISTORY_CANDIDATES 条候选，再按 history_relevance 重新打分。
+
+        Args:
+            query: 查询关键词
+            max_age: 历史结果的最长时间（秒），None 表示不限
+            min_relevance: 相关度阈值（0-1）
+
+        Returns:
+            dict | None: {run_id, query, created_at, relevance, result}
+        """
+        match = fts_match_expr(query)
+        if not self.fts_enabled or match is None:
+            return None
+        since = time.time() - max_age if max_age else 0
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT r.run_id, r.created_at, r.query, r.data
+                FROM results_fts JOIN results r ON r.rowid = results_fts.rowid
+                WHERE results_fts MATCH ? AND r.created_at >= ?
+                ORDER BY bm25(results_fts, {", ".join(map(str, FTS_WEIGHTS))}) LIMIT ?
+                """,
+                (match, since, HISTORY_CANDIDATES),
+            ).fetchall()
+        best = None
+        for run_id, created_at, stored_query, data in rows:
+            result = json.loads(zlib.decompress(data))
+            relevance = history_relevance(query, stored_query, result.get("extracted_info") or "")
+            if relevance >= min_relevance and (best is None or relevance > best["relevance"]):
+                best = {"run_id": run_id, "query": stored_query, "created_at": created_at,
+                        "relevance": round(relevance, 3), "result": result}
+        return best
+
+    def close(self, timeout: float = 30):
+        """提交队列中剩余的结果并关闭连接。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            return
+        with self._lock:
+            self._conn.close()
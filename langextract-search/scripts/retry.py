@@ -0,0 +1,154 @@
+"""
+Provider 请求重试
+
+对 429、408 与 5xx 以及连接错误 / 超时按指数退避 + 全抖动重试，优先遵循服务端的 Retry-After。
+给出截止时间时，每次尝试的超时不超过剩余时间，等待后会超过截止时间的重试直接放弃。
+同时识别 requests、httpx（zai-sdk、openai）抛出的异常，不导入任何 SDK。
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+
+RETRY_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+TRANSIENT_ERROR_NAMES = ("ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "TimeoutException",
+                         "APIConnectionError", "APITimeoutError", "ChunkedEncodingError", "RemoteProtocolError",
+                         "NetworkError")
+
+DEFAULT_RETRY_POLICY = {
+    'max_attempts': 4,
+    'base_delay': 0.5,
+    'max_delay': 20.0,
+    'max_retry_after': 60.0
+}
+
+
+def error_status(error):
+    """从异常中取出 HTTP 状态码（requests.HTTPError / SDK 的 APIStatusError），没有时返回 None。"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def parse_retry_after(value):
+    """解析 Retry-After（秒数或 HTTP 日期），返回等待秒数或 None。"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def error_retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    return parse_retry_after(headers.get("Retry-After") or headers.get("retry-after"))
+
+
+def is_retryable(error) -> bool:
+    """429 / 408 / 5xx 与连接错误、超时可重试；其余 4xx 和解析错误不重试。"""
+    status = error_status(error)
+    if status is not None:
+        return status in RETRY_STATUS
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt: int, policy: dict, retry_after: float = None) -> float:
+    """第 attempt 次失败后的等待时间：有 Retry-After 时遵循它，否则为指数退避的全抖动。"""
+    if retry_after is not None:
+        return min(retry_after, policy['max_retry_after']) + random.uniform(0, policy['base_delay'])
+    return random.uniform(0, min(policy['max_delay'], policy['base_delay'] * 2 ** (attempt - 1)))
+
+
+def attempt_timeout(timeout, deadline):
+    """
+    本次尝试的超时：timeout 与到 deadline（time.monotonic() 时刻）的剩余时间中较小的一个。
+
+    截止时间已过时抛出 TimeoutError；timeout 与 deadline 都未给出时返回 None。
+    """
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("已超过请求截止时间")
+    return min(timeout, remaining) if timeout else remaining
+
+
+def _next_delay(error, attempt: int, policy: dict, limiter, should_retry, deadline=None):
+    """判断是否重试并返回等待秒数；不重试时返回 None。"""
+    if attempt >= policy['max_attempts'] or not (should_retry or is_retryable)(error):
+        return None
+    retry_after = error_retry_after(error)
+    delay = backoff_delay(attempt, policy, retry_after)
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    if limiter is not None and (retry_after is not None or error_status(error) == 429):
+        limiter.pause(delay)
+    return delay
+
+
+def call_with_retry(fn, policy: dict = None, limiter=None, tokens: float = 0, should_retry=None,
+                    on_retry=None, timeout: float = None, deadline: float = None):
+    """
+    调用 fn()，失败时按策略重试。
+
+    Args:
+        fn: 请求函数；timeout 与 deadline 都未给出时无参数调用，否则以 fn(本次尝试的超时) 调用
+        policy: 重试策略 {max_attempts, base_delay, max_delay, max_retry_after}
+        limiter: 可选的限流器，每次尝试前 acquire(tokens)；收到 429 / Retry-After 时整体暂停
+        tokens: 每次尝试消耗的 TPM 令牌数（估算的 token 数）
+        should_retry: 自定义的可重试判断 should_retry(error)，默认 is_retryable
+        on_retry: 重试前的回调 on_retry(attempt, error, delay)
+        timeout: 每次尝试的超时（秒）
+        deadline: 整体截止时间（time.monotonic() 时刻）；每次尝试的超时不超过剩余时间，
+                  截止时间已过或退避等待后会超过截止时间时不再重试
+    """
+    policy = {**DEFAULT_RETRY_POLICY, **(policy or {})}
+    timed = timeout is not None or deadline is not None
+    attempt = 0
+    while True:
+        attempt += 1
+        if limiter is not None:
+            limiter.acquire(tokens)
+        try:
+            return fn(attempt_timeout(timeout, deadline)) if timed else fn()
+        except Exception as e:
+            delay = _next_delay(e, attempt, policy, limiter, should_retry, deadline)
+            if delay is None:
+                raise
+            if on_retry:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+
+
+async def call_with_retry_async(fn, policy: dict = None, limiter=None, tokens: float = 0,
+                                should_retry=None, on_retry=None, timeout: float = None, deadline: float = None):
+    """call_with_retry 的协程版本，fn 为返回 awaitable 的函数（参数约定相同）。"""
+    policy = {**DEFAULT_RETRY_POLICY, **(policy or {})}
+    timed = timeout is not None or deadline is not None
+    attempt = 0
+    while True:
+        attempt += 1
+        if limiter is not None:
+            await limiter.acquire_async(tokens)
+        try:
+            return await (fn(attempt_timeout(timeout, deadline)) if timed else fn())
+        except Exception as e:
+            delay = _next_delay(e, attempt, policy, limiter, should_retry, deadline)
+            if delay is None:
+                raise
+            if on_retry:
+                on_retry(attempt, e, delay)
+            await asyncio.sleep(delay)
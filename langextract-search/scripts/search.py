@@ -8,11 +8,29 @@ import json
 import os
 import sys
 import argparse
-import subprocess
-import requests
+import atexit
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 from pathlib import Path
 
+import prompt_templates
+import provider_clients
+from dedup import dedupe_documents
+from disk_cache import DiskCache, make_cache_key
+from engine_health import EngineHealth, plan_engines
+from json_stream import write_json, write_jsonl
+from packing import estimate_tokens, pack_documents
+from page_fetch import PageFetcher
+from ranking import rank_documents
+from query_norm import normalize_query, query_similarity
+from results_store import ResultsStore, new_run_id
+from rate_limit import get_provider_limiter
+from retry import DEFAULT_RETRY_POLICY, call_with_retry, error_status, is_retryable
+from tracing import METRICS, add_span, end_trace, span, start_trace
+
 
 PROJECT_ROOT = Path(__file__).parent.parent
 SCRIPTS_DIR = Path(__file__).parent
@@ -74,7 +92,11 @@ def get_langextract_config(conf: dict = None) -> dict:
     获取 langextract 配置。
     
     Returns:
-        dict: {provider, model, baseUrl, apiKey}
+        dict: {provider, model, baseUrl, apiKey, max_workers, qps, tpm}
+        
+        max_workers: langextract 批量推理时的并发请求数，默认 4
+        qps: 提取模型的每秒请求数上限（同一 baseUrl + apiKey 共享），默认不限
+        tpm: 提取模型的每分钟 token 数上限（按提示词估算 + max_tokens 计），默认不限
     
     Raises:
         ValueError: 配置缺失时抛出
@@ -107,7 +129,10 @@ def get_langextract_config(conf: dict = None) -> dict:
         'provider': provider,
         'model': model,
         'baseUrl': base_url,
-        'apiKey': api_key
+        'apiKey': api_key,
+        'max_workers': task_conf.get('max_workers', 4),
+        'qps': task_conf.get('qps'),
+        'tpm': task_conf.get('tpm')
     }
 
 
@@ -123,6 +148,8 @@ def get_zhipu_search_config(conf: dict = None) -> dict:
         timelimit: 时间过滤 day/week/month/year/null，默认 null（不限）
         content_size: 内容长度 medium/high，默认 high
         search_domain_filter: 限定搜索域名，默认 null
+        baseUrl: 智谱 API 地址，默认 null（使用 zai-sdk 内置地址）
+        qps: 每秒请求数上限（同一 API Key 共享），默认不限
     """
     if conf is None:
         conf = load_project_conf()
@@ -140,7 +167,9 @@ def get_zhipu_search_config(conf: dict = None) -> dict:
         'timelimit': timelimit,
         'timelimit_mapped': map_timelimit(timelimit, 'zai'),
         'content_size': search_conf.get('content_size', 'high'),
-        'search_domain_filter': search_conf.get('search_domain_filter')
+        'search_domain_filter': search_conf.get('search_domain_filter'),
+        'baseUrl': search_conf.get('baseUrl'),
+        'qps': search_conf.get('qps')
     }
 
 
@@ -177,8 +206,11 @@ def get_duckduckgo_search_config(conf: dict = None) -> dict:
     }
 
 
+DEFAULT_VOLCENGINE_BASE_URL = "https://open.feedcoopapi.com"
+
+
 def get_volcengine_search_config(conf: dict = None) -> dict:
-    """获取火山引擎联网问答配置。"""
+    """获取火山引擎联网问答配置（baseUrl 默认 https://open.feedcoopapi.com，qps 为每秒请求数上限）。"""
     if conf is None:
         conf = load_project_conf()
     
@@ -190,39 +222,446 @@ def get_volcengine_search_config(conf: dict = None) -> dict:
     return {
         'enabled': search_conf.get('enabled', False),
         'apiKey': api_key,
-        'botId': bot_id
+        'botId': bot_id,
+        'baseUrl': (search_conf.get('baseUrl') or DEFAULT_VOLCENGINE_BASE_URL).rstrip('/'),
+        'qps': search_conf.get('qps')
     }
 
 
 def get_extraction_config(conf: dict = None) -> dict:
-    """获取结构化提取配置。"""
+    """
+    获取结构化提取配置。
+    
+    配置项:
+        max_content_length: 送入模型的搜索内容最大字符数，默认 70000
+        context_tokens: 提取模型的上下文窗口（token），默认 32768
+        max_input_tokens: 搜索内容的 token 上限（可选，用于控制成本），默认不限
+        prompt_reserve_tokens: 预留给提示词模板估算误差的 token 数，默认 512
+        dedup: 是否对跨引擎搜索结果去重，默认 True
+        dedup_max_distance: 近重复判定的 SimHash 海明距离阈值，默认 3
+        rank: 是否按本地相关性（BM25 + 倒数排名融合）对结果排序，默认 True
+        rank_rrf_k: 倒数排名融合的平滑常数，默认 60
+        mode: 提取方式，prompt（单次自由文本提示，默认）| langextract（lx.extract 分块并行的结构化提取）
+        max_char_buffer: langextract 模式下每个分块的最大字符数，默认 4000
+        batch_length: langextract 模式下每批送入模型的分块数，默认 8（不小于 langextract.max_workers）
+        extraction_passes: langextract 模式下的提取轮数，多轮可提高召回，默认 1
+        schema_constraints: langextract 模式下是否以 json_schema（response_format）约束输出，
+                            需要 Provider 支持，默认 False
+        max_input_chars: langextract 模式下送入提取的搜索内容字符上限（可选），默认不限
+    """
     if conf is None:
         conf = load_project_conf()
     
     extraction_conf = conf.get('extraction', {})
     
     return {
-        'max_content_length': extraction_conf.get('max_content_length', 70000)
+        'max_content_length': extraction_conf.get('max_content_length', 70000),
+        'context_tokens': extraction_conf.get('context_tokens', 32768),
+        'max_input_tokens': extraction_conf.get('max_input_tokens'),
+        'prompt_reserve_tokens': extraction_conf.get('prompt_reserve_tokens', 512),
+        'dedup': extraction_conf.get('dedup', True),
+        'dedup_max_distance': extraction_conf.get('dedup_max_distance', 3),
+        'rank': extraction_conf.get('rank', True),
+        'rank_rrf_k': extraction_conf.get('rank_rrf_k', 60),
+        'mode': extraction_conf.get('mode', 'prompt'),
+        'max_char_buffer': extraction_conf.get('max_char_buffer', 4000),
+        'batch_length': extraction_conf.get('batch_length', 8),
+        'extraction_passes': extraction_conf.get('extraction_passes', 1),
+        'schema_constraints': extraction_conf.get('schema_constraints', False),
+        'max_input_chars': extraction_conf.get('max_input_chars')
+    }
+
+
+def get_workflow_config(conf: dict = None) -> dict:
+    """
+    获取工作流配置。
+    
+    配置项:
+        search_deadline: 并发搜索阶段的整体截止时间（秒），默认 90
+        batch_concurrency: 批量模式同时处理的查询数，默认 4
+        query_deadline: 单个查询（搜索 + 提取）的总截止时间（秒），默认 null（不限）
+        search_share: 设置 query_deadline 时分配给搜索阶段的比例，默认 0.6，剩余时间留给提取
+        min_results: 成功引擎的结果总数达到该值即开始提取，默认 null（等待所有引擎）
+        min_engines: 成功返回的引擎数达到该值即开始提取，默认 null（等待所有引擎）
+        hedge: 是否对慢引擎发起对冲请求，默认 False
+        hedge_percentile: 对冲阈值取该引擎近期耗时的分位数，默认 95
+        hedge_after: 历史样本不足时的对冲阈值（秒），默认 5
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    workflow_conf = conf.get('workflow', {})
+    
+    return {
+        'search_deadline': workflow_conf.get('search_deadline', 90),
+        'batch_concurrency': workflow_conf.get('batch_concurrency', 4),
+        'query_deadline': workflow_conf.get('query_deadline'),
+        'search_share': workflow_conf.get('search_share', 0.6),
+        'min_results': workflow_conf.get('min_results'),
+        'min_engines': workflow_conf.get('min_engines'),
+        'hedge': workflow_conf.get('hedge', False),
+        'hedge_percentile': workflow_conf.get('hedge_percentile', 95),
+        'hedge_after': workflow_conf.get('hedge_after', 5)
+    }
+
+
+DEFAULT_SEARCH_CACHE_TTL = {
+    'day': 3600,
+    'week': 6 * 3600,
+    'month': 24 * 3600,
+    'year': 3 * 24 * 3600,
+    'none': 12 * 3600
+}
+
+
+def get_cache_config(conf: dict = None) -> dict:
+    """
+    获取本地缓存配置。
+    
+    配置项:
+        enabled: 是否启用缓存，默认 True
+        dir: 缓存目录，默认 <项目目录>/.cache
+        search_max_entries: 搜索结果缓存最大条目数（LRU 淘汰），默认 2000
+        search_ttl: 按 timelimit 区分的搜索结果过期时间（秒），键为 day/week/month/year/none
+        extraction_max_bytes: 提取结果缓存的总大小上限（字节，LRU 淘汰），默认 200MB
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    cache_conf = conf.get('cache', {})
+    search_ttl = dict(DEFAULT_SEARCH_CACHE_TTL)
+    search_ttl.update(cache_conf.get('search_ttl') or {})
+    
+    return {
+        'enabled': cache_conf.get('enabled', True),
+        'dir': Path(cache_conf.get('dir') or PROJECT_ROOT / ".cache"),
+        'search_max_entries': cache_conf.get('search_max_entries', 2000),
+        'search_ttl': search_ttl,
+        'extraction_max_bytes': cache_conf.get('extraction_max_bytes', 200 * 1024 * 1024)
+    }
+
+
+def get_engine_health_config(conf: dict = None) -> dict:
+    """
+    获取引擎健康统计与熔断配置。
+    
+    配置项:
+        enabled: 是否记录引擎统计并启用熔断，默认 True（统计保存在 <cache.dir>/engine_health.sqlite3）
+        window: 每个引擎保留的最近调用数，默认 100
+        min_calls: 按错误率熔断、按产出调度所需的最少调用数，默认 5
+        failure_rate: 近期错误率达到该值时熔断，默认 0.5
+        consecutive_failures: 连续失败达到该次数时熔断，默认 3
+        open_seconds: 熔断后的冷却时间（秒），之后放行一次探测请求，默认 300
+        scheduler: all（调用所有未熔断的引擎）| adaptive（按历史产出效率选择引擎），默认 all
+        target_results: adaptive 模式下期望的结果总数，默认 20
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    health_conf = conf.get('engine_health', {})
+    
+    return {
+        'enabled': health_conf.get('enabled', True),
+        'window': health_conf.get('window', 100),
+        'min_calls': health_conf.get('min_calls', 5),
+        'failure_rate': health_conf.get('failure_rate', 0.5),
+        'consecutive_failures': health_conf.get('consecutive_failures', 3),
+        'open_seconds': health_conf.get('open_seconds', 300),
+        'scheduler': health_conf.get('scheduler', 'all'),
+        'target_results': health_conf.get('target_results', 20)
+    }
+
+
+def get_retry_config(conf: dict = None) -> dict:
+    """
+    获取 Provider 请求重试配置（智谱搜索、火山引擎搜索、提取模型、langextract 推理共用）。
+    
+    配置项:
+        max_attempts: 最多尝试次数（含首次），1 表示不重试，默认 4
+        base_delay: 指数退避的基础等待时间（秒），默认 0.5
+        max_delay: 单次退避的最长等待时间（秒），默认 20
+        max_retry_after: 遵循服务端 Retry-After 的最长等待时间（秒），默认 60
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    retry_conf = conf.get('retry', {})
+    
+    return {
+        'max_attempts': max(1, int(retry_conf.get('max_attempts', DEFAULT_RETRY_POLICY['max_attempts']))),
+        'base_delay': retry_conf.get('base_delay', DEFAULT_RETRY_POLICY['base_delay']),
+        'max_delay': retry_conf.get('max_delay', DEFAULT_RETRY_POLICY['max_delay']),
+        'max_retry_after': retry_conf.get('max_retry_after', DEFAULT_RETRY_POLICY['max_retry_after'])
+    }
+
+
+def log_retry(provider: str):
+    """返回打印重试信息的 on_retry 回调。"""
+    def on_retry(attempt, error, delay):
+        print(f"⚠️ {provider} 请求失败（{error}），{delay:.1f}s 后进行第 {attempt + 1} 次尝试")
+    return on_retry
+
+
+def get_http_config(conf: dict = None) -> dict:
+    """
+    获取共享 HTTP 连接池配置。
+    
+    配置项:
+        pool_connections: 每个 Session 缓存的连接池数量，默认 10
+        pool_maxsize: 每个连接池保持的最大 keep-alive 连接数，默认 32
+        async_max_connections: 异步路径每个事件循环共享的 httpx 连接数上限，默认 100
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    http_conf = conf.get('http', {})
+    
+    return {
+        'pool_connections': http_conf.get('pool_connections', provider_clients.DEFAULT_POOL_CONNECTIONS),
+        'pool_maxsize': http_conf.get('pool_maxsize', provider_clients.DEFAULT_POOL_MAXSIZE),
+        'async_max_connections': http_conf.get('async_max_connections', provider_clients.DEFAULT_ASYNC_MAX_CONNECTIONS)
+    }
+
+
+def configure_http_clients(conf: dict = None):
+    """按 conf.json 的 http 节点配置共享连接池。"""
+    http_conf = get_http_config(conf)
+    provider_clients.configure(
+        pool_connections=http_conf['pool_connections'],
+        pool_maxsize=http_conf['pool_maxsize'],
+        async_max_connections=http_conf['async_max_connections']
+    )
+
+
+def get_async_config(conf: dict = None) -> dict:
+    """
+    获取异步工作流配置（async_workflow.run_workflow_async / --async）。
+    
+    配置项:
+        max_concurrency: 同一事件循环中同时执行的查询数上限，默认 100
+        search_threads: 执行同步 SDK（智谱、DuckDuckGo）搜索与 lx.extract 的线程数，默认 16
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    async_conf = conf.get('async', {})
+    
+    return {
+        'max_concurrency': async_conf.get('max_concurrency', 100),
+        'search_threads': async_conf.get('search_threads', 16)
+    }
+
+
+def get_prompt_config(conf: dict = None) -> dict:
+    """
+    获取 prompt 模式的提示词模板配置（固定前缀在前、搜索内容在后，便于命中 Provider 的前缀缓存）。
+    
+    配置项:
+        system: 系统角色设定，默认见 prompt_templates.DEFAULT_SYSTEM
+        instructions: 提取要求，默认见 prompt_templates.DEFAULT_INSTRUCTIONS
+        content_header: 搜索内容前的标题，默认 "搜索结果：\\n"
+        layout: system（固定前缀作为 system 消息，默认）| user（与搜索内容合并为一条 user 消息）
+        stream_usage: 流式请求是否附带 stream_options.include_usage 以返回 usage，默认 True；
+                      Provider 以 400 拒绝时去掉该字段重发一次，并在进程内记住该 baseUrl
+        providers: 按 langextract.provider 覆盖以上字段，如 {"glm": {"layout": "user"}}
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    prompt_conf = conf.get('prompt', {})
+    
+    return {
+        'system': prompt_conf.get('system', prompt_templates.DEFAULT_SYSTEM),
+        'instructions': prompt_conf.get('instructions', prompt_templates.DEFAULT_INSTRUCTIONS),
+        'content_header': prompt_conf.get('content_header', prompt_templates.DEFAULT_CONTENT_HEADER),
+        'layout': prompt_conf.get('layout', 'system'),
+        'stream_usage': prompt_conf.get('stream_usage', True),
+        'providers': prompt_conf.get('providers') or {}
+    }
+
+
+def get_prompt_template(conf: dict = None):
+    """按 prompt 配置和 langextract.provider 生成提取提示词模板（prompt_templates.PromptTemplate）。"""
+    if conf is None:
+        conf = load_project_conf()
+    
+    provider = conf.get('langextract', {}).get('provider')
+    return prompt_templates.build_prompt_template(get_prompt_config(conf), provider)
+
+
+def get_server_config(conf: dict = None) -> dict:
+    """
+    获取常驻服务配置。
+    
+    配置项:
+        host: 监听地址，默认 127.0.0.1
+        port: 监听端口，默认 8765
+        max_concurrency: 同时处理的请求数，默认 8
+        forward: 命令行是否把查询转发给常驻服务（先确认端口上是本服务，失败时回退到本地执行），默认 False
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    server_conf = conf.get('server', {})
+    
+    return {
+        'host': server_conf.get('host', '127.0.0.1'),
+        'port': server_conf.get('port', 8765),
+        'max_concurrency': server_conf.get('max_concurrency', 8),
+        'forward': server_conf.get('forward', False)
+    }
+
+
+def get_storage_config(conf: dict = None) -> dict:
+    """
+    获取结果存储配置。
+    
+    配置项:
+        enabled: 是否写入 SQLite 结果库，默认 True；关闭时退回为每次运行写 Markdown 文件
+        path: 结果库文件，默认 <输出目录>/results.sqlite3
+        markdown: 是否同时导出 Markdown 文件（搜索结果、提取信息、工作流摘要），默认 False
+        batch_size: 后台写入线程每次提交的最大条数，默认 64
+        flush_interval: 后台写入线程攒批的最长等待时间（秒），默认 1.0
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    storage_conf = conf.get('storage', {})
+    
+    return {
+        'enabled': storage_conf.get('enabled', True),
+        'path': storage_conf.get('path'),
+        'markdown': storage_conf.get('markdown', False),
+        'batch_size': storage_conf.get('batch_size', 64),
+        'flush_interval': storage_conf.get('flush_interval', 1.0)
+    }
+
+
+def get_history_config(conf: dict = None) -> dict:
+    """
+    获取历史结果复用配置（依赖结果库的全文索引）。
+    
+    配置项:
+        first: 是否默认先查历史结果（等同 --history-first），默认 False
+        max_age: 可复用的历史结果的最长时间（秒），默认 86400
+        query_similarity: 规范化查询的字符 n-gram 相似度阈值（0-1），默认 0.8
+        min_relevance: 全文索引的相关度阈值（0-1），默认 0.8
+        index_entries: 相似查询索引保留的最近查询数，默认 5000
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    history_conf = conf.get('history', {})
+    
+    return {
+        'first': history_conf.get('first', False),
+        'max_age': history_conf.get('max_age', 86400),
+        'query_similarity': history_conf.get('query_similarity', 0.8),
+        'min_relevance': history_conf.get('min_relevance', 0.8),
+        'index_entries': history_conf.get('index_entries', 5000)
+    }
+
+
+def get_fetch_config(conf: dict = None) -> dict:
+    """
+    获取搜索结果全文抓取配置（代理与超时沿用 duckduckgo_search 的 proxy、timeout）。
+    
+    配置项:
+        enabled: 是否在搜索后抓取结果页面正文（等同 --fetch-pages），默认 False
+        engines: 抓取哪些引擎的结果链接，默认 ["duckduckgo"]
+        max_pages: 每个查询最多抓取的页面数（按引擎顺序、引擎内排名），默认 10
+        max_workers: 全局抓取并发数（所有查询共享），默认 8
+        per_domain: 同一域名的并发上限，默认 2
+        max_bytes: 每个页面最多读取的字节数，默认 1MB
+        max_chars: 每个页面保留的正文字符数，默认 8000
+        deadline: 抓取阶段的截止时间（秒），默认 15
+        fresh_ttl: 缓存正文的新鲜期（秒），过期后带 ETag / Last-Modified 重新验证，默认 3600
+        cache_ttl: 缓存正文的保留时间（秒），默认 7 天
+        cache_max_bytes: 正文缓存总大小上限（字节，LRU 淘汰），默认 100MB
+        allow_private: 是否允许抓取内网、本机和链路本地地址（含重定向目标），默认 False
+    """
+    if conf is None:
+        conf = load_project_conf()
+    
+    fetch_conf = conf.get('fetch', {})
+    ddg_conf = get_duckduckgo_search_config(conf)
+    
+    return {
+        'enabled': fetch_conf.get('enabled', False),
+        'engines': fetch_conf.get('engines') or ['duckduckgo'],
+        'max_pages': fetch_conf.get('max_pages', 10),
+        'max_workers': fetch_conf.get('max_workers', 8),
+        'per_domain': fetch_conf.get('per_domain', 2),
+        'max_bytes': fetch_conf.get('max_bytes', 1024 * 1024),
+        'max_chars': fetch_conf.get('max_chars', 8000),
+        'deadline': fetch_conf.get('deadline', 15),
+        'fresh_ttl': fetch_conf.get('fresh_ttl', 3600),
+        'cache_ttl': fetch_conf.get('cache_ttl', 7 * 86400),
+        'cache_max_bytes': fetch_conf.get('cache_max_bytes', 100 * 1024 * 1024),
+        'allow_private': fetch_conf.get('allow_private', False),
+        'proxy': ddg_conf['proxy'],
+        'timeout': ddg_conf['timeout']
     }
 
 
+CONF_PATH_ENV = "LANGEXTRACT_SEARCH_CONF"
+
+
 def get_project_conf_path():
-    """获取项目配置文件路径"""
+    """获取项目配置文件路径（可通过环境变量 LANGEXTRACT_SEARCH_CONF 指定其他文件）"""
+    override = os.environ.get(CONF_PATH_ENV)
+    if override:
+        return Path(override)
     return PROJECT_ROOT / "conf.json"
 
 
+CONF_SECTIONS = (
+    'langextract', 'zhipu_search', 'duckduckgo_search', 'volcengine_search',
+    'extraction', 'workflow', 'cache', 'http', 'server', 'engine_health', 'retry', 'storage',
+    'history', 'fetch', 'async', 'prompt'
+)
+
+_conf_snapshot = {'key': None, 'conf': {}}
+_conf_lock = threading.Lock()
+
+
+def validate_project_conf(conf, conf_path=None):
+    """校验配置结构：顶层和各配置节点必须是 JSON 对象。"""
+    if not isinstance(conf, dict):
+        raise ValueError(f"conf.json 顶层必须是 JSON 对象: {conf_path}")
+    invalid = [name for name in CONF_SECTIONS if name in conf and not isinstance(conf[name], dict)]
+    if invalid:
+        raise ValueError(f"conf.json 中以下节点必须是 JSON 对象: {', '.join(invalid)}")
+    return conf
+
+
 def load_project_conf():
-    """加载项目配置"""
+    """
+    加载项目配置。
+    
+    解析并校验后的配置按文件的 mtime/size 缓存为进程内快照，文件未变化时直接返回快照，
+    常驻进程中修改 conf.json 后会在下次调用时自动重新加载。返回值为共享快照，调用方不应修改。
+    """
     conf_path = get_project_conf_path()
-    if conf_path.exists():
+    try:
+        stat = conf_path.stat()
+    except FileNotFoundError:
+        return {}
+    key = (str(conf_path), stat.st_mtime_ns, stat.st_size)
+    
+    with _conf_lock:
+        if _conf_snapshot['key'] == key:
+            return _conf_snapshot['conf']
         try:
             with open(conf_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+                conf = validate_project_conf(json.load(f), conf_path)
         except json.JSONDecodeError as e:
             print(f"⚠️ conf.json 格式错误: {e}")
             print(f"   请修复或删除 {conf_path} 后重试")
             raise
-    return {}
+        _conf_snapshot['key'] = key
+        _conf_snapshot['conf'] = conf
+        return conf
 
 
 def parse_mcp_output(output: str):
@@ -244,7 +683,154 @@ def parse_mcp_output(output: str):
         raise
 
 
-def search_with_zhipu_mcp(query: str, verbose: bool = False):
+_disk_caches = {}
+_disk_caches_lock = threading.Lock()
+_engine_health = {}
+
+
+def _get_disk_cache(namespace: str, **limits):
+    """获取进程内共享的缓存实例，缓存被禁用时返回 None。"""
+    cache_conf = get_cache_config()
+    if not cache_conf['enabled']:
+        return None
+    with _disk_caches_lock:
+        if namespace not in _disk_caches:
+            _disk_caches[namespace] = DiskCache(
+                cache_conf['dir'] / "cache.sqlite3",
+                namespace=namespace,
+                **limits
+            )
+        return _disk_caches[namespace]
+
+
+def get_engine_health():
+    """获取进程内共享的引擎健康统计实例，未启用时返回 None。"""
+    health_conf = get_engine_health_config()
+    if not health_conf['enabled']:
+        return None
+    path = get_cache_config()['dir'] / "engine_health.sqlite3"
+    with _disk_caches_lock:
+        health = _engine_health.get(path)
+        if health is None:
+            health = _engine_health[path] = EngineHealth(
+                path,
+                window=health_conf['window'],
+                min_calls=health_conf['min_calls'],
+                failure_rate=health_conf['failure_rate'],
+                consecutive_failures=health_conf['consecutive_failures'],
+                open_seconds=health_conf['open_seconds']
+            )
+        return health
+
+
+_results_stores = {}
+
+
+def get_results_store(output_dir: str = None):
+    """获取进程内共享的结果库（进程退出时提交剩余结果），未启用时返回 None。"""
+    storage_conf = get_storage_config()
+    if not storage_conf['enabled']:
+        return None
+    path = Path(storage_conf['path'] or Path(output_dir or PROJECT_ROOT / "output") / "results.sqlite3")
+    with _disk_caches_lock:
+        store = _results_stores.get(path)
+        if store is None:
+            store = _results_stores[path] = ResultsStore(
+                path,
+                batch_size=storage_conf['batch_size'],
+                flush_interval=storage_conf['flush_interval'],
+                query_index_entries=get_history_config()['index_entries']
+            )
+            atexit.register(store.close)
+        return store
+
+
+_page_fetchers = {}
+
+
+def get_page_fetcher():
+    """获取进程内共享的页面抓取器（按生效配置区分），批量模式下所有查询共用同一线程池与域名并发上限。"""
+    fetch_conf = get_fetch_config()
+    key = tuple(sorted((name, str(value)) for name, value in fetch_conf.items()))
+    with _disk_caches_lock:
+        fetcher = _page_fetchers.get(key)
+    if fetcher is not None:
+        return fetcher
+    cache = _get_disk_cache("pages", max_bytes=fetch_conf['cache_max_bytes'])
+    with _disk_caches_lock:
+        fetcher = _page_fetchers.get(key)
+        if fetcher is None:
+            fetcher = _page_fetchers[key] = PageFetcher(
+                cache=cache,
+                max_workers=fetch_conf['max_workers'],
+                per_domain=fetch_conf['per_domain'],
+                max_bytes=fetch_conf['max_bytes'],
+                max_chars=fetch_conf['max_chars'],
+                timeout=fetch_conf['timeout'],
+                proxy=fetch_conf['proxy'],
+                fresh_ttl=fetch_conf['fresh_ttl'],
+                cache_ttl=fetch_conf['cache_ttl'],
+                allow_private=fetch_conf['allow_private']
+            )
+            atexit.register(fetcher.close)
+        return fetcher
+
+
+def get_search_cache():
+    """获取搜索结果缓存（按条目数 LRU 淘汰）。"""
+    return _get_disk_cache("search", max_entries=get_cache_config()['search_max_entries'])
+
+
+def get_extraction_cache():
+    """获取提取结果缓存（按总字节数 LRU 淘汰）。"""
+    return _get_disk_cache("extraction", max_bytes=get_cache_config()['extraction_max_bytes'])
+
+
+def search_cache_ttl(timelimit) -> float:
+    """根据 timelimit 计算搜索结果缓存的过期时间：时间窗口越短，缓存越短。"""
+    ttl_conf = get_cache_config()['search_ttl']
+    if timelimit is None or str(timelimit).lower() in ('null', 'none', ''):
+        return ttl_conf['none']
+    return ttl_conf.get(str(timelimit).lower(), ttl_conf['none'])
+
+
+def _search_cache_key(engine: str, query: str, params: dict) -> str:
+    # 规范化后的查询（全角 / 繁体 / 标点 / 大小写差异）共享同一缓存条目
+    return make_cache_key(engine, normalize_query(query), params)
+
+
+def _load_cached_search(engine: str, query: str, params: dict, cache_mode: str, verbose: bool = False):
+    """cache_mode 为 on 时读取缓存；off/refresh 不读取。"""
+    if cache_mode != 'on':
+        return None
+    cache = get_search_cache()
+    if cache is None:
+        return None
+    cached = cache.get(_search_cache_key(engine, query, params))
+    if cached is None:
+        return None
+    if verbose:
+        print(f"\n💾 命中搜索缓存: {engine}（{len(cached.get('search_results', []))} 条结果）")
+    strip_combined_content(cached)
+    cached['query'] = query
+    cached['cache_hit'] = True
+    return cached
+
+
+def _store_cached_search(engine: str, query: str, params: dict, result: dict, timelimit, cache_mode: str):
+    """cache_mode 为 on/refresh 时写入成功的搜索结果。"""
+    if cache_mode == 'off' or not result.get('success'):
+        return
+    cache = get_search_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(_search_cache_key(engine, query, params), result, ttl=search_cache_ttl(timelimit))
+    except Exception as e:
+        print(f"⚠️ 搜索缓存写入失败: {e}")
+
+
+def search_with_zhipu_mcp(query: str, verbose: bool = False, cache_mode: str = 'on'):
     """
     Step 1a: Search using Zhipu AI's official zai-sdk (web_search API).
     
@@ -254,8 +840,17 @@ def search_with_zhipu_mcp(query: str, verbose: bool = False):
         timelimit: 时间过滤
         content_size: 内容长度
         search_domain_filter: 域名过滤
+    
+    cache_mode: on（读写缓存）| refresh（跳过读取，刷新缓存）| off（不使用缓存）
     """
     search_conf = get_zhipu_search_config()
+    cache_params = {
+        'search_engine': search_conf['search_engine'],
+        'count': search_conf['count'],
+        'timelimit_mapped': search_conf['timelimit_mapped'],
+        'content_size': search_conf['content_size'],
+        'search_domain_filter': search_conf['search_domain_filter']
+    }
     
     if verbose:
         print("\n" + "=" * 60)
@@ -271,17 +866,18 @@ def search_with_zhipu_mcp(query: str, verbose: bool = False):
             print(f"   域名过滤: {search_conf['search_domain_filter']}")
     
     try:
-        try:
-            from zai import ZhipuAiClient
-            has_zai = True
-        except ImportError:
-            has_zai = False
+        has_zai = provider_clients.sdk_available('zhipu')
         
         api_key = search_conf.get('apiKey')
         
+        # 配置错误时即使有缓存也直接失败，与其他引擎一致
         if not api_key:
             raise ValueError("智谱搜索 API Key 未配置。请在 conf.json 的 zhipu_search.apiKey 中设置")
         
+        cached = _load_cached_search('zhipu', query, cache_params, cache_mode, verbose)
+        if cached is not None:
+            return cached
+        
         if verbose:
             print(f"\n🤖 正在调用智谱搜索 API...")
             print(f"   使用 zai-sdk: {has_zai}")
@@ -289,7 +885,7 @@ def search_with_zhipu_mcp(query: str, verbose: bool = False):
         search_results = []
         
         if has_zai:
-            client = ZhipuAiClient(api_key=api_key)
+            client = provider_clients.get_zhipu_client(api_key, base_url=search_conf['baseUrl'])
             
             search_params = {
                 'search_engine': search_conf['search_engine'],
@@ -301,7 +897,12 @@ def search_with_zhipu_mcp(query: str, verbose: bool = False):
             if search_conf['search_domain_filter']:
                 search_params['search_domain_filter'] = search_conf['search_domain_filter']
             
-            response = client.web_search.web_search(**search_params)
+            response = call_with_retry(
+                lambda: client.web_search.web_search(**search_params),
+                policy=get_retry_config(),
+                limiter=get_provider_limiter('zhipu_search', api_key, qps=search_conf['qps']),
+                on_retry=log_retry('智谱搜索')
+            )
             
             # Parse search results from the response
             if hasattr(response, 'search_result') and response.search_result:
@@ -349,28 +950,14 @@ def search_with_zhipu_mcp(query: str, verbose: bool = False):
                 content = item.get('content', '')
                 print(f"      摘要: {content[:100]}...")
         
-        # Combine search results into a single text
-        combined_content = ""
-        for item in search_results:
-            title = item.get('title', '')
-            link = item.get('link', '')
-            content = item.get('content', '')
-            date = item.get('publish_date', '')
-            
-            combined_content += f"# [智谱] {title}\n"
-            if date:
-                combined_content += f"日期: {date}\n"
-            if link:
-                combined_content += f"链接: {link}\n"
-            combined_content += f"\n{content}\n\n"
-        
-        return {
+        result = {
             "success": True,
             "query": query,
             "search_results": search_results,
-            "combined_content": combined_content,
             "source": "zhipu"
         }
+        _store_cached_search('zhipu', query, cache_params, result, search_conf['timelimit'], cache_mode)
+        return result
         
     except Exception as e:
         if verbose:
@@ -386,13 +973,70 @@ def search_with_zhipu_mcp(query: str, verbose: bool = False):
         }
 
 
-def search_with_volcengine(query: str, verbose: bool = False):
+def volcengine_request(search_conf: dict, query: str):
+    """火山引擎联网问答请求，返回 (url, headers, payload)（同步与异步路径共用）。"""
+    url = f"{search_conf['baseUrl']}/agent_api/agent/chat/completion"
+    headers = {
+        "Authorization": f"Bearer {search_conf['apiKey']}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "bot_id": search_conf['botId'],
+        "messages": [
+            {"role": "user", "content": query}
+        ],
+        "stream": False
+    }
+    return url, headers, payload
+
+
+def parse_volcengine_response(result: dict):
+    """
+    解析火山引擎联网问答响应，返回 (参考结果列表, 回答内容)。
+    
+    references 与 data.search_results 都保存在参考结果列表中，kind 分别为 reference / search_result；
+    送入模型的文本只包含回答和 references（与合并文本 combined_content 的原有内容一致）。
+    """
+    search_results = []
+    answer_content = ""
+    
+    if result.get("code") == 0 and result.get("data"):
+        data = result["data"]
+        
+        if "answer" in data:
+            answer_content = data["answer"]
+        
+        if "references" in data and data["references"]:
+            for ref in data["references"]:
+                search_results.append({
+                    "title": ref.get("title", ""),
+                    "link": ref.get("url", ""),
+                    "content": ref.get("content", ref.get("summary", "")),
+                    "site_name": ref.get("site_name", ""),
+                    "kind": "reference"
+                })
+        
+        if "search_results" in data and data["search_results"]:
+            for item in data["search_results"]:
+                search_results.append({
+                    "title": item.get("title", ""),
+                    "link": item.get("url", item.get("link", "")),
+                    "content": item.get("content", item.get("snippet", "")),
+                    "site_name": item.get("site_name", ""),
+                    "kind": "search_result"
+                })
+    return search_results, answer_content
+
+
+def search_with_volcengine(query: str, verbose: bool = False, cache_mode: str = 'on'):
     """
     Step 1c: Search using Volcengine (火山引擎联网问答Agent API).
     
     文档: https://www.volcengine.com/docs/85508/1510834
     接入方式: APIKey接入
     URL: https://open.feedcoopapi.com/agent_api/agent/chat/completion
+    
+    cache_mode: on（读写缓存）| refresh（跳过读取，刷新缓存）| off（不使用缓存）
     """
     if verbose:
         print("\n" + "=" * 60)
@@ -411,66 +1055,30 @@ def search_with_volcengine(query: str, verbose: bool = False):
         if not bot_id:
             raise ValueError("火山引擎 Bot ID 未配置。请在 conf.json 的 volcengine_search.botId 中设置")
         
+        cache_params = {'botId': bot_id}
+        cached = _load_cached_search('volcengine', query, cache_params, cache_mode, verbose)
+        if cached is not None:
+            return cached
+        
         if verbose:
             print(f"\n🤖 正在调用火山引擎联网问答 API...")
             print(f"   Bot ID: {bot_id}")
         
-        url = "https://open.feedcoopapi.com/agent_api/agent/chat/completion"
+        url, headers, payload = volcengine_request(search_conf, query)
+        session = provider_clients.get_http_session(url)
         
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        def post():
+            response = session.post(url, headers=headers, json=payload, timeout=60)
+            response.raise_for_status()
+            return response
         
-        payload = {
-            "bot_id": bot_id,
-            "messages": [
-                {"role": "user", "content": query}
-            ],
-            "stream": False
-        }
-        
-        response = requests.post(
-            url,
-            headers=headers,
-            json=payload,
-            timeout=60
+        response = call_with_retry(
+            post,
+            policy=get_retry_config(),
+            limiter=get_provider_limiter('volcengine_search', api_key, qps=search_conf['qps']),
+            on_retry=log_retry('火山引擎搜索')
         )
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        search_results = []
-        combined_content = ""
-        answer_content = ""
-        
-        if result.get("code") == 0 and result.get("data"):
-            data = result["data"]
-            
-            if "answer" in data:
-                answer_content = data["answer"]
-                combined_content += f"# [火山引擎] 联网问答结果\n\n{answer_content}\n\n"
-            
-            if "references" in data and data["references"]:
-                for ref in data["references"]:
-                    search_results.append({
-                        "title": ref.get("title", ""),
-                        "link": ref.get("url", ""),
-                        "content": ref.get("content", ref.get("summary", "")),
-                        "site_name": ref.get("site_name", "")
-                    })
-                    combined_content += f"## [{ref.get('site_name', '参考')}] {ref.get('title', '')}\n"
-                    combined_content += f"链接: {ref.get('url', '')}\n"
-                    combined_content += f"{ref.get('content', ref.get('summary', ''))}\n\n"
-            
-            if "search_results" in data and data["search_results"]:
-                for item in data["search_results"]:
-                    search_results.append({
-                        "title": item.get("title", ""),
-                        "link": item.get("url", item.get("link", "")),
-                        "content": item.get("content", item.get("snippet", "")),
-                        "site_name": item.get("site_name", "")
-                    })
+        search_results, answer_content = parse_volcengine_response(response.json())
         
         if verbose:
             print(f"\n📤 输出:")
@@ -487,14 +1095,15 @@ def search_with_volcengine(query: str, verbose: bool = False):
                 if content:
                     print(f"      摘要: {content[:100]}...")
         
-        return {
+        result = {
             "success": True,
             "query": query,
             "search_results": search_results,
-            "combined_content": combined_content,
             "answer": answer_content,
             "source": "volcengine"
         }
+        _store_cached_search('volcengine', query, cache_params, result, None, cache_mode)
+        return result
         
     except Exception as e:
         if verbose:
@@ -509,7 +1118,8 @@ def search_with_volcengine(query: str, verbose: bool = False):
         }
 
 
-def search_with_duckduckgo(query: str, verbose: bool = False, max_results: int = None):
+def search_with_duckduckgo(query: str, verbose: bool = False, max_results: int = None,
+                           cache_mode: str = 'on'):
     """
     Step 1b: Search using DuckDuckGo (ddgs).
     
@@ -526,9 +1136,17 @@ def search_with_duckduckgo(query: str, verbose: bool = False, max_results: int =
         query: 搜索查询
         verbose: 显示详细信息
         max_results: 覆盖配置的结果数（可选）
+        cache_mode: on（读写缓存）| refresh（跳过读取，刷新缓存）| off（不使用缓存）
     """
     search_conf = get_duckduckgo_search_config()
     actual_max_results = max_results if max_results is not None else search_conf['maxResults']
+    cache_params = {
+        'max_results': actual_max_results,
+        'region': search_conf['region'],
+        'safesearch': search_conf['safesearch'],
+        'timelimit_mapped': search_conf['timelimit_mapped'],
+        'backend': search_conf['backend']
+    }
     
     if verbose:
         print("\n" + "=" * 60)
@@ -545,27 +1163,25 @@ def search_with_duckduckgo(query: str, verbose: bool = False, max_results: int =
             print(f"   代理地址: {search_conf['proxy']}")
         print(f"   超时设置: {search_conf['timeout']}s")
     
+    cached = _load_cached_search('duckduckgo', query, cache_params, cache_mode, verbose)
+    if cached is not None:
+        return cached
+    
     try:
-        from ddgs import DDGS
-        
         if verbose:
             print(f"\n🤖 正在调用 DuckDuckGo...")
         
-        ddgs_kwargs = {'timeout': search_conf['timeout']}
-        if search_conf['proxy']:
-            ddgs_kwargs['proxy'] = search_conf['proxy']
+        search_params = {
+            'query': query,
+            'max_results': actual_max_results,
+            'region': search_conf['region'],
+            'safesearch': search_conf['safesearch'],
+            'backend': search_conf['backend']
+        }
+        if search_conf['timelimit_mapped']:
+            search_params['timelimit'] = search_conf['timelimit_mapped']
         
-        with DDGS(**ddgs_kwargs) as ddgs:
-            search_params = {
-                'query': query,
-                'max_results': actual_max_results,
-                'region': search_conf['region'],
-                'safesearch': search_conf['safesearch'],
-                'backend': search_conf['backend']
-            }
-            if search_conf['timelimit_mapped']:
-                search_params['timelimit'] = search_conf['timelimit_mapped']
-            
+        with provider_clients.ddgs_client(timeout=search_conf['timeout'], proxy=search_conf['proxy']) as ddgs:
             search_results = list(ddgs.text(**search_params))
         
         if verbose:
@@ -579,25 +1195,14 @@ def search_with_duckduckgo(query: str, verbose: bool = False, max_results: int =
                 content = item.get('body', '')
                 print(f"      摘要: {content[:100]}...")
         
-        # Combine search results into a single text
-        combined_content = ""
-        for item in search_results:
-            title = item.get('title', '')
-            link = item.get('href', '')
-            content = item.get('body', '')
-            
-            combined_content += f"# [DuckDuckGo] {title}\n"
-            if link:
-                combined_content += f"链接: {link}\n"
-            combined_content += f"\n{content}\n\n"
-        
-        return {
+        result = {
             "success": True,
             "query": query,
             "search_results": search_results,
-            "combined_content": combined_content,
             "source": "duckduckgo"
         }
+        _store_cached_search('duckduckgo', query, cache_params, result, search_conf['timelimit'], cache_mode)
+        return result
         
     except Exception as e:
         if verbose:
@@ -612,9 +1217,805 @@ def search_with_duckduckgo(query: str, verbose: bool = False, max_results: int =
         }
 
 
-def extract_with_langextract(zhipu_data, ddg_data, volcengine_data=None, verbose: bool = False):
+def _run_in_daemon_thread(fn, *args, **kwargs) -> Future:
+    """在守护线程中执行函数，返回 Future；超时未完成的线程不会阻塞进程退出。"""
+    future = Future()
+
+    def runner():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=runner, daemon=True).start()
+    return future
+
+
+HEDGE_MIN_SAMPLES = 10
+HEDGE_MIN_DELAY = 0.5
+
+
+def hedge_delay(engine: str, workflow_config: dict) -> float:
+    """
+    对冲阈值：引擎耗时超过该值仍未返回时再发起一次相同请求。
+
+    历史样本足够时取近期成功耗时的 hedge_percentile 分位数，否则使用 hedge_after。
+    """
+    health = get_engine_health()
+    latency = health.latency_percentile(
+        engine, workflow_config['hedge_percentile'], min_samples=HEDGE_MIN_SAMPLES
+    ) if health else None
+    if latency is None:
+        return workflow_config['hedge_after']
+    return max(latency, HEDGE_MIN_DELAY)
+
+
+def enough_search_results(results: dict, min_results: int = None, min_engines: int = None) -> bool:
+    """已完成的引擎结果是否满足 min_engines / min_results，满足时可提前结束搜索阶段。"""
+    succeeded = [result for result in results.values() if result.get("success")]
+    if min_engines and len(succeeded) >= min_engines:
+        return True
+    if min_results and sum(len(r.get("search_results") or []) for r in succeeded) >= min_results:
+        return True
+    return False
+
+
+def cut_off_search_result(query: str, engine: str, cutoff: str, deadline: float, start: float, health=None,
+                          hedged: bool = False, verbose: bool = False):
+    """记录未等待完成的引擎（span 与熔断统计），返回其失败结果。"""
+    add_span(f"search.{engine}", start, time.perf_counter() - start, ok=False,
+             engine=engine, cut_off=cutoff, timed_out=cutoff == 'deadline')
+    if cutoff == 'deadline':
+        if health:
+            health.record(engine, time.perf_counter() - start, False)
+        if verbose:
+            print(f"\n⏱️ {engine} 搜索超过截止时间 {deadline}s，已放弃等待")
+        error = f"Search deadline exceeded ({deadline}s)"
+    else:
+        if verbose:
+            print(f"\n✂️ 已有足够的搜索结果，不再等待 {engine}")
+        error = "Cut off: enough results from other engines"
+    return {
+        "success": False,
+        "error": error,
+        "query": query,
+        "source": engine,
+        "cut_off": cutoff,
+        "timed_out": cutoff == 'deadline',
+        "hedged": hedged
+    }
+
+
+def run_searches(query: str, engines, verbose: bool = False, ddg_max_results: int = None,
+                 deadline: float = None, cache_mode: str = 'on', min_results: int = None,
+                 min_engines: int = None, hedge: bool = None):
+    """
+    Step 1: 并发执行所有启用的搜索引擎。
+
+    Args:
+        query: 搜索查询
+        engines: 要执行的引擎列表，取值 zhipu/duckduckgo/volcengine
+        verbose: 显示详细信息
+        ddg_max_results: 覆盖 DuckDuckGo 配置的结果数（可选）
+        deadline: 整体截止时间（秒），默认读取 workflow.search_deadline
+        cache_mode: 搜索缓存模式 on/refresh/off
+        min_results: 成功引擎的结果总数达到该值即结束搜索阶段，默认读取 workflow.min_results
+        min_engines: 成功返回的引擎数达到该值即结束搜索阶段，默认读取 workflow.min_engines
+        hedge: 引擎超过对冲阈值仍未返回时再发起一次相同请求，取先返回的结果，默认读取 workflow.hedge
+
+    Returns:
+        dict: {engine: 结果}，结果结构与各 search_with_* 函数一致；
+              未完成即被放弃的引擎返回 success=False，cut_off 为 deadline（同时 timed_out=True）
+              或 enough_results；发起过对冲请求的引擎带 hedged=True
+    """
+    workflow_config = get_workflow_config()
+    if deadline is None:
+        deadline = workflow_config['search_deadline']
+    if min_results is None:
+        min_results = workflow_config['min_results']
+    if min_engines is None:
+        min_engines = workflow_config['min_engines']
+    if hedge is None:
+        hedge = workflow_config['hedge']
+
+    tasks = {
+        'zhipu': lambda: search_with_zhipu_mcp(query, verbose=verbose, cache_mode=cache_mode),
+        'duckduckgo': lambda: search_with_duckduckgo(
+            query, verbose=verbose, max_results=ddg_max_results, cache_mode=cache_mode
+        ),
+        'volcengine': lambda: search_with_volcengine(query, verbose=verbose, cache_mode=cache_mode),
+    }
+
+    abandoned = set()
+    abandoned_lock = threading.Lock()
+
+    health = get_engine_health()
+
+    def traced(engine, attempt):
+        with span(f"search.{engine}", engine=engine, attempt=attempt) as search_span:
+            attempt_start = time.perf_counter()
+            result = tasks[engine]()
+            with abandoned_lock:
+                is_abandoned = (engine, attempt) in abandoned
+            if is_abandoned:
+                search_span.detach()
+            search_span.set(
+                results=len(result.get("search_results") or []),
+                bytes=sum(len(doc["text"].encode("utf-8")) for doc in engine_documents(result)),
+                cache_hit=bool(result.get("cache_hit"))
+            )
+            if not result.get("success"):
+                search_span.fail(result.get("error"))
+        if health and not is_abandoned and not result.get("cache_hit"):
+            health.record(
+                engine, time.perf_counter() - attempt_start, bool(result.get("success")),
+                len(result.get("search_results") or [])
+            )
+        return result
+
+    pending = {}
+
+    def launch(engine, attempt):
+        future = _run_in_daemon_thread(contextvars.copy_context().run, traced, engine, attempt)
+        pending[future] = (engine, attempt)
+
+    def abandon(engine):
+        for future, (pending_engine, attempt) in list(pending.items()):
+            if pending_engine == engine:
+                del pending[future]
+                with abandoned_lock:
+                    abandoned.add((engine, attempt))
+
+    start = time.perf_counter()
+    deadline_at = start + deadline
+    hedge_delays = {engine: hedge_delay(engine, workflow_config) for engine in engines} if hedge else {}
+    hedged = set()
+    results = {}
+    for engine in engines:
+        launch(engine, 1)
+
+    cutoff = None
+    while pending:
+        now = time.perf_counter()
+        if now >= deadline_at:
+            cutoff = 'deadline'
+            break
+        if enough_search_results(results, min_results, min_engines):
+            cutoff = 'enough_results'
+            break
+        timeout = deadline_at - now
+        for engine, delay in hedge_delays.items():
+            if engine not in results and engine not in hedged:
+                timeout = min(timeout, max(0.0, start + delay - now))
+
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future not in pending:
+                continue
+            engine, attempt = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {
+                    "success": False,
+                    "error": str(e),
+                    "query": query,
+                    "source": engine
+                }
+            # 对冲中的另一个请求仍在进行时，失败结果不立即采用
+            if not result.get("success") and any(e == engine for e, _ in pending.values()):
+                continue
+            if engine in hedged:
+                result = {**result, "hedged": True, "hedge_won": attempt > 1}
+            results[engine] = result
+            abandon(engine)
+
+        now = time.perf_counter()
+        for engine, delay in hedge_delays.items():
+            if engine not in results and engine not in hedged and now - start >= delay:
+                hedged.add(engine)
+                launch(engine, 2)
+                if verbose:
+                    print(f"\n🔁 {engine} 超过 {delay:.2f}s 未返回，发起对冲请求")
+
+    for engine in engines:
+        if engine in results:
+            continue
+        abandon(engine)
+        results[engine] = cut_off_search_result(
+            query, engine, cutoff, deadline, start, health=health, hedged=engine in hedged, verbose=verbose
+        )
+
+    if verbose:
+        print(f"\n⏱️ 搜索阶段耗时: {time.perf_counter() - start:.2f}s（{len(engines)} 个引擎并发）")
+
+    return {engine: results[engine] for engine in engines}
+
+
+def fetch_result_pages(search_results: dict, verbose: bool = False, cache_mode: str = 'on',
+                       timeout: float = None):
+    """
+    Step 1.5: 并发抓取搜索结果页面正文（fetch.enabled / --fetch-pages）。
+    
+    按 fetch.engines 的顺序取成功引擎结果中的链接（同一 URL 只抓取一次），最多 fetch.max_pages 个；
+    抽取的正文比原摘要长时写入对应结果的 page_text，提取阶段用它代替摘要。
+    cache_mode: on（读写正文缓存）| refresh（跳过读取，刷新缓存）| off（不使用缓存）
+    timeout: 抓取阶段截止时间（秒），默认 fetch.deadline
+    
+    Returns:
+        dict: {pages, fetched, cache_hits, revalidated, failed, timed_out, bytes, elapsed_ms, expanded}
+    """
+    fetch_conf = get_fetch_config()
+    if timeout is None:
+        timeout = fetch_conf['deadline']
+    
+    targets = []
+    for engine in fetch_conf['engines']:
+        engine_result = search_results.get(engine) or {}
+        if not engine_result.get('success'):
+            continue
+        for item in engine_result.get('search_results') or []:
+            url = item.get('href') or item.get('link') or ''
+            if url.startswith(('http://', 'https://')):
+                targets.append((item, url))
+    urls = list(dict.fromkeys(url for _, url in targets))[:fetch_conf['max_pages']]
+    
+    if verbose:
+        print("\n" + "=" * 60)
+        print("🌐 步骤 1.5: 抓取结果页面正文")
+        print("=" * 60)
+        print(f"   页面数: {len(urls)}（全局并发 {fetch_conf['max_workers']}，每域名 {fetch_conf['per_domain']}）")
+        print(f"   截止时间: {timeout}s")
+        if fetch_conf['proxy']:
+            print(f"   代理地址: {fetch_conf['proxy']}")
+    
+    start = time.perf_counter()
+    with span("fetch.pages", pages=len(urls)) as fetch_span:
+        pages = get_page_fetcher().fetch_many(
+            urls, timeout=timeout, read_cache=cache_mode == 'on', write_cache=cache_mode != 'off'
+        ) if urls else {}
+        stats = {
+            "pages": len(urls),
+            "fetched": sum(1 for page in pages.values() if page["success"] and page["cache"] == "miss"),
+            "cache_hits": sum(1 for page in pages.values() if page["cache"] == "hit"),
+            "revalidated": sum(1 for page in pages.values() if page["cache"] == "revalidated"),
+            "failed": sum(1 for page in pages.values() if not page["success"]),
+            "timed_out": sum(1 for page in pages.values() if page.get("error") == "deadline"),
+            "bytes": sum(page.get("bytes", 0) for page in pages.values()),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+        fetch_span.set(fetched=stats["fetched"], cache_hits=stats["cache_hits"], failed=stats["failed"],
+                       bytes=stats["bytes"])
+    
+    expanded = 0
+    for item, url in targets:
+        page = pages.get(url)
+        if not page or not page["success"]:
+            continue
+        snippet = item.get('body') or item.get('content') or ''
+        if len(page["text"]) > len(snippet):
+            item['page_text'] = page["text"]
+            expanded += 1
+    stats["expanded"] = expanded
+    
+    if verbose:
+        print(f"   抓取 {stats['fetched']}，缓存命中 {stats['cache_hits']}，重新验证 {stats['revalidated']}，"
+              f"失败 {stats['failed']}（超时 {stats['timed_out']}），{expanded} 条结果使用正文，"
+              f"耗时 {stats['elapsed_ms']} ms")
+        for page in pages.values():
+            if not page["success"] and page.get("error") != "deadline":
+                print(f"   ⚠️ {page['url']}: {page['error']}")
+    return stats
+
+
+DEFAULT_EXTRACTION_TIMEOUT = 120
+MIN_EXTRACTION_TIMEOUT = 5
+
+# 以 400 拒绝过 stream_options 的 baseUrl，进程内后续流式请求不再附带
+_stream_options_rejected = set()
+
+
+def extraction_budget(query_deadline: float, elapsed: float):
+    """
+    按查询截止时间计算提取阶段的预算，返回 (extraction_timeout, deadline, deadline_exceeded)。
+    
+    extraction_timeout 为剩余时间，但至少 MIN_EXTRACTION_TIMEOUT 秒，剩余时间不足时 deadline_exceeded 为 True；
+    deadline 为提取阶段的截止时刻（time.monotonic()），由重试层约束全部尝试。
+    未设置 query_deadline 时返回 (None, None, False)。
+    """
+    if not query_deadline:
+        return None, None, False
+    remaining = query_deadline - elapsed
+    extraction_timeout = max(remaining, MIN_EXTRACTION_TIMEOUT)
+    return extraction_timeout, time.monotonic() + extraction_timeout, remaining < MIN_EXTRACTION_TIMEOUT
+
+EXTRACTION_PARAMS = {
+    "temperature": 0.7,
+    "max_tokens": 2000,
+    "top_p": 0.9
+}
+
+# langextract 模式：每个分块独立请求，提取需要贴合原文，使用低温度
+STRUCTURED_EXTRACTION_PARAMS = {
+    "temperature": 0.0,
+    "max_tokens": 2000
+}
+
+
+def engine_documents(engine_data):
+    """
+    把单个引擎的搜索结果整理为文档列表（引擎内排名顺序）。
+    
+    引擎结果只保存 search_results（火山引擎另有 answer），渲染文本在这里按需生成；
+    抓取过全文的结果（page_text）用正文代替摘要。火山引擎只渲染回答和 references，
+    data.search_results 中的条目（kind 为 search_result）只保存、不送入模型。
+    
+    Returns:
+        list: 每个文档为 {source, rank, title, url, content, date, text}，
+              text 为送入模型的渲染文本
+    """
+    if not engine_data or not engine_data.get("success"):
+        return []
+    source = engine_data.get("source")
+    documents = []
+    
+    if source == "zhipu":
+        for rank, item in enumerate(engine_data.get("search_results", [])):
+            title = item.get('title', '')
+            link = item.get('link', '')
+            content = item.get('page_text') or item.get('content', '')
+            date = item.get('publish_date', '')
+            parts = [f"# [智谱] {title}\n"]
+            if date:
+                parts.append(f"日期: {date}\n")
+            if link:
+                parts.append(f"链接: {link}\n")
+            parts.append(f"\n{content}\n\n")
+            documents.append({
+                "source": "zhipu", "rank": rank, "title": title, "url": link,
+                "content": content, "date": date, "text": "".join(parts)
+            })
+    
+    elif source == "duckduckgo":
+        for rank, item in enumerate(engine_data.get("search_results", [])):
+            title = item.get('title', '')
+            link = item.get('href', '')
+            content = item.get('page_text') or item.get('body', '')
+            parts = [f"# [DuckDuckGo] {title}\n"]
+            if link:
+                parts.append(f"链接: {link}\n")
+            parts.append(f"\n{content}\n\n")
+            documents.append({
+                "source": "duckduckgo", "rank": rank, "title": title, "url": link,
+                "content": content, "date": "", "text": "".join(parts)
+            })
+    
+    elif source == "volcengine":
+        answer = engine_data.get("answer", "")
+        if answer:
+            documents.append({
+                "source": "volcengine", "rank": 0, "title": "联网问答结果", "url": "",
+                "content": answer, "date": "", "text": f"# [火山引擎] 联网问答结果\n\n{answer}\n\n"
+            })
+        references = [
+            item for item in engine_data.get("search_results", []) if item.get("kind") != "search_result"
+        ]
+        for rank, item in enumerate(references, 1 if answer else 0):
+            title = item.get('title', '')
+            link = item.get('link', '')
+            content = item.get('page_text') or item.get('content', '')
+            text = f"## [{item.get('site_name') or '参考'}] {title}\n链接: {link}\n{content}\n\n"
+            documents.append({
+                "source": "volcengine", "rank": rank, "title": title, "url": link,
+                "content": content, "date": "", "text": text
+            })
+    
+    return documents
+
+
+def render_engine_content(engine_data) -> str:
+    """单个引擎结果的合并文本（Markdown 导出时按需生成，不保存在结果中）。"""
+    return "".join(doc["text"] for doc in engine_documents(engine_data))
+
+
+def strip_combined_content(result):
+    """去掉旧版本结果中与 search_results 重复的 combined_content（引擎结果与合并结果）。"""
+    result.pop("combined_content", None)
+    for key in ("zhipu_data", "ddg_data", "volcengine_data"):
+        if isinstance(result.get(key), dict):
+            result[key].pop("combined_content", None)
+    return result
+
+
+def collect_documents(zhipu_data, ddg_data, volcengine_data=None):
+    """
+    将各引擎的搜索结果整理为统一的文档列表（按引擎顺序、引擎内排名）。
+    
+    Returns:
+        list: 每个文档为 {source, rank, title, url, content, date, text}
+    """
+    return [
+        doc for engine_data in (zhipu_data, ddg_data, volcengine_data)
+        for doc in engine_documents(engine_data)
+    ]
+
+
+def content_token_budget(extraction_config: dict, prompt_template: str, max_tokens: int) -> int:
+    """搜索内容可用的 token 预算：上下文窗口减去生成长度、提示词模板和预留余量。"""
+    budget = (
+        extraction_config['context_tokens']
+        - max_tokens
+        - estimate_tokens(prompt_template)
+        - extraction_config['prompt_reserve_tokens']
+    )
+    if extraction_config['max_input_tokens']:
+        budget = min(budget, extraction_config['max_input_tokens'])
+    return max(budget, 0)
+
+
+def extraction_cache_key(model_name: str, base_url: str, prompt_template: str, combined_content: str,
+                         params: dict) -> str:
+    """提取结果的内容寻址缓存键：模型、接口地址、提示词模板、输入内容与采样参数的哈希。"""
+    return make_cache_key("extraction", model_name, base_url.rstrip("/"), prompt_template, combined_content, params)
+
+
+def stream_chat_completion(session, url: str, headers: dict, payload: dict, on_delta=None, timeout: float = 120):
+    """
+    以 SSE 流式方式调用 /chat/completions。
+    
+    Args:
+        session: requests.Session
+        url: 完整的 chat/completions 地址
+        headers: 请求头
+        payload: 请求体（会自动设置 stream=True）
+        on_delta: 每收到一段文本时的回调 on_delta(text)
+        timeout: 请求超时（秒）
+    
+    Returns:
+        tuple: (完整文本, 统计信息 {ttfb_ms, ttft_ms, total_ms, completion_tokens, tokens_per_sec, usage})
+        
+        usage 为 prompt_templates.parse_usage 解析后的用量（需要 Provider 在流末尾返回 usage，
+        OpenAI 兼容接口通过 stream_options.include_usage 开启），未返回时为 None
+    """
+    start = time.monotonic()
+    first_token_at = None
+    chunks = []
+    delta_count = 0
+    usage = None
+    
+    response = session.post(url, headers=headers, json={**payload, "stream": True}, timeout=timeout, stream=True)
+    headers_at = time.monotonic()
+    response.raise_for_status()
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            if event.get("usage"):
+                usage = event["usage"]
+            for choice in event.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if not text:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                delta_count += 1
+                chunks.append(text)
+                if on_delta:
+                    on_delta(text)
+    finally:
+        response.close()
+    
+    end = time.monotonic()
+    completion_tokens = (usage or {}).get("completion_tokens") or delta_count
+    generation_time = end - first_token_at if first_token_at is not None else 0
+    stats = {
+        "ttfb_ms": round((headers_at - start) * 1000, 1),
+        "ttft_ms": round((first_token_at - start) * 1000, 1) if first_token_at is not None else None,
+        "total_ms": round((end - start) * 1000, 1),
+        "completion_tokens": completion_tokens,
+        "tokens_per_sec": round(completion_tokens / generation_time, 2) if generation_time > 0 else None,
+        "usage": prompt_templates.parse_usage(usage)
+    }
+    return "".join(chunks), stats
+
+
+def render_structured(structured: dict) -> str:
+    """把 extract_structured 的结构化结果渲染为 Markdown，来源按首次引用的顺序编号。"""
+    numbers = {}
+    
+    def cite(item):
+        source = item.get("source")
+        if not source:
+            return ""
+        key = (source["engine"], source["rank"])
+        if key not in numbers:
+            numbers[key] = (len(numbers) + 1, source)
+        return f" [{numbers[key][0]}]"
+    
+    parts = []
+    if structured["summary"]:
+        parts.append("## 主要内容摘要\n\n")
+        for item in structured["summary"]:
+            parts.append(f"{item['attributes'].get('gist') or item['text']}{cite(item)}\n\n")
+    if structured["key_points"]:
+        parts.append("## 关键点\n\n")
+        for item in structured["key_points"]:
+            point = item['attributes'].get('point')
+            text = f"{point}：「{item['text']}」" if point and point != item['text'] else item['text']
+            parts.append(f"- {text}{cite(item)}\n")
+        parts.append("\n")
+    if structured["facts"]:
+        parts.append("## 相关事实与数据\n\n")
+        for item in structured["facts"]:
+            attributes = item['attributes']
+            label = f"{attributes['subject']}：" if attributes.get('subject') else ""
+            kind = f"（{attributes['type']}）" if attributes.get('type') else ""
+            parts.append(f"- {label}{item['text']}{kind}{cite(item)}\n")
+        parts.append("\n")
+    for item in structured["sources"]:
+        cite(item)
+    if numbers:
+        parts.append("## 来源\n\n")
+        for number, source in sorted(numbers.values(), key=lambda entry: entry[0]):
+            title = source.get("title") or source.get("url") or source["engine"]
+            url = f" {source['url']}" if source.get("url") else ""
+            parts.append(f"{number}. [{source['engine']}] {title}{url}\n")
+    return "".join(parts)
+
+
+def extract_structured_with_langextract(query, documents, zhipu_data, ddg_data, volcengine_data,
+                                        extraction_config: dict, dedup_stats=None, ranking_stats=None,
+                                        verbose: bool = False, cache_mode: str = 'on', timeout: float = None,
+                                        loop=None, deadline: float = None):
+    """
+    langextract 模式的结构化提取：lx.extract 按 max_char_buffer 分块、按 max_workers 并发、
+    extraction_passes 轮提取，不按上下文窗口截断搜索内容（只受可选的 max_input_chars 限制）。
+    
+    loop 不为 None 时模型请求经 AsyncOpenAI 在该事件循环上执行（异步工作流在工作线程中调用本函数）。
+    deadline 为提取阶段的截止时刻（time.monotonic()），每个分块请求的超时与重试都不超过它。
+    
+    Returns:
+        dict: 与 extract_with_langextract 相同的结果结构，另含 structured（带字符区间的 JSON 结果）
+              和 extraction_mode
+    """
+    total_tokens = sum(estimate_tokens(doc["text"]) for doc in documents)
+    documents, packing_stats = pack_documents(
+        documents, total_tokens, max_chars=extraction_config['max_input_chars']
+    )
+    if verbose and packing_stats['dropped_results']:
+        print(f"⚠️ 内容超出 max_input_chars ({extraction_config['max_input_chars']})，"
+              f"保留 {packing_stats['packed_results']} 条结果，舍弃 {packing_stats['dropped_results']} 条")
+    combined_content = "".join(doc["text"] for doc in documents)
+    
+    if not combined_content:
+        if verbose:
+            print("❌ 所有搜索都失败，无法提取信息")
+        return {
+            "success": False,
+            "error": "All searches failed",
+            "zhipu_data": zhipu_data,
+            "ddg_data": ddg_data,
+            "volcengine_data": volcengine_data
+        }
+    
+    try:
+        from langextract_wrap import (
+            EXAMPLE_EXTRACTIONS, EXAMPLE_TEXT, EXTRACTION_DESCRIPTION, HAS_LANGEXTRACT, extract_structured
+        )
+        
+        # 与 prompt 模式一样先校验配置和依赖，再读提取缓存
+        if not HAS_LANGEXTRACT:
+            raise ImportError("langextract 未安装：pip install langextract")
+        model_config = get_langextract_config()
+        model_provider = model_config['provider']
+        model_name = model_config['model']
+        base_url = model_config['baseUrl']
+        
+        if not model_config['apiKey']:
+            raise ValueError("langextract API Key 未配置。请在 conf.json 的 langextract.apiKey 中设置")
+        
+        settings = {
+            **STRUCTURED_EXTRACTION_PARAMS,
+            "max_char_buffer": extraction_config['max_char_buffer'],
+            "extraction_passes": extraction_config['extraction_passes'],
+            "schema_constraints": extraction_config['schema_constraints']
+        }
+        if verbose:
+            print(f"\n📥 输入:")
+            print(f"   总搜索内容长度: {len(combined_content)} 字符（{len(documents)} 条结果）")
+            print(f"   提取方式: langextract（分块 {settings['max_char_buffer']} 字符，"
+                  f"{model_config['max_workers']} 并发，{settings['extraction_passes']} 轮）")
+            print(f"   模型提供商: {model_provider}")
+            print(f"   模型名称: {model_name}")
+            print(f"   Base URL: {base_url}")
+        
+        cache_key = extraction_cache_key(
+            model_name, base_url, EXTRACTION_DESCRIPTION + EXAMPLE_TEXT + repr(EXAMPLE_EXTRACTIONS),
+            combined_content, settings
+        )
+        extraction_cache = get_extraction_cache() if cache_mode != 'off' else None
+        cached = extraction_cache.get(cache_key) if extraction_cache and cache_mode == 'on' else None
+        cache_hit = cached is not None
+        if cache_hit:
+            if verbose:
+                print(f"\n💾 命中提取缓存，跳过 {model_provider} API 调用")
+            structured = cached["structured"]
+        else:
+            if verbose:
+                print(f"\n🤖 正在通过 langextract 调用 {model_provider} API...")
+            with span("extract.langextract", model=model_name, provider=model_provider,
+                      chars=len(combined_content)) as lx_span:
+                structured = extract_structured(
+                    documents, model_config, extraction_config,
+                    params=STRUCTURED_EXTRACTION_PARAMS,
+                    retry_policy=get_retry_config(),
+                    timeout=timeout or DEFAULT_EXTRACTION_TIMEOUT,
+                    deadline=deadline,
+                    loop=loop
+                )
+                lx_span.set(
+                    requests=structured['stats']['requests'],
+                    extractions=structured['stats']['extractions'],
+                    ungrounded=structured['stats']['ungrounded'],
+                    prompt_tokens=structured['stats']['prompt_tokens'],
+                    cached_tokens=structured['stats']['cached_tokens']
+                )
+        
+        extracted_info = render_structured(structured)
+        if verbose:
+            stats = structured['stats']
+            print(f"\n📤 输出:")
+            print(f"   提取成功: ✅")
+            print(f"   提取条目: {stats['extractions']} 条（未对齐原文 {stats['ungrounded']} 条）")
+            if not cache_hit:
+                print(f"   模型请求: {stats['requests']} 次，"
+                      f"{stats['prompt_tokens']} + {stats['completion_tokens']} tokens"
+                      f"（前缀缓存命中 {stats['cached_tokens']}）")
+        
+        if extraction_cache is not None and not cache_hit:
+            try:
+                extraction_cache.set(cache_key, {"structured": structured, "model_name": model_name})
+            except Exception as e:
+                print(f"⚠️ 提取缓存写入失败: {e}")
+        
+        return {
+            "success": True,
+            "zhipu_data": zhipu_data,
+            "ddg_data": ddg_data,
+            "volcengine_data": volcengine_data,
+            "extracted_info": extracted_info,
+            "structured": structured,
+            "extraction_mode": "langextract",
+            "model_provider": model_provider,
+            "model_name": model_name,
+            "cache_hit": cache_hit,
+            "dedup": dedup_stats,
+            "packing": packing_stats,
+            "ranking": ranking_stats,
+            "input": {
+                "total_content_length": len(combined_content),
+                "extraction_prompt": EXTRACTION_DESCRIPTION[:200] + "..."
+            }
+        }
+    
+    except Exception as e:
+        if verbose:
+            print(f"\n❌ 提取失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "success": False,
+            "error": str(e),
+            "zhipu_data": zhipu_data,
+            "ddg_data": ddg_data,
+            "volcengine_data": volcengine_data
+        }
+
+
+def prepare_documents(zhipu_data, ddg_data, volcengine_data, extraction_config: dict, verbose: bool = False):
+    """
+    渲染各引擎的搜索结果并去重、按相关性排序（两种提取方式与同步 / 异步路径共用）。
+    
+    Returns:
+        tuple: (查询, 文档列表, 去重统计或 None, 排序统计或 None)
+    """
+    documents = collect_documents(zhipu_data, ddg_data, volcengine_data)
+    dedup_stats = None
+    if extraction_config['dedup'] and documents:
+        with span("extract.dedup") as dedup_span:
+            documents, dedup_stats = dedupe_documents(
+                documents, max_distance=extraction_config['dedup_max_distance']
+            )
+            dedup_span.set(results=len(documents), removed=dedup_stats['removed_results'],
+                           removed_chars=dedup_stats['removed_chars'])
+        if verbose and dedup_stats['removed_results']:
+            print(f"🧹 去重: 移除 {dedup_stats['removed_results']} 条重复结果 "
+                  f"（URL 重复 {dedup_stats['duplicate_urls']}，正文近重复 {dedup_stats['near_duplicates']}），"
+                  f"节省 {dedup_stats['removed_chars']} 字符")
+    
+    ranking_stats = None
+    query = zhipu_data.get('query') or ddg_data.get('query') or volcengine_data.get('query') or ''
+    if extraction_config['rank'] and query and documents:
+        rank_start = time.perf_counter()
+        with span("extract.rank", results=len(documents)):
+            documents = rank_documents(query, documents, rrf_k=extraction_config['rank_rrf_k'])
+        ranking_stats = {
+            "ranked_results": len(documents),
+            "elapsed_ms": round((time.perf_counter() - rank_start) * 1000, 2)
+        }
+        if verbose:
+            print(f"📊 相关性排序: {len(documents)} 条结果，耗时 {ranking_stats['elapsed_ms']} ms")
+    return query, documents, dedup_stats, ranking_stats
+
+
+def pack_prompt_documents(documents, extraction_config: dict, prompt_template, verbose: bool = False):
+    """prompt 模式：按提示词模板之外剩余的 token 预算打包文档，返回 (文档列表, 打包统计)。"""
+    token_budget = content_token_budget(
+        extraction_config, prompt_template.fixed_text(), EXTRACTION_PARAMS['max_tokens']
+    )
+    with span("extract.pack") as pack_span:
+        documents, packing_stats = pack_documents(
+            documents, token_budget, max_chars=extraction_config['max_content_length']
+        )
+        pack_span.set(results=packing_stats['packed_results'], tokens=packing_stats['used_tokens'],
+                      chars=packing_stats['used_chars'])
+    if verbose and (packing_stats['dropped_results'] or packing_stats['truncated']):
+        print(f"⚠️ 内容超出预算 ({token_budget} tokens)，保留 {packing_stats['packed_results']} 条完整结果，"
+              f"舍弃 {packing_stats['dropped_results']} 条（约 {packing_stats['dropped_tokens']} tokens）"
+              + ("，首条结果已在句子边界截断" if packing_stats['truncated'] else ""))
+    return documents, packing_stats
+
+
+def extraction_result(zhipu_data, ddg_data, volcengine_data, extracted_info: str, model_config: dict,
+                      cache_hit: bool, dedup=None, packing=None, ranking=None, content_length: int = 0,
+                      extraction_prompt: str = "", usage=None):
+    """
+    prompt 模式的提取结果（同步与异步路径共用）。
+    
+    usage: 本次模型请求的用量 {prompt_tokens, cached_tokens, completion_tokens, total_tokens, cache_hit_rate}，
+           命中本地提取缓存或 Provider 未返回 usage 时为 None
+    """
+    return {
+        "success": True,
+        "zhipu_data": zhipu_data,
+        "ddg_data": ddg_data,
+        "volcengine_data": volcengine_data,
+        "extracted_info": extracted_info,
+        "model_provider": model_config['provider'],
+        "model_name": model_config['model'],
+        "cache_hit": cache_hit,
+        "dedup": dedup,
+        "packing": packing,
+        "ranking": ranking,
+        "usage": usage,
+        "input": {
+            "total_content_length": content_length,
+            "extraction_prompt": extraction_prompt
+        }
+    }
+
+
+def extract_with_langextract(zhipu_data, ddg_data, volcengine_data=None, verbose: bool = False,
+                             cache_mode: str = 'on', stream: bool = False, stream_file: str = None,
+                             timeout: float = None, mode: str = None, deadline: float = None):
     """
     Step 2: Extract structured information using configured model (doubao/glm/zhipu).
+    
+    mode: prompt（单次自由文本提示）| langextract（lx.extract 分块并行的结构化提取），默认读取 extraction.mode；
+          langextract 模式不支持流式输出
+    
+    cache_mode: on（读写提取缓存）| refresh（跳过读取，刷新缓存）| off（不使用缓存）
+    stream: 流式调用模型，边生成边输出到标准输出，并记录首 token 延迟与生成速度
+    stream_file: 流式模式下边生成边写入的 extracted_info 文件路径（可选）
+    timeout: 单次模型请求的超时（秒），默认 120
+    deadline: 提取阶段的截止时刻（time.monotonic()），设置 query_deadline 时由 extraction_budget 计算；
+              每次尝试的超时不超过剩余时间，截止时间之后不再重试
     """
     if verbose:
         print("\n" + "=" * 60)
@@ -622,21 +2023,35 @@ def extract_with_langextract(zhipu_data, ddg_data, volcengine_data=None, verbose
         print("=" * 60)
     
     volcengine_data = volcengine_data or {}
+    extraction_config = get_extraction_config()
+    query, documents, dedup_stats, ranking_stats = prepare_documents(
+        zhipu_data, ddg_data, volcengine_data, extraction_config, verbose=verbose
+    )
     
-    combined_content = ""
-    if zhipu_data.get("success"):
-        combined_content += zhipu_data["combined_content"]
-    if ddg_data.get("success"):
-        combined_content += ddg_data["combined_content"]
-    if volcengine_data.get("success"):
-        combined_content += volcengine_data["combined_content"]
+    if (mode or extraction_config['mode']) == 'langextract':
+        if stream and verbose:
+            print("⚠️ langextract 模式不支持流式输出，将在提取完成后输出")
+        return extract_structured_with_langextract(
+            query, documents, zhipu_data, ddg_data, volcengine_data, extraction_config,
+            dedup_stats=dedup_stats, ranking_stats=ranking_stats,
+            verbose=verbose, cache_mode=cache_mode, timeout=timeout, deadline=deadline
+        )
     
-    extraction_config = get_extraction_config()
-    max_content_length = extraction_config['max_content_length']
-    if len(combined_content) > max_content_length:
+    try:
+        prompt_template = get_prompt_template()
+    except ValueError as e:
         if verbose:
-            print(f"⚠️ 内容过长 ({len(combined_content)} 字符)，截断至 {max_content_length} 字符")
-        combined_content = combined_content[:max_content_length]
+            print(f"\n❌ 提取失败: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "zhipu_data": zhipu_data,
+            "ddg_data": ddg_data,
+            "volcengine_data": volcengine_data
+        }
+    
+    documents, packing_stats = pack_prompt_documents(documents, extraction_config, prompt_template, verbose=verbose)
+    combined_content = "".join(doc["text"] for doc in documents)
     
     if not combined_content:
         if verbose:
@@ -661,23 +2076,27 @@ def extract_with_langextract(zhipu_data, ddg_data, volcengine_data=None, verbose
         
         if verbose:
             print(f"\n📥 输入:")
-            print(f"   总搜索内容长度: {len(combined_content)} 字符")
+            print(f"   总搜索内容长度: {len(combined_content)} 字符（约 {packing_stats['used_tokens']} tokens）")
             print(f"   模型提供商: {model_provider}")
             print(f"   模型名称: {model_name}")
             print(f"   Base URL: {base_url}")
         
-        extraction_prompt = f"""基于以下网络搜索结果（包含智谱、DuckDuckGo、火山引擎的结果），请提取结构化信息：
-
-搜索结果：
-{combined_content}
-
-请提取以下信息：
-1. 主要内容摘要
-2. 关键点列表（3-5个）
-3. 相关事实或数据
-4. 来源或参考信息（如果有）
-
-请用清晰的格式输出。"""
+        messages = prompt_template.messages(combined_content)
+        extraction_prompt = prompt_template.preview(combined_content)
+        
+        cache_key = extraction_cache_key(
+            model_name, base_url, prompt_template.fingerprint(), combined_content, EXTRACTION_PARAMS
+        )
+        extraction_cache = get_extraction_cache() if cache_mode != 'off' else None
+        cached = extraction_cache.get(cache_key) if extraction_cache and cache_mode == 'on' else None
+        if cached is not None:
+            if verbose:
+                print(f"\n💾 命中提取缓存，跳过 {model_provider} API 调用")
+            return extraction_result(
+                zhipu_data, ddg_data, volcengine_data, cached["extracted_info"], model_config,
+                cache_hit=True, dedup=dedup_stats, packing=packing_stats, ranking=ranking_stats,
+                content_length=len(combined_content), extraction_prompt=extraction_prompt
+            )
         
         if verbose:
             print(f"\n🤖 正在调用 {model_provider} API...")
@@ -689,49 +2108,160 @@ def extract_with_langextract(zhipu_data, ddg_data, volcengine_data=None, verbose
         
         payload = {
             "model": model_name,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": extraction_prompt
-                }
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-            "top_p": 0.9
+            "messages": messages,
+            **EXTRACTION_PARAMS
         }
+        if stream and prompt_template.stream_usage and base_url not in _stream_options_rejected:
+            payload["stream_options"] = {"include_usage": True}
         
-        response = requests.post(
-            f"{base_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=120
+        session = provider_clients.get_http_session(base_url)
+        request_timeout = timeout or DEFAULT_EXTRACTION_TIMEOUT
+        streaming_stats = None
+        usage = None
+        limiter = get_provider_limiter(
+            f"llm:{base_url}", api_key, qps=model_config['qps'], tpm=model_config['tpm']
+        )
+        request_tokens = (
+            estimate_tokens(prompt_template.fixed_text()) + packing_stats['used_tokens'] + EXTRACTION_PARAMS['max_tokens']
         )
-        response.raise_for_status()
         
-        result = response.json()
-        extracted_info = result["choices"][0]["message"]["content"]
+        if stream:
+            stream_out = None
+            if stream_file:
+                Path(stream_file).parent.mkdir(parents=True, exist_ok=True)
+                stream_out = open(stream_file, "w", encoding="utf-8")
+                stream_out.write(f"# 提取的结构化信息\n\n")
+                stream_out.write(f"**源查询**: {query}\n\n")
+                stream_out.write(f"**时间**: {datetime.now().isoformat()}\n\n")
+                stream_out.write("---\n\n")
+                stream_out.flush()
+            
+            emitted = []
+            
+            def on_delta(text):
+                emitted.append(True)
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                if stream_out:
+                    stream_out.write(text)
+                    stream_out.flush()
+            
+            def stream_request(attempt_timeout):
+                url = f"{base_url}/chat/completions"
+                try:
+                    return stream_chat_completion(
+                        session, url, headers, payload, on_delta=on_delta, timeout=attempt_timeout
+                    )
+                except Exception as e:
+                    # 不认识 stream_options 的 Provider 返回 400：去掉后重发一次（不计入重试次数），用量记为 null
+                    if emitted or "stream_options" not in payload or error_status(e) != 400:
+                        raise
+                    payload.pop("stream_options")
+                    _stream_options_rejected.add(base_url)
+                    print(f"⚠️ {model_provider or model_name} 不支持 stream_options，已去掉后重试")
+                    return stream_chat_completion(
+                        session, url, headers, payload, on_delta=on_delta, timeout=attempt_timeout
+                    )
+            
+            print("\n" + "=" * 60)
+            print("📝 提取的信息（流式输出）")
+            print("=" * 60 + "\n")
+            try:
+                with span("llm.request", model=model_name, provider=model_provider, stream=True) as llm_span:
+                    # 已输出部分内容后不再重试，避免重复输出
+                    extracted_info, streaming_stats = call_with_retry(
+                        stream_request,
+                        policy=get_retry_config(),
+                        limiter=limiter,
+                        tokens=request_tokens,
+                        should_retry=lambda e: not emitted and is_retryable(e),
+                        on_retry=log_retry(model_provider or model_name),
+                        timeout=request_timeout,
+                        deadline=deadline
+                    )
+                    usage = streaming_stats['usage']
+                    llm_span.set(
+                        ttfb_ms=streaming_stats['ttfb_ms'],
+                        ttft_ms=streaming_stats['ttft_ms'],
+                        bytes=len(extracted_info.encode("utf-8")),
+                        completion_tokens=streaming_stats['completion_tokens'],
+                        prompt_tokens=usage['prompt_tokens'] if usage else None,
+                        cached_tokens=usage['cached_tokens'] if usage else None
+                    )
+            finally:
+                if stream_out:
+                    stream_out.close()
+            print()
+        else:
+            with span("llm.request", model=model_name, provider=model_provider, stream=False) as llm_span:
+                attempts = []
+                
+                def post(attempt_timeout):
+                    attempts.append(True)
+                    response = session.post(
+                        f"{base_url}/chat/completions",
+                        headers=headers,
+                        json=payload,
+                        timeout=attempt_timeout
+                    )
+                    elapsed = getattr(response, "elapsed", None)
+                    llm_span.set(
+                        status_code=response.status_code,
+                        ttfb_ms=round(elapsed.total_seconds() * 1000, 1) if elapsed else None,
+                        bytes=len(response.content or b""),
+                        attempts=len(attempts)
+                    )
+                    response.raise_for_status()
+                    return response
+                
+                response = call_with_retry(
+                    post,
+                    policy=get_retry_config(),
+                    limiter=limiter,
+                    tokens=request_tokens,
+                    on_retry=log_retry(model_provider or model_name),
+                    timeout=request_timeout,
+                    deadline=deadline
+                )
+                result = response.json()
+                extracted_info = result["choices"][0]["message"]["content"]
+                usage = prompt_templates.parse_usage(result.get("usage"))
+                if usage:
+                    llm_span.set(
+                        prompt_tokens=usage['prompt_tokens'],
+                        cached_tokens=usage['cached_tokens'],
+                        completion_tokens=usage['completion_tokens']
+                    )
         
         if verbose:
             print(f"\n📤 输出:")
             print(f"   提取成功: ✅")
             print(f"   提取内容长度: {len(extracted_info)} 字符")
+            if usage:
+                print(f"   Token 用量: {usage['prompt_tokens']} + {usage['completion_tokens']}"
+                      f"（前缀缓存命中 {usage['cached_tokens']}）")
+            if streaming_stats:
+                print(f"   首 token 延迟: {streaming_stats['ttft_ms']} ms")
+                print(f"   生成速度: {streaming_stats['tokens_per_sec']} tokens/s")
             print(f"\n   提取内容（前500字符）:")
             print(f"   {extracted_info[:500]}...")
         
-        return {
-            "success": True,
-            "zhipu_data": zhipu_data,
-            "ddg_data": ddg_data,
-            "volcengine_data": volcengine_data,
-            "combined_content": combined_content,
-            "extracted_info": extracted_info,
-            "model_provider": model_provider,
-            "model_name": model_name,
-            "input": {
-                "total_content_length": len(combined_content),
-                "extraction_prompt": extraction_prompt[:200] + "..."
-            }
-        }
+        if extraction_cache is not None:
+            try:
+                extraction_cache.set(cache_key, {"extracted_info": extracted_info, "model_name": model_name})
+            except Exception as e:
+                print(f"⚠️ 提取缓存写入失败: {e}")
+        
+        final_result = extraction_result(
+            zhipu_data, ddg_data, volcengine_data, extracted_info, model_config,
+            cache_hit=False, dedup=dedup_stats, packing=packing_stats, ranking=ranking_stats,
+            content_length=len(combined_content), extraction_prompt=extraction_prompt, usage=usage
+        )
+        if streaming_stats:
+            final_result["streaming"] = streaming_stats
+            if stream_file:
+                final_result["extracted_info_file"] = str(stream_file)
+        return final_result
         
     except Exception as e:
         if verbose:
@@ -747,66 +2277,474 @@ def extract_with_langextract(zhipu_data, ddg_data, volcengine_data=None, verbose
         }
 
 
-def save_results(final_result, output_dir: str, save_json: bool = False, verbose: bool = False):
-    """Save results to files."""
+def select_engines(volcengine: bool = False, volcengine_only: bool = False, verbose: bool = False):
+    """根据命令行开关和 conf.json 确定本次要执行的搜索引擎。"""
+    if volcengine_only:
+        return ['volcengine']
+    
+    engines = []
+    zhipu_search_conf = get_zhipu_search_config()
+    if zhipu_search_conf.get('enabled', True):
+        engines.append('zhipu')
+    else:
+        if verbose:
+            print("\n⏭️ 智谱搜索已禁用，跳过...")
+    engines.append('duckduckgo')
+    
+    if volcengine:
+        engines.append('volcengine')
+    return engines
+
+
+def select_healthy_engines(engines, verbose: bool = False):
+    """
+    按熔断状态和调度策略筛选本次调用的引擎。
+    
+    Returns:
+        tuple: (引擎列表, {被跳过的引擎: 原因}, 探测中的引擎列表)
+    """
+    health = get_engine_health()
+    if health is None:
+        return engines, {}, []
+    health_conf = get_engine_health_config()
+    selected, skipped, probes = plan_engines(
+        health, engines, scheduler=health_conf['scheduler'], target_results=health_conf['target_results']
+    )
+    if verbose:
+        for engine, reason in skipped.items():
+            label = "已熔断" if reason == 'circuit_open' else "历史产出较低"
+            print(f"\n⏭️ 跳过 {engine}（{label}）")
+        for engine in probes:
+            print(f"\n🩺 {engine} 熔断冷却期已过，发送探测请求")
+    return selected, skipped, probes
+
+
+def lookup_history(query: str, output_dir: str = None, verbose: bool = False):
+    """
+    在结果库中查找可直接复用的历史结果：先按规范化查询的字符 n-gram 相似度匹配最近回答过的查询，
+    未命中时再查全文索引。
+    
+    Returns:
+        dict | None: 命中时为历史结果，history_hit 记录来源 run_id、历史查询、查询相似度、
+                     匹配方式（query / fulltext）、全文相关度和时间，否则 None
+    """
+    store = get_results_store(output_dir)
+    if store is None:
+        return None
+    history_config = get_history_config()
+    with span("history.lookup") as history_span:
+        hit = store.find_similar_query(
+            query, max_age=history_config['max_age'], min_similarity=history_config['query_similarity']
+        )
+        match = "query"
+        if hit is None:
+            hit = store.find_similar(
+                query, max_age=history_config['max_age'], min_relevance=history_config['min_relevance']
+            )
+            match = "fulltext"
+        history_span.set(hit=hit is not None, match=match if hit else None)
+    if hit is None:
+        if verbose:
+            print(f"\n📚 历史结果未命中，继续搜索")
+        return None
+    
+    result = strip_combined_content(hit["result"])
+    for key in ("run_id", "saved_at", "trace", "extracted_info_file", "deadline", "streaming", "usage"):
+        result.pop(key, None)
+    result["history_hit"] = {
+        "run_id": hit["run_id"],
+        "query": hit["query"],
+        "similarity": hit.get("similarity", round(query_similarity(query, hit["query"]), 3)),
+        "match": match,
+        "relevance": hit.get("relevance"),
+        "age": round(time.time() - hit["created_at"], 1)
+    }
+    if verbose:
+        print(f"\n📚 命中历史结果: {hit['query']}（{hit['run_id']}，相似度 {result['history_hit']['similarity']}），"
+              f"跳过搜索与提取")
+    return result
+
+
+def run_workflow(query: str, verbose: bool = False, ddg_max_results: int = None, volcengine: bool = False,
+                 volcengine_only: bool = False, search_deadline: float = None, cache_mode: str = 'on',
+                 stream: bool = False, stream_file: str = None, query_deadline: float = None,
+                 min_results: int = None, min_engines: int = None, hedge: bool = None,
+                 history_first: bool = None, output_dir: str = None, fetch_pages: bool = None,
+                 extract_mode: str = None):
+    """
+    执行完整的 搜索 → 提取 流程（不保存文件）。
+    
+    设置 query_deadline 时，搜索阶段最多使用其中 search_share 比例的时间（且不超过 search_deadline），
+    剩余时间作为提取阶段的截止时间（含重试），搜索提前结束节省的时间全部留给提取；剩余时间不足
+    MIN_EXTRACTION_TIMEOUT 或查询总耗时超过 query_deadline 时，结果的 deadline.deadline_exceeded 为 True。
+    
+    history_first 为 True（默认读取 history.first）且 cache_mode 为 on 时，先在 output_dir 对应结果库的
+    全文索引中查找足够新、足够相关的历史结果，命中则直接返回，不调用搜索引擎和模型。
+    
+    fetch_pages 为 True（默认读取 fetch.enabled）时在搜索之后抓取结果页面正文，设置 query_deadline 时
+    抓取阶段不超过为提取保留 MIN_EXTRACTION_TIMEOUT 秒之后的剩余时间。
+    
+    extract_mode 覆盖 extraction.mode（prompt | langextract）。
+    
+    Returns:
+        dict: extract_with_langextract 的结果，trace 字段为各阶段的 span 列表，
+              search_cutoff 记录被放弃的引擎及原因，hedged 记录发起过对冲请求的引擎
+    """
+    start = time.perf_counter()
+    trace, token = start_trace()
+    try:
+        with span("config.load"):
+            load_project_conf()
+            workflow_config = get_workflow_config()
+            if history_first is None:
+                history_first = get_history_config()['first']
+            fetch_config = get_fetch_config()
+            if fetch_pages is None:
+                fetch_pages = fetch_config['enabled']
+            engines = select_engines(volcengine=volcengine, volcengine_only=volcengine_only, verbose=verbose)
+        
+        # 在熔断器放行探测请求之前查历史结果，命中时不改变引擎状态
+        if history_first and cache_mode == 'on':
+            history_result = lookup_history(query, output_dir, verbose=verbose)
+            if history_result is not None:
+                history_result["trace"] = trace.to_list()
+                return history_result
+        
+        engines, engine_skipped, engine_probes = select_healthy_engines(engines, verbose=verbose)
+        if query_deadline is None:
+            query_deadline = workflow_config['query_deadline']
+        if search_deadline is None:
+            search_deadline = workflow_config['search_deadline']
+        if query_deadline:
+            search_deadline = min(search_deadline, query_deadline * workflow_config['search_share'])
+        
+        search_results = run_searches(
+            query,
+            engines,
+            verbose=verbose,
+            ddg_max_results=ddg_max_results,
+            deadline=search_deadline,
+            cache_mode=cache_mode,
+            min_results=min_results,
+            min_engines=min_engines,
+            hedge=hedge
+        )
+        
+        fetch_stats = None
+        if fetch_pages:
+            fetch_timeout = fetch_config['deadline']
+            if query_deadline:
+                fetch_timeout = min(
+                    fetch_timeout, query_deadline - (time.perf_counter() - start) - MIN_EXTRACTION_TIMEOUT
+                )
+            if fetch_timeout > 0:
+                fetch_stats = fetch_result_pages(search_results, verbose=verbose, cache_mode=cache_mode,
+                                                 timeout=fetch_timeout)
+        
+        extraction_timeout, extraction_deadline, deadline_exceeded = extraction_budget(
+            query_deadline, time.perf_counter() - start
+        )
+        if deadline_exceeded and verbose:
+            print(f"\n⏱️ 查询截止时间 {query_deadline}s 剩余不足 {MIN_EXTRACTION_TIMEOUT}s，"
+                  f"提取仍按 {MIN_EXTRACTION_TIMEOUT}s 执行")
+        result = extract_with_langextract(
+            search_results.get('zhipu', {}),
+            search_results.get('duckduckgo', {}),
+            search_results.get('volcengine', {}),
+            verbose=verbose,
+            cache_mode=cache_mode,
+            stream=stream,
+            stream_file=stream_file,
+            mode=extract_mode,
+            deadline=extraction_deadline
+        )
+    finally:
+        end_trace(token)
+    return finish_workflow_result(
+        result, search_results, trace, engine_skipped=engine_skipped, engine_probes=engine_probes,
+        fetch_stats=fetch_stats, query_deadline=query_deadline, search_deadline=search_deadline,
+        extraction_timeout=extraction_timeout, deadline_exceeded=deadline_exceeded,
+        elapsed=time.perf_counter() - start
+    )
+
+
+def finish_workflow_result(result, search_results: dict, trace, engine_skipped=None, engine_probes=None,
+                           fetch_stats=None, query_deadline: float = None, search_deadline: float = None,
+                           extraction_timeout: float = None, deadline_exceeded: bool = False, elapsed: float = None):
+    """
+    补充搜索截断、引擎调度、页面抓取、截止时间和 trace 信息（同步与异步工作流共用）。
+    
+    deadline.deadline_exceeded：提取开始时剩余时间已不足 MIN_EXTRACTION_TIMEOUT，或查询总耗时 elapsed
+    超过了 query_deadline。
+    """
+    result["search_cutoff"] = {
+        engine: engine_result["cut_off"]
+        for engine, engine_result in search_results.items() if engine_result.get("cut_off")
+    }
+    result["hedged"] = [engine for engine, engine_result in search_results.items() if engine_result.get("hedged")]
+    result["engine_skipped"] = engine_skipped
+    result["engine_probes"] = engine_probes
+    result["fetch"] = fetch_stats
+    result["deadline"] = {
+        "query_deadline": query_deadline,
+        "search_deadline": search_deadline,
+        "extraction_timeout": round(extraction_timeout, 3) if extraction_timeout else None,
+        "deadline_exceeded": bool(query_deadline) and (
+            deadline_exceeded or (elapsed is not None and elapsed > query_deadline)
+        )
+    }
+    result["trace"] = trace.to_list()
+    return result
+
+
+def read_batch_queries(path: str):
+    """
+    读取批量查询文件。
+    
+    支持两种行格式：纯文本（一行一个查询）和 JSONL（{"query": "..."}）；
+    空行和以 # 开头的行会被忽略。path 为 '-' 时从标准输入读取。
+    """
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    
+    queries = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if isinstance(record, dict):
+                if record.get('query'):
+                    queries.append(str(record['query']).strip())
+                continue
+        queries.append(line)
+    return queries
+
+
+def run_batch(queries, output_file: str, concurrency: int = None, store=None, **workflow_options):
+    """
+    批量执行工作流，每个查询的结果写为一行 JSONL。
+    
+    Args:
+        queries: 查询列表
+        output_file: JSONL 输出文件路径
+        concurrency: 同时处理的查询数，默认读取 workflow.batch_concurrency
+        store: 可选的结果库，每个结果同时加入其写入队列
+        workflow_options: 透传给 run_workflow 的参数
+    
+    Returns:
+        dict: {total, succeeded, failed, elapsed, qps, output_file}
+    """
+    if concurrency is None:
+        concurrency = get_workflow_config()['batch_concurrency']
+    concurrency = max(1, int(concurrency))
+    
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    print("=" * 60)
+    print(f"📦 批量模式: {len(queries)} 个查询，并发 {concurrency}")
+    print(f"   输出文件: {output_path}")
+    print("=" * 60)
+    
+    failed = 0
+    start = time.monotonic()
+    
+    def process(index, query):
+        query_start = time.monotonic()
+        try:
+            result = run_workflow(query, **workflow_options)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        return index, query, result, time.monotonic() - query_start
+    
+    with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(process, i, q) for i, q in enumerate(queries)]
+        for done, future in enumerate(as_completed(futures), 1):
+            index, query, result, elapsed = future.result()
+            if not write_batch_record(out, index, query, result, elapsed, store=store,
+                                      progress=f"{done}/{len(queries)}"):
+                failed += 1
+    
+    return finish_batch(len(queries), failed, time.monotonic() - start, output_path)
+
+
+def write_batch_record(out, index: int, query: str, result: dict, elapsed: float, store=None, progress: str = ""):
+    """把一个查询的结果写为一行 JSONL 并输出进度，返回该查询是否成功。"""
+    if store is not None:
+        result["run_id"] = store.put(result, query=query)
+    record = {"index": index, "query": query, "elapsed": round(elapsed, 3), **result}
+    write_jsonl(record, out)
+    out.flush()
+    status = "✅" if result.get("success") else f"❌ {result.get('error', 'Unknown error')}"
+    print(f"[{progress}] {status} {query} ({elapsed:.2f}s)")
+    return bool(result.get("success"))
+
+
+def finish_batch(total: int, failed: int, total_elapsed: float, output_path: Path):
+    """汇总并输出批量处理结果。"""
+    summary = {
+        "total": total,
+        "succeeded": total - failed,
+        "failed": failed,
+        "elapsed": total_elapsed,
+        "qps": total / total_elapsed if total_elapsed > 0 else 0.0,
+        "output_file": str(output_path)
+    }
+    
+    print("\n" + "=" * 60)
+    print("📋 批量处理完成")
+    print("=" * 60)
+    print(f"   查询总数: {summary['total']}")
+    print(f"   成功: {summary['succeeded']}，失败: {summary['failed']}")
+    print(f"   总耗时: {summary['elapsed']:.2f}s")
+    print(f"   吞吐量: {summary['qps']:.2f} 查询/秒")
+    print(f"   结果文件: {summary['output_file']}")
+    
+    return summary
+
+
+def save_results(final_result, output_dir: str, save_json: bool = False, verbose: bool = False,
+                 markdown: bool = None, query: str = None, run_id: str = None):
+    """
+    Save results.
+    
+    结果追加写入结果库（后台线程批量提交，不等待写盘）；markdown 为 True 时另外导出 Markdown 文件，
+    为 None 时读取 storage.markdown，结果库未启用时总是导出。文件名以 run_id 区分，并发运行不会互相覆盖。
+    
+    写入耗时记录为 save_results span，追加到 final_result["trace"]（结果库与完整 JSON 中不含该 span）。
+    
+    Returns:
+        list: 导出的文件路径
+    """
+    run_id = run_id or final_result.get("run_id") or new_run_id()
+    final_result["run_id"] = run_id
+    final_result["saved_at"] = datetime.now().isoformat()
+    if markdown is None:
+        markdown = get_storage_config()['markdown']
+    
+    trace = final_result.get("trace")
+    with span("save_results", sink=trace if isinstance(trace, list) else None) as save_span:
+        store = get_results_store(output_dir)
+        # 历史结果已在结果库中，不重复写入
+        if store is not None and not final_result.get("history_hit"):
+            snapshot = dict(final_result)
+            if isinstance(trace, list):
+                snapshot["trace"] = list(trace)
+            store.put(snapshot, query=query, run_id=run_id)
+            if verbose:
+                print(f"\n💾 结果已加入写入队列: {store.path}（{run_id}）")
+        saved_files = _write_result_files(
+            final_result, output_dir, run_id,
+            markdown=markdown or store is None, save_json=save_json, verbose=verbose
+        )
+        save_span.set(
+            stored=store is not None,
+            files=len(saved_files),
+            bytes=sum(os.path.getsize(f) for f in saved_files if os.path.exists(f))
+        )
+    return saved_files
+
+
+def _write_result_files(final_result, output_dir: str, run_id: str, markdown: bool = True,
+                        save_json: bool = False, verbose: bool = False):
+    saved_files = []
+    if not markdown and final_result.get("extracted_info_file"):
+        # 流式模式下提取内容已边生成边写入文件
+        saved_files.append(final_result["extracted_info_file"])
+    if not markdown and not save_json:
+        return saved_files
+    
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    saved_at = final_result.get("saved_at") or datetime.now().isoformat()
     
     if verbose:
         print("\n" + "=" * 60)
-        print("💾 保存结果")
+        print("💾 导出文件")
         print("=" * 60)
         print(f"\n输出目录: {output_dir}")
     
+    if markdown:
+        saved_files.extend(_write_markdown_files(final_result, output_path, run_id, saved_at, verbose))
+        if final_result.get("structured"):
+            structured_file = output_path / f"structured_extraction_{run_id}.json"
+            with open(structured_file, "w", encoding="utf-8") as f:
+                write_json(final_result["structured"], f)
+            saved_files.append(str(structured_file))
+            if verbose:
+                print(f"✅ 已保存: {structured_file.name}")
+    
+    # Save full JSON
+    if save_json:
+        json_file = output_path / f"full_results_{run_id}.json"
+        with open(json_file, "w", encoding="utf-8") as f:
+            write_json(final_result, f)
+        saved_files.append(str(json_file))
+        if verbose:
+            print(f"✅ 已保存: {json_file.name}")
+    
+    return saved_files
+
+
+def _write_markdown_files(final_result, output_path: Path, run_id: str, saved_at: str, verbose: bool = False):
     saved_files = []
     
     # Save Zhipu search result
     if final_result.get("zhipu_data", {}).get("success"):
-        zhipu_file = output_path / f"zhipu_search_result_{timestamp}.md"
+        zhipu_file = output_path / f"zhipu_search_result_{run_id}.md"
         with open(zhipu_file, "w", encoding="utf-8") as f:
             f.write(f"# 智谱 MCP 搜索结果\n\n")
             f.write(f"**查询**: {final_result['zhipu_data']['query']}\n\n")
-            f.write(f"**时间**: {datetime.now().isoformat()}\n\n")
+            f.write(f"**时间**: {saved_at}\n\n")
             f.write("---\n\n")
-            f.write(final_result['zhipu_data']['combined_content'])
+            f.write(render_engine_content(final_result['zhipu_data']))
         saved_files.append(str(zhipu_file))
         if verbose:
             print(f"✅ 已保存: {zhipu_file.name}")
     
     # Save DuckDuckGo search result
     if final_result.get("ddg_data", {}).get("success"):
-        ddg_file = output_path / f"duckduckgo_search_result_{timestamp}.md"
+        ddg_file = output_path / f"duckduckgo_search_result_{run_id}.md"
         with open(ddg_file, "w", encoding="utf-8") as f:
             f.write(f"# DuckDuckGo 搜索结果\n\n")
             f.write(f"**查询**: {final_result['ddg_data']['query']}\n\n")
-            f.write(f"**时间**: {datetime.now().isoformat()}\n\n")
+            f.write(f"**时间**: {saved_at}\n\n")
             f.write("---\n\n")
-            f.write(final_result['ddg_data']['combined_content'])
+            f.write(render_engine_content(final_result['ddg_data']))
         saved_files.append(str(ddg_file))
         if verbose:
             print(f"✅ 已保存: {ddg_file.name}")
     
     # Save Volcengine search result
     if final_result.get("volcengine_data", {}).get("success"):
-        volcengine_file = output_path / f"volcengine_search_result_{timestamp}.md"
+        volcengine_file = output_path / f"volcengine_search_result_{run_id}.md"
         with open(volcengine_file, "w", encoding="utf-8") as f:
             f.write(f"# 火山引擎联网问答搜索结果\n\n")
             f.write(f"**查询**: {final_result['volcengine_data']['query']}\n\n")
-            f.write(f"**时间**: {datetime.now().isoformat()}\n\n")
+            f.write(f"**时间**: {saved_at}\n\n")
             f.write("---\n\n")
-            f.write(final_result['volcengine_data']['combined_content'])
+            f.write(render_engine_content(final_result['volcengine_data']))
         saved_files.append(str(volcengine_file))
         if verbose:
             print(f"✅ 已保存: {volcengine_file.name}")
     
-    # Save extracted info
-    if final_result.get("success") and final_result.get("extracted_info"):
-        extract_file = output_path / f"extracted_info_{timestamp}.md"
+    # Save extracted info（流式模式下已边生成边写入）
+    if final_result.get("extracted_info_file"):
+        saved_files.append(final_result["extracted_info_file"])
+    elif final_result.get("success") and final_result.get("extracted_info"):
+        extract_file = output_path / f"extracted_info_{run_id}.md"
         with open(extract_file, "w", encoding="utf-8") as f:
             f.write(f"# 提取的结构化信息\n\n")
             f.write(f"**源查询**: {final_result['zhipu_data']['query'] if final_result.get('zhipu_data') else final_result['ddg_data']['query']}\n\n")
-            f.write(f"**时间**: {datetime.now().isoformat()}\n\n")
+            f.write(f"**时间**: {saved_at}\n\n")
             f.write("---\n\n")
             f.write(final_result['extracted_info'])
         saved_files.append(str(extract_file))
@@ -814,10 +2752,10 @@ def save_results(final_result, output_dir: str, save_json: bool = False, verbose
             print(f"✅ 已保存: {extract_file.name}")
     
     # Save workflow summary
-    summary_file = output_path / f"workflow_summary_{timestamp}.md"
+    summary_file = output_path / f"workflow_summary_{run_id}.md"
     with open(summary_file, "w", encoding="utf-8") as f:
         f.write(f"# 工作流摘要\n\n")
-        f.write(f"**时间**: {datetime.now().isoformat()}\n\n")
+        f.write(f"**时间**: {saved_at}\n\n")
         f.write(f"**状态**: {'✅ 成功' if final_result.get('success') else '❌ 失败'}\n\n")
         
         if final_result.get("success"):
@@ -834,9 +2772,45 @@ def save_results(final_result, output_dir: str, save_json: bool = False, verbose
                 f.write(f"**DuckDuckGo 搜索结果数**: {len(final_result['ddg_data'].get('search_results', []))} 条\n\n")
             if final_result.get("volcengine_data", {}).get("success"):
                 f.write(f"**火山引擎搜索结果数**: {len(final_result['volcengine_data'].get('search_results', []))} 条\n\n")
-            f.write(f"**总搜索内容长度**: {len(final_result['combined_content'])} 字符\n\n")
+            f.write(f"**总搜索内容长度**: {(final_result.get('input') or {}).get('total_content_length', 0)} 字符\n\n")
+            if final_result.get("dedup"):
+                f.write(f"**去重移除**: {final_result['dedup']['removed_results']} 条 / "
+                        f"{final_result['dedup']['removed_chars']} 字符\n\n")
+            if final_result.get("packing"):
+                f.write(f"**送入模型**: {final_result['packing']['packed_results']} 条结果，"
+                        f"约 {final_result['packing']['used_tokens']} / {final_result['packing']['token_budget']} tokens，"
+                        f"舍弃 {final_result['packing']['dropped_results']} 条\n\n")
+            if final_result.get("fetch"):
+                f.write(f"**页面抓取**: {final_result['fetch']['pages']} 个页面，"
+                        f"{final_result['fetch']['expanded']} 条结果使用正文，失败 {final_result['fetch']['failed']} 个\n\n")
             if final_result.get("extracted_info"):
                 f.write(f"**提取内容长度**: {len(final_result['extracted_info'])} 字符\n\n")
+            if final_result.get("structured"):
+                structured_stats = final_result['structured']['stats']
+                f.write(f"**结构化提取**: langextract，{structured_stats['extractions']} 条"
+                        f"（未对齐原文 {structured_stats['ungrounded']} 条），"
+                        f"{structured_stats['requests']} 次模型请求\n\n")
+            f.write(f"**提取缓存**: {'命中' if final_result.get('cache_hit') else '未命中'}\n\n")
+            if final_result.get("usage"):
+                usage = final_result["usage"]
+                f.write(f"**Token 用量**: 输入 {usage['prompt_tokens']}（前缀缓存命中 {usage['cached_tokens']}），"
+                        f"输出 {usage['completion_tokens']}\n\n")
+            if final_result.get("history_hit"):
+                f.write(f"**历史结果**: {final_result['history_hit']['query']}（{final_result['history_hit']['run_id']}，"
+                        f"相似度 {final_result['history_hit']['similarity']}）\n\n")
+            if final_result.get("search_cutoff"):
+                f.write(f"**未等待的引擎**: " + ", ".join(
+                    f"{engine}（{reason}）" for engine, reason in final_result["search_cutoff"].items()
+                ) + "\n\n")
+            if final_result.get("engine_skipped"):
+                f.write(f"**跳过的引擎**: " + ", ".join(
+                    f"{engine}（{reason}）" for engine, reason in final_result["engine_skipped"].items()
+                ) + "\n\n")
+            if final_result.get("hedged"):
+                f.write(f"**对冲请求**: {', '.join(final_result['hedged'])}\n\n")
+            if final_result.get("streaming"):
+                f.write(f"**首 token 延迟**: {final_result['streaming']['ttft_ms']} ms\n\n")
+                f.write(f"**生成速度**: {final_result['streaming']['tokens_per_sec']} tokens/s\n\n")
         
         if final_result.get("error"):
             f.write(f"**错误**: {final_result['error']}\n\n")
@@ -848,18 +2822,50 @@ def save_results(final_result, output_dir: str, save_json: bool = False, verbose
     if verbose:
         print(f"✅ 已保存: {summary_file.name}")
     
-    # Save full JSON
-    if save_json:
-        json_file = output_path / f"full_results_{timestamp}.json"
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump(final_result, f, ensure_ascii=False, indent=2)
-        saved_files.append(str(json_file))
-        if verbose:
-            print(f"✅ 已保存: {json_file.name}")
-    
     return saved_files
 
 
+def print_stored_results(store, query: str = None, limit: int = 20):
+    """打印结果库中最近的结果。"""
+    store.flush()
+    rows = store.list(query=query, limit=limit)
+    if not rows:
+        print("（结果库为空）")
+        return
+    for row in rows:
+        created = datetime.fromtimestamp(row['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+        status = "✅" if row['status'] == 'success' else "❌"
+        print(f"{status} {row['run_id']}  {created}  {row['query']}  [{row['engines'] or '-'}]")
+
+
+def export_stored_result(store, run_id: str, output_dir: str, save_json: bool = False):
+    """把结果库中的一条结果导出为 Markdown（及 JSON）文件。"""
+    store.flush()
+    result = store.get(run_id)
+    if result is None:
+        print(f"❌ 结果库中没有 {run_id}")
+        sys.exit(1)
+    # 流式输出文件可能已被清理，导出时按结果内容重新生成
+    result.pop("extracted_info_file", None)
+    strip_combined_content(result)
+    for f in _write_result_files(result, output_dir, run_id, save_json=save_json):
+        print(f"✅ 已导出: {f}")
+
+
+def print_engine_health(health):
+    """打印各搜索引擎的近期统计。"""
+    def fmt_seconds(value):
+        return f"{value:.2f}s" if value is not None else "-"
+    
+    print(f"{'引擎':<12} {'状态':<10} {'调用':>6} {'错误率':>8} {'p50':>8} {'p95':>8} {'平均结果':>8}")
+    for engine in ('zhipu', 'duckduckgo', 'volcengine'):
+        stats = health.stats(engine)
+        error_rate = f"{stats['error_rate']:.0%}" if stats['error_rate'] is not None else "-"
+        mean_results = f"{stats['mean_results']:.1f}" if stats['mean_results'] is not None else "-"
+        print(f"{engine:<12} {stats['state']:<10} {stats['calls']:>6} {error_rate:>8} "
+              f"{fmt_seconds(stats['p50_latency']):>8} {fmt_seconds(stats['p95_latency']):>8} {mean_results:>8}")
+
+
 def main():
     add_project_path()
     
@@ -883,7 +2889,26 @@ def main():
     parser.add_argument(
         "--output-dir",
         default=str(PROJECT_ROOT / "output"),
-        help="输出目录"
+        help="输出目录（结果库默认为 <output-dir>/results.sqlite3）"
+    )
+    parser.add_argument(
+        "--markdown",
+        action="store_true",
+        default=None,
+        help="同时导出 Markdown 文件（搜索结果、提取信息、工作流摘要），默认读取 storage.markdown"
+    )
+    parser.add_argument(
+        "--list-results",
+        type=int,
+        nargs="?",
+        const=20,
+        metavar="N",
+        help="列出结果库中最近 N 条结果（默认 20）后退出，可配合 --query 过滤"
+    )
+    parser.add_argument(
+        "--export-run",
+        metavar="RUN_ID",
+        help="把结果库中的一条结果导出为 Markdown 文件（配合 --save-json 同时导出 JSON）后退出"
     )
     parser.add_argument(
         "--verbose",
@@ -906,9 +2931,215 @@ def main():
         action="store_true",
         help="仅使用火山引擎搜索（不使用智谱和DuckDuckGo）"
     )
-    
+    parser.add_argument(
+        "--search-deadline",
+        type=float,
+        default=None,
+        help="并发搜索阶段的整体截止时间（秒，覆盖 conf.json 中的 workflow.search_deadline）"
+    )
+    parser.add_argument(
+        "--query-deadline",
+        type=float,
+        default=None,
+        help="单个查询（搜索 + 提取）的总截止时间（秒，覆盖 conf.json 中的 workflow.query_deadline）"
+    )
+    parser.add_argument(
+        "--min-results",
+        type=int,
+        default=None,
+        help="成功引擎的结果总数达到该值即开始提取，不再等待其余引擎"
+    )
+    parser.add_argument(
+        "--min-engines",
+        type=int,
+        default=None,
+        help="成功返回的引擎数达到该值即开始提取，不再等待其余引擎"
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        default=None,
+        help="引擎超过近期耗时分位数仍未返回时再发起一次相同请求，取先返回的结果"
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不读取也不写入本地搜索缓存和提取缓存"
+    )
+    cache_group.add_argument(
+        "--refresh",
+        action="store_true",
+        help="跳过本地搜索缓存和提取缓存，重新请求并刷新缓存"
+    )
+    parser.add_argument(
+        "--history-first",
+        action="store_true",
+        default=None,
+        help="先在结果库的全文索引中查找足够新、足够相关的历史结果，命中时跳过搜索和提取"
+    )
+    parser.add_argument(
+        "--fetch-pages",
+        action="store_true",
+        default=None,
+        help="搜索后并发抓取结果页面并抽取正文，代替引擎返回的摘要（默认读取 fetch.enabled）"
+    )
+    parser.add_argument(
+        "--extract-mode",
+        choices=["prompt", "langextract"],
+        default=None,
+        help="提取方式：prompt 单次提示；langextract 分块并行提取带原文字符区间的结构化 JSON（默认读取 extraction.mode）"
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="批量模式：从文件读取查询（每行一个查询或 JSONL 的 {\"query\": ...}，'-' 表示标准输入）"
+    )
+    parser.add_argument(
+        "--batch-output",
+        metavar="FILE",
+        help="批量模式结果文件（JSONL），默认 <output-dir>/batch_results_YYYYMMDD_HHMMSS.jsonl"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="批量模式同时处理的查询数（覆盖 conf.json 中的 workflow.batch_concurrency，--async 时为 async.max_concurrency）"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="批量模式使用异步工作流：所有查询在一个事件循环中执行，模型请求不占用线程"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="以常驻服务模式运行，在本地 HTTP 端口提供 POST /search 接口"
+    )
+    parser.add_argument(
+        "--host",
+        default=None,
+        help="服务监听地址 / 转发目标地址（覆盖 conf.json 中的 server.host）"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="服务监听端口 / 转发目标端口（覆盖 conf.json 中的 server.port）"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="转发给正在运行的常驻服务执行（等同 server.forward），服务不可用时在当前进程内执行"
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="不转发给常驻服务，始终在当前进程内执行（覆盖 server.forward）"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="流式调用提取模型：边生成边输出，并记录首 token 延迟和生成速度"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        metavar="FILE",
+        help="运行结束后将各阶段耗时直方图以 Prometheus 文本格式写入文件"
+    )
+    parser.add_argument(
+        "--engine-health",
+        action="store_true",
+        help="显示各搜索引擎的近期耗时、错误率和熔断状态后退出"
+    )
+    parser.add_argument(
+        "--reset-engine-health",
+        action="store_true",
+        help="清除引擎统计与熔断状态后退出"
+    )
+
     args = parser.parse_args()
     
+    configure_http_clients()
+    
+    workflow_options = {
+        'verbose': args.verbose,
+        'ddg_max_results': args.ddg_max_results,
+        'volcengine': args.volcengine,
+        'volcengine_only': args.volcengine_only,
+        'search_deadline': args.search_deadline,
+        'query_deadline': args.query_deadline,
+        'min_results': args.min_results,
+        'min_engines': args.min_engines,
+        'hedge': args.hedge,
+        'history_first': args.history_first,
+        'fetch_pages': args.fetch_pages,
+        'extract_mode': args.extract_mode,
+        'cache_mode': 'off' if args.no_cache else ('refresh' if args.refresh else 'on')
+    }
+    
+    server_conf = get_server_config()
+    host = args.host or server_conf['host']
+    port = args.port or server_conf['port']
+    
+    if args.engine_health or args.reset_engine_health:
+        health = get_engine_health()
+        if health is None:
+            print("⚠️ 引擎健康统计未启用（engine_health.enabled = false）")
+        elif args.reset_engine_health:
+            health.reset()
+            print("✅ 已清除引擎统计与熔断状态")
+        else:
+            print_engine_health(health)
+        return
+    
+    if args.list_results is not None or args.export_run:
+        store = get_results_store(args.output_dir)
+        if store is None:
+            print("⚠️ 结果库未启用（storage.enabled = false）")
+            sys.exit(1)
+        if args.export_run:
+            export_stored_result(store, args.export_run, args.output_dir, save_json=args.save_json)
+        else:
+            print_stored_results(store, query=args.query, limit=args.list_results)
+        return
+    
+    if args.serve:
+        from server import serve
+        
+        def run_and_store(query, output_dir=None, save=True, **options):
+            # 命令行转发的请求带上客户端的 output_dir（历史结果查找）且 save=False，结果由客户端保存
+            output_dir = output_dir or args.output_dir
+            result = run_workflow(query, output_dir=output_dir, **options)
+            if save:
+                save_results(result, output_dir, query=query, markdown=args.markdown)
+            return result
+        
+        serve(run_and_store, host=host, port=port, max_concurrency=server_conf['max_concurrency'])
+        return
+    
+    if args.batch:
+        output_file = args.batch_output or str(
+            Path(args.output_dir) / f"batch_results_{new_run_id()}.jsonl"
+        )
+        batch_runner = run_batch
+        if args.use_async:
+            from async_workflow import run_batch_async as batch_runner
+        summary = batch_runner(
+            read_batch_queries(args.batch),
+            output_file,
+            concurrency=args.concurrency,
+            store=get_results_store(args.output_dir),
+            output_dir=args.output_dir,
+            **workflow_options
+        )
+        if args.metrics_file:
+            METRICS.write_prometheus(args.metrics_file)
+        if summary['total'] and summary['failed'] == summary['total']:
+            sys.exit(1)
+        return
+    
     # 获取查询关键词：位置参数或 --query 参数二选一
     search_query = args.query
     
@@ -921,35 +3152,34 @@ def main():
     print("🔄 智谱 MCP + DuckDuckGo + 火山引擎 + 豆包 工作流")
     print("=" * 60)
     
-    zhipu_result = {}
-    ddg_result = {}
-    volcengine_result = {}
-    
-    if args.volcengine_only:
-        volcengine_result = search_with_volcengine(search_query, verbose=args.verbose)
-    else:
-        zhipu_search_conf = get_zhipu_search_config()
-        if zhipu_search_conf.get('enabled', True):
-            zhipu_result = search_with_zhipu_mcp(search_query, verbose=args.verbose)
-        else:
-            if args.verbose:
-                print("\n⏭️ 智谱搜索已禁用，跳过...")
-        ddg_result = search_with_duckduckgo(search_query, verbose=args.verbose, max_results=args.ddg_max_results)
-        
-        if args.volcengine:
-            volcengine_result = search_with_volcengine(search_query, verbose=args.verbose)
-    
-    final_result = extract_with_langextract(
-        zhipu_result, ddg_result, volcengine_result, verbose=args.verbose
-    )
+    run_id = new_run_id()
+    stream_file = None
+    if args.stream:
+        stream_file = str(Path(args.output_dir) / f"extracted_info_{run_id}.md")
+    final_result = None
+    if (args.daemon or server_conf['forward']) and not args.no_daemon and not args.stream:
+        from server import forward_to_daemon
+        daemon_options = {k: v for k, v in workflow_options.items() if k != 'verbose'}
+        final_result = forward_to_daemon(host, port, search_query, output_dir=args.output_dir, **daemon_options)
+        if final_result is not None:
+            print(f"\n🔌 已由常驻服务处理: http://{host}:{port}")
+    if final_result is None:
+        final_result = run_workflow(
+            search_query, stream=args.stream, stream_file=stream_file, output_dir=args.output_dir,
+            **workflow_options
+        )
     
     # Save results
     saved_files = save_results(
         final_result,
         args.output_dir,
         save_json=args.save_json,
-        verbose=args.verbose
+        verbose=args.verbose,
+        markdown=args.markdown,
+        query=search_query,
+        run_id=final_result.get("run_id") or run_id
     )
+    store = get_results_store(args.output_dir)
     
     # Final summary
     print("\n" + "=" * 60)
@@ -960,22 +3190,59 @@ def main():
         print(f"\n✅ 工作流成功！")
         print(f"   查询: {search_query}")
         if final_result.get("zhipu_data", {}).get("success"):
-            print(f"   智谱搜索结果: {len(zhipu_result.get('search_results', []))} 条")
+            print(f"   智谱搜索结果: {len(final_result['zhipu_data'].get('search_results', []))} 条")
         if final_result.get("ddg_data", {}).get("success"):
-            print(f"   DuckDuckGo 搜索结果: {len(ddg_result.get('search_results', []))} 条")
+            print(f"   DuckDuckGo 搜索结果: {len(final_result['ddg_data'].get('search_results', []))} 条")
         if final_result.get("volcengine_data", {}).get("success"):
-            print(f"   火山引擎搜索结果: {len(volcengine_result.get('search_results', []))} 条")
-        print(f"   保存文件: {len(saved_files)} 个")
+            print(f"   火山引擎搜索结果: {len(final_result['volcengine_data'].get('search_results', []))} 条")
+        if final_result.get("engine_skipped"):
+            print(f"   跳过的引擎: " + ", ".join(
+                f"{engine}（{reason}）" for engine, reason in final_result["engine_skipped"].items()
+            ))
+        if final_result.get("search_cutoff"):
+            print(f"   未等待的引擎: " + ", ".join(
+                f"{engine}（{reason}）" for engine, reason in final_result["search_cutoff"].items()
+            ))
+        if final_result.get("fetch"):
+            print(f"   页面抓取: {final_result['fetch']['pages']} 个页面，{final_result['fetch']['expanded']} 条结果使用正文")
+        if final_result.get("cache_hit"):
+            print(f"   提取结果: 命中本地缓存")
+        if final_result.get("usage"):
+            usage = final_result["usage"]
+            print(f"   Token 用量: 输入 {usage['prompt_tokens']}（前缀缓存命中 {usage['cached_tokens']}），"
+                  f"输出 {usage['completion_tokens']}")
+        if final_result.get("history_hit"):
+            history_hit = final_result["history_hit"]
+            print(f"   历史结果: {history_hit['query']}（{history_hit['run_id']}，相似度 {history_hit['similarity']}，"
+                  f"{history_hit['age'] / 60:.0f} 分钟前）")
+        if final_result.get("streaming"):
+            print(f"   首 token 延迟: {final_result['streaming']['ttft_ms']} ms")
+            print(f"   生成速度: {final_result['streaming']['tokens_per_sec']} tokens/s")
+        if store is not None:
+            print(f"   结果库: {store.path}（{final_result['run_id']}）")
+        print(f"   导出文件: {len(saved_files)} 个")
         for f in saved_files:
             print(f"   - {Path(f).name}")
         
-        print("\n" + "=" * 60)
-        print("📝 提取的信息")
-        print("=" * 60)
-        print("\n" + final_result["extracted_info"])
+        # 流式模式下提取内容已实时输出
+        if not final_result.get("streaming"):
+            print("\n" + "=" * 60)
+            print("📝 提取的信息")
+            print("=" * 60)
+            print("\n" + final_result["extracted_info"])
     else:
         print(f"\n❌ 工作流失败: {final_result.get('error', 'Unknown error')}")
     
+    if args.verbose and final_result.get("trace"):
+        print(f"\n⏱️ 阶段耗时:")
+        for record in final_result["trace"]:
+            status = "✅" if record.get("ok") else "❌"
+            print(f"   {status} {record['name']:<20} {record['duration_ms']:>10.1f} ms")
+    
+    if args.metrics_file:
+        METRICS.write_prometheus(args.metrics_file)
+        print(f"\n📈 指标已写入: {args.metrics_file}")
+    
     print("\n" + "=" * 60)
 
 
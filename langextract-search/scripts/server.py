@@ -0,0 +1,173 @@
+"""
+常驻服务模式
+
+在本地 HTTP 端口上提供 搜索 → 提取 工作流的 JSON API，进程常驻，
+复用已建立的 Provider 连接、SDK 客户端和缓存，并发处理请求。
+
+接口:
+    GET  /health   服务状态（service 字段为 SERVICE_NAME，客户端据此确认端口上是本服务）
+    GET  /metrics  各阶段耗时直方图（Prometheus 文本格式）
+    POST /search   请求体 {"query": "...", ...工作流参数}，返回与 extract_with_langextract 相同的结果字典；
+                   output_dir 指定历史结果查找与保存使用的输出目录，save 为 false 时服务端不保存结果
+
+命令行客户端在开启 server.forward（或 --daemon）时通过 forward_to_daemon 把查询转发给正在运行的服务：
+先确认 GET /health 返回本服务的标识，任何非 2xx 响应或传输错误都回退到本进程内执行。
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tracing import METRICS
+
+
+WORKFLOW_OPTIONS = (
+    'ddg_max_results', 'volcengine', 'volcengine_only', 'search_deadline', 'cache_mode',
+    'query_deadline', 'min_results', 'min_engines', 'hedge', 'history_first', 'fetch_pages',
+    'extract_mode'
+)
+# 与工作流参数一起转发给 run_workflow 回调的保存参数
+STORAGE_OPTIONS = ('output_dir', 'save')
+
+SERVICE_NAME = "langextract-search"
+
+
+class WorkflowServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, run_workflow, max_concurrency: int = 8):
+        super().__init__(address, WorkflowRequestHandler)
+        self.run_workflow = run_workflow
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.served = 0
+        self.stats_lock = threading.Lock()
+
+
+class WorkflowRequestHandler(BaseHTTPRequestHandler):
+    server_version = "langextract-search"
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = METRICS.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != "/health":
+            self._send_json(404, {"success": False, "error": f"Not found: {self.path}"})
+            return
+        server = self.server
+        self._send_json(200, {
+            "service": SERVICE_NAME,
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime": round(time.time() - server.started_at, 1),
+            "in_flight": server.in_flight,
+            "served": server.served,
+            "max_concurrency": server.max_concurrency
+        })
+
+    def do_POST(self):
+        if self.path != "/search":
+            self._send_json(404, {"success": False, "error": f"Not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"success": False, "error": f"Invalid JSON body: {e}"})
+            return
+
+        query = (request.get("query") or "").strip() if isinstance(request, dict) else ""
+        if not query:
+            self._send_json(400, {"success": False, "error": "query is required"})
+            return
+        options = {key: request[key] for key in WORKFLOW_OPTIONS + STORAGE_OPTIONS if key in request}
+
+        server = self.server
+        with server.slots:
+            with server.stats_lock:
+                server.in_flight += 1
+            try:
+                result = server.run_workflow(query, **options)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            finally:
+                with server.stats_lock:
+                    server.in_flight -= 1
+                    server.served += 1
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        print(f"[{self.log_date_time_string()}] {self.address_string()} {format % args}")
+
+
+def serve(run_workflow, host: str = "127.0.0.1", port: int = 8765, max_concurrency: int = 8):
+    """启动常驻服务，阻塞直到 Ctrl+C。"""
+    server = WorkflowServer((host, port), run_workflow, max_concurrency=max_concurrency)
+    print("=" * 60)
+    print(f"🚀 langextract-search 服务已启动: http://{host}:{port}")
+    print(f"   并发上限: {max_concurrency}")
+    print(f"   接口: GET /health, GET /metrics, POST /search")
+    print("=" * 60)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️ 服务已停止")
+    finally:
+        server.server_close()
+
+
+def daemon_available(host: str, port: int, timeout: float = 0.5) -> bool:
+    """端口上是否为本服务：GET /health 返回 2xx 且 service 为 SERVICE_NAME。"""
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/health", timeout=timeout) as response:
+            health = json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return False
+    return isinstance(health, dict) and health.get("service") == SERVICE_NAME
+
+
+def forward_to_daemon(host: str, port: int, query: str, timeout: float = 600, output_dir: str = None, **options):
+    """
+    将查询转发给常驻服务。
+
+    output_dir 转发给服务用于查找历史结果；服务端不保存结果（save=false），由调用方保存到自己的输出目录。
+
+    Returns:
+        dict | None: 服务返回的结果；端口上不是本服务、响应非 2xx 或传输出错时返回 None，由调用方在本进程内执行
+    """
+    if not daemon_available(host, port):
+        return None
+    body = {"query": query, "save": False, **options}
+    if output_dir:
+        body["output_dir"] = os.path.abspath(output_dir)
+    request = urllib.request.Request(
+        f"http://{host}:{port}/search",
+        data=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 常驻服务请求失败，改为本地执行: {e}")
+        return None
+    return result if isinstance(result, dict) else None
@@ -0,0 +1,189 @@
+"""
+阶段耗时追踪与指标导出
+
+- span：记录一个阶段的开始时间、耗时、字节数和成功/失败，写入当前 trace（contextvars，线程池中需复制上下文）
+- 指标：每个 span 结束时按阶段、引擎、模型汇总为直方图，可导出为 Prometheus 文本格式
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRIC_LABELS = ("engine", "model")
+
+_current_trace = contextvars.ContextVar("langextract_search_trace", default=None)
+
+
+class Trace:
+    """一次工作流运行的 span 列表（线程安全）。"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self.spans.append(record)
+
+    def to_list(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda record: record["start_ms"])
+
+
+class Span:
+    """span 记录，阶段内可调用 set() 补充字节数、结果数等属性。"""
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.ok = True
+        self.error = None
+        self.detached = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, error):
+        self.ok = False
+        self.error = str(error) if error is not None else None
+
+    def detach(self):
+        """只计入指标，不写入 trace（如已被截止时间放弃的阶段）。"""
+        self.detached = True
+
+
+def start_trace():
+    """开始新的 trace 并设为当前上下文的 trace，返回 (trace, token)。"""
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def add_span(name: str, start: float, duration: float, ok: bool = True, **attrs):
+    """直接写入一条已知起止时间的 span（如等待超时的阶段）。"""
+    trace = current_trace()
+    record = {
+        "name": name,
+        "start_ms": round((start - (trace.started if trace else start)) * 1000, 2),
+        "duration_ms": round(duration * 1000, 2),
+        "ok": ok,
+        **attrs
+    }
+    if trace is not None:
+        trace.add(record)
+    METRICS.observe(record, duration)
+
+
+@contextmanager
+def span(name: str, sink=None, **attrs):
+    """
+    记录一个阶段。
+
+    Args:
+        name: 阶段名称，如 search.zhipu、llm.request
+        sink: 可选的 span 列表；默认写入当前 trace，没有 trace 时只记录指标
+        attrs: 附加属性（engine、model、bytes 等）
+    """
+    trace = current_trace()
+    record_span = Span(name, attrs)
+    start = time.perf_counter()
+    try:
+        yield record_span
+    except BaseException as e:
+        record_span.fail(e)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        base = trace.started if trace is not None else start
+        record = {
+            "name": name,
+            "start_ms": round((start - base) * 1000, 2),
+            "duration_ms": round(duration * 1000, 2),
+            "ok": record_span.ok,
+            **record_span.attrs
+        }
+        if record_span.error:
+            record["error"] = record_span.error
+        if record_span.detached:
+            pass
+        elif sink is not None:
+            sink.append(record)
+        elif trace is not None:
+            trace.add(record)
+        METRICS.observe(record, duration)
+
+
+class MetricsRegistry:
+    """按 (阶段, 引擎, 模型, 状态) 汇总的耗时直方图与字节计数。"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._bytes = {}
+
+    def observe(self, record: dict, duration: float):
+        labels = (
+            ("stage", record["name"]),
+            *((key, str(record[key])) for key in METRIC_LABELS if record.get(key)),
+            ("status", "ok" if record["ok"] else "error"),
+        )
+        with self._lock:
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                histogram = self._histograms[labels] = {
+                    "buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0
+                }
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += duration
+            if record.get("bytes"):
+                self._bytes[labels] = self._bytes.get(labels, 0) + int(record["bytes"])
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus / OpenMetrics 文本格式。"""
+        def fmt(labels, extra=()):
+            pairs = [*labels, *extra]
+            escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines = [
+            "# HELP langextract_search_stage_duration_seconds Duration of workflow stages.",
+            "# TYPE langextract_search_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for labels, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    lines.append(
+                        f"langextract_search_stage_duration_seconds_bucket{fmt(labels, [('le', str(bound))])} {count}"
+                    )
+                lines.append(
+                    f"langextract_search_stage_duration_seconds_bucket{fmt(labels, [('le', '+Inf')])} {histogram['count']}"
+                )
+                lines.append(f"langextract_search_stage_duration_seconds_sum{fmt(labels)} {histogram['sum']:.6f}")
+                lines.append(f"langextract_search_stage_duration_seconds_count{fmt(labels)} {histogram['count']}")
+            lines.append("# HELP langextract_search_stage_bytes_total Bytes processed by workflow stages.")
+            lines.append("# TYPE langextract_search_stage_bytes_total counter")
+            for labels, total in sorted(self._bytes.items()):
+                lines.append(f"langextract_search_stage_bytes_total{fmt(labels)} {total}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,32 @@
+"""URL 规范化：只去掉广告 / 分析平台的跟踪参数，保留决定页面内容的查询参数。"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "langextract-search" / "scripts"))
+
+from dedup import canonicalize_url  # noqa: E402
+
+
+@pytest.mark.parametrize("url, canonical", [
+    ("https://example.com/a?utm_source=x&utm_medium=y", "https://example.com/a"),
+    ("http://www.example.com/a?id=1&gclid=abc&fbclid=def", "https://example.com/a?id=1"),
+    ("https://item.example.com/p?spm=a1.b2&scm=1.2&id=9", "https://item.example.com/p?id=9"),
+    ("https://example.com/a?WT.mc_id=ad&msclkid=1#top", "https://example.com/a"),
+])
+def test_tracking_params_are_removed(url, canonical):
+    assert canonicalize_url(url) == canonical
+
+
+@pytest.mark.parametrize("url", [
+    "https://example.com/list?from=2024-01-01&to=2024-02-01",
+    "https://example.com/img?src=chart.png",
+    "https://github.com/org/repo/blob/main/a.py?ref=v1.2",
+    "https://example.com/report?timestamp=1700000000",
+    "https://docs.example.com/d?share_token=abc",
+    "https://example.com/s?referer=partner",
+])
+def test_content_params_are_kept(url):
+    assert canonicalize_url(url) != canonicalize_url(url.split("?")[0])
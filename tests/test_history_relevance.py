@@ -0,0 +1,58 @@
+"""全文索引的历史结果复用：只差一个实体或属性的查询不能命中。"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "langextract-search" / "scripts"))
+
+from results_store import ResultsStore, history_relevance  # noqa: E402
+
+MIN_RELEVANCE = 0.8
+
+EXTRACTED = "特斯拉 Model 3 续航约 600 公里，售价 23 万元起。美国和法国总统大选民调显示支持率接近。"
+
+DIFFERENT_QUESTIONS = [
+    ("特斯拉 model 3 续航", "特斯拉 model 3 价格"),
+    ("美国总统大选民调", "法国总统大选民调"),
+    ("特斯拉 model 3", "特斯拉 model 3 续航"),
+    ("2024年美国总统大选民调", "2020年美国总统大选民调"),
+]
+
+
+@pytest.mark.parametrize("query, stored", DIFFERENT_QUESTIONS + [(b, a) for a, b in DIFFERENT_QUESTIONS])
+def test_different_questions_have_no_relevance(query, stored):
+    assert history_relevance(query, stored, EXTRACTED) == 0.0
+
+
+@pytest.mark.parametrize("query, stored", [
+    ("请问特斯拉 model 3 续航", "特斯拉 model 3 续航"),
+    ("美国总统大选民调最新", "美国总统大选民调"),
+])
+def test_rewordings_are_relevant(query, stored):
+    assert history_relevance(query, stored, EXTRACTED) >= MIN_RELEVANCE
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite3")
+    for query in ("特斯拉 model 3 价格", "法国总统大选民调"):
+        store.put({"success": True, "query": query, "extracted_info": EXTRACTED}, query=query)
+    store.flush()
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("query", ["特斯拉 model 3 续航", "美国总统大选民调"])
+def test_find_similar_skips_different_questions(store, query):
+    if not store.fts_enabled:
+        pytest.skip("SQLite 未编译 FTS5")
+    assert store.find_similar(query, min_relevance=MIN_RELEVANCE) is None
+
+
+def test_find_similar_reuses_same_question(store):
+    if not store.fts_enabled:
+        pytest.skip("SQLite 未编译 FTS5")
+    hit = store.find_similar("请问特斯拉 model 3 价格", min_relevance=MIN_RELEVANCE)
+    assert hit is not None and hit["query"] == "特斯拉 model 3 价格"
@@ -0,0 +1,102 @@
+"""页面抓取的地址检查：拒绝内网、本机和链路本地地址，重定向的每一跳都检查。"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "langextract-search" / "scripts"))
+
+from page_fetch import BlockedURLError, PageFetcher, check_public_url  # noqa: E402
+
+BLOCKED_URLS = [
+    "http://127.0.0.1/",
+    "http://localhost:8080/admin",
+    "http://10.0.0.5/",
+    "http://172.16.3.4/",
+    "http://192.168.1.1/",
+    "http://100.64.0.1/",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/",
+    "http://[fe80::1]/",
+    "http://[fd00:ec2::254]/",
+    "http://[::ffff:127.0.0.1]/",
+    "http://0.0.0.0/",
+    "file:///etc/passwd",
+    "ftp://93.184.216.34/",
+]
+
+
+@pytest.mark.parametrize("url", BLOCKED_URLS)
+def test_non_public_urls_are_blocked(url):
+    with pytest.raises(BlockedURLError):
+        check_public_url(url)
+
+
+@pytest.mark.parametrize("url", ["http://93.184.216.34/", "https://[2606:2800:220:1:248:1893:25c8:1946]/a"])
+def test_public_addresses_are_allowed(url):
+    check_public_url(url)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=b""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.encoding = "utf-8"
+
+    @property
+    def is_redirect(self):
+        return "Location" in self.headers and self.status_code in (301, 302, 303, 307, 308)
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        yield self.body
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return self.responses[url]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fetcher():
+    pytest.importorskip("requests")
+    fetcher = PageFetcher(max_workers=1)
+    yield fetcher
+    fetcher.close()
+
+
+def test_redirect_to_metadata_endpoint_is_blocked(fetcher):
+    fetcher._session = FakeSession({
+        "http://93.184.216.34/page": FakeResponse(302, {"Location": "http://169.254.169.254/latest/meta-data/"})
+    })
+    result = fetcher.fetch("http://93.184.216.34/page", write_cache=False)
+    assert not result["success"]
+    assert "169.254.169.254" in result["error"]
+    assert fetcher._session.requested == ["http://93.184.216.34/page"]
+
+
+def test_public_redirect_is_followed_and_size_capped(fetcher):
+    fetcher.max_bytes = 64
+    fetcher._session = FakeSession({
+        "http://93.184.216.34/a": FakeResponse(301, {"Location": "/b"}),
+        "http://93.184.216.34/b": FakeResponse(200, {"Content-Type": "text/plain"}, b"x" * 1000)
+    })
+    result = fetcher.fetch("http://93.184.216.34/a", write_cache=False)
+    assert result["success"] and result["truncated"]
+    assert result["bytes"] == 64
+    assert fetcher._session.requested == ["http://93.184.216.34/a", "http://93.184.216.34/b"]
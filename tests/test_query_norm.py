@@ -0,0 +1,56 @@
+"""相似查询判定：同一问题的不同写法可以复用，实体、否定、年份或版本不同的查询不能复用。"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "langextract-search" / "scripts"))
+
+from query_norm import QueryIndex, query_similarity  # noqa: E402
+
+THRESHOLD = 0.8
+
+DIFFERENT_QUESTIONS = [
+    ("中国新能源汽车出口政策分析", "美国新能源汽车出口政策分析"),
+    ("python 不支持 async 的原因", "python 支持 async 的原因"),
+    ("为什么没有开源", "为什么开源"),
+    ("2024年中国GDP增长率是多少", "2023年中国GDP增长率是多少"),
+    ("第三季度财报", "第二季度财报"),
+    ("GPT-4o", "GPT-4"),
+    ("特斯拉 model 3 续航", "特斯拉 model 3 价格"),
+    ("美国总统大选民调", "法国总统大选民调"),
+]
+
+SAME_QUESTIONS = [
+    ("Python 教程 最新", "python教程"),
+    ("請問台灣的人口", "台湾人口"),
+    ("什么是 RAG？", "rag"),
+    ("LangExtract 如何使用", "langextract 使用"),
+]
+
+
+@pytest.mark.parametrize("a, b", DIFFERENT_QUESTIONS)
+def test_different_questions_are_not_similar(a, b):
+    assert query_similarity(a, b) < THRESHOLD
+    assert query_similarity(b, a) < THRESHOLD
+
+
+@pytest.mark.parametrize("a, b", SAME_QUESTIONS)
+def test_rewordings_are_similar(a, b):
+    assert query_similarity(a, b) >= THRESHOLD
+
+
+@pytest.mark.parametrize("stored, query", DIFFERENT_QUESTIONS + [(b, a) for a, b in DIFFERENT_QUESTIONS])
+def test_index_rejects_different_questions(stored, query):
+    index = QueryIndex()
+    index.add("key", stored, created_at=1.0)
+    assert index.search(query, min_similarity=THRESHOLD) is None
+
+
+@pytest.mark.parametrize("stored, query", SAME_QUESTIONS)
+def test_index_reuses_rewordings(stored, query):
+    index = QueryIndex()
+    index.add("key", stored, created_at=1.0)
+    hit = index.search(query, min_similarity=THRESHOLD)
+    assert hit is not None and hit["key"] == "key"
@@ -0,0 +1,67 @@
+"""Provider 请求重试：截止时间限制每次尝试的超时和重试次数。"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "langextract-search" / "scripts"))
+
+from retry import call_with_retry, is_retryable  # noqa: E402
+
+POLICY = {'max_attempts': 4, 'base_delay': 0.01, 'max_delay': 0.01}
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("status, retryable", [
+    (408, True), (429, True), (500, True), (503, True), (400, False), (409, False), (425, False)
+])
+def test_retryable_status(status, retryable):
+    assert is_retryable(StatusError(status)) is retryable
+
+
+def test_attempt_timeout_is_capped_by_deadline():
+    timeouts = []
+
+    def fn(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) < 3:
+            raise TimeoutError("slow")
+        return "ok"
+
+    assert call_with_retry(fn, policy=POLICY, timeout=120, deadline=time.monotonic() + 5) == "ok"
+    assert len(timeouts) == 3
+    assert all(timeout <= 5 for timeout in timeouts)
+    assert timeouts == sorted(timeouts, reverse=True)
+
+
+def test_no_retry_after_deadline():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        time.sleep(0.05)
+        raise TimeoutError("slow")
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        call_with_retry(fn, policy=POLICY, timeout=120, deadline=start + 0.08)
+    assert len(calls) <= 2
+    assert time.monotonic() - start < 0.2
+
+
+def test_expired_deadline_raises_without_calling():
+    calls = []
+    with pytest.raises(TimeoutError):
+        call_with_retry(lambda timeout: calls.append(timeout), policy=POLICY, deadline=time.monotonic() - 1)
+    assert calls == []
+
+
+def test_untimed_call_takes_no_arguments():
+    assert call_with_retry(lambda: "ok", policy=POLICY) == "ok"